@@ -0,0 +1,59 @@
+import os
+import time
+import argparse
+
+from main import Library, ConnectionProfile, DatabaseBackup
+
+
+def take_snapshot(backups):
+    """
+    Take one snapshot and report it.
+    :param backups (DatabaseBackup): The backup settings.
+    :return: None
+    """
+    start = time.perf_counter()
+    path = backups.snapshot()
+    print(f"Snapshot {path} ({os.path.getsize(path) / 2 ** 20:.1f} MiB) in {time.perf_counter() - start:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up and restore the library database while it is in use.")
+    parser.add_argument("--db", default="library.db", help="path to the database file")
+    parser.add_argument("--dir", help="snapshot folder; defaults to a backups folder next to the database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    snapshot = commands.add_parser("snapshot", help="write a new snapshot and delete the oldest ones")
+    snapshot.add_argument("--keep", type=int, default=DatabaseBackup.KEEP, help="snapshots to keep")
+    snapshot.add_argument("--pages", type=int, default=DatabaseBackup.PAGES, help="pages copied per step")
+    snapshot.add_argument("--sleep", type=float, default=DatabaseBackup.SLEEP, help="seconds between steps")
+    snapshot.add_argument("--every", type=float, metavar="MINUTES", help="keep running and snapshot periodically")
+    commands.add_parser("list", help="list the snapshots, newest first")
+    restore = commands.add_parser("restore", help="replace the database with a snapshot")
+    restore.add_argument("snapshot", help="the snapshot file to restore")
+    args = parser.parse_args()
+
+    profile = ConnectionProfile(path=args.db)
+    if args.command == "snapshot":
+        backups = DatabaseBackup(profile, args.dir, args.keep, args.pages, args.sleep)
+        take_snapshot(backups)
+        while args.every:
+            try:
+                time.sleep(args.every * 60)
+            except KeyboardInterrupt:
+                break
+            take_snapshot(backups)
+    elif args.command == "list":
+        for path in DatabaseBackup(profile, args.dir).snapshots():
+            print(f"{path}  {os.path.getsize(path) / 2 ** 20:.1f} MiB")
+    else:
+        library = Library(profile)
+        try:
+            previous = library.restore(args.snapshot, args.dir)
+        except ValueError as e:
+            raise SystemExit(f"Error: {e}")
+        finally:
+            library.conn.close()
+        print(f"The replaced database was saved as {previous}")
+
+
+if __name__ == "__main__":
+    main()
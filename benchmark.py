@@ -0,0 +1,372 @@
+import io
+import os
+import sys
+import csv
+import json
+import time
+import random
+import sqlite3
+import argparse
+import contextlib
+import platform
+import datetime
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+
+from main import Library, ConnectionProfile, DatabaseBackup, Book
+
+SCALES = {"1k": 1000, "100k": 100000, "1m": 1000000}
+STARTUP_TARGET_MS = 200
+BOOK_FIELDS = ["id", "title", "author", "publisher", "published_year", "rating", "ISBN"]
+MEMBER_FIELDS = ["id", "first_name", "last_name", "email", "gender", "state", "member_no"]
+WORDS = ["Green", "Tea", "Devil", "Blue", "Dress", "Night", "River", "Golden", "Voyage", "Summer",
+         "Shadow", "Garden", "Winter", "Letters", "House", "Silent", "Empire", "Stone", "Road", "Sea"]
+NAMES = ["Rheta", "Saraann", "Chery", "Simmonds", "Micky", "Rube", "Dmitri", "Derek", "Lutero", "Alban"]
+STATES = ["Texas", "Ohio", "Tennessee", "California", "Florida", "District of Columbia"]
+
+
+def isbn10_check_digit(digits):
+    """
+    Compute the ISBN-10 check digit, so generated books pass import validation.
+    :param digits (str): The first nine digits.
+    :return: (str) The check digit, 0-9 or X.
+    """
+    check = -sum((10 - i) * int(digit) for i, digit in enumerate(digits)) % 11
+    return "X" if check == 10 else str(check)
+
+
+def generate_books(count, seed=1):
+    """
+    Generate deterministic book rows in the add_books_from_csv column layout.
+    Titles and ISBNs are unique, so every row can be lent by title.
+    :param count (int): The number of books.
+    :param seed (int): The random seed.
+    :return: (generator) Yields dicts keyed by BOOK_FIELDS.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            "id": i + 1,
+            "title": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}",
+            "author": f"{rng.choice(NAMES)} {rng.choice(NAMES)}",
+            "publisher": f"{rng.choice(WORDS)} Press",
+            "published_year": rng.randint(1850, 2024),
+            "rating": round(rng.uniform(1, 5), 1),
+            "ISBN": f"{i:09d}-{isbn10_check_digit(f'{i:09d}')}",
+        }
+
+
+def generate_members(count, seed=2):
+    """
+    Generate deterministic member rows in the register_members_from_csv column layout.
+    :param count (int): The number of members.
+    :param seed (int): The random seed.
+    :return: (generator) Yields dicts keyed by MEMBER_FIELDS.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        first_name = rng.choice(NAMES)
+        yield {
+            "id": i + 1,
+            "first_name": first_name,
+            "last_name": rng.choice(NAMES),
+            "email": f"{first_name.lower()}{i}@example.com",
+            "gender": rng.choice(["Female", "Male"]),
+            "state": rng.choice(STATES),
+            "member_no": f"{i:011d}",
+        }
+
+
+def generate_loans(books, members, count, seed=3):
+    """
+    Generate deterministic loans of distinct books to random members.
+    :param books (int): The number of generated books to choose from.
+    :param members (int): The number of generated members to choose from.
+    :param count (int): The number of loans; at most the number of books.
+    :param seed (int): The random seed.
+    :return: (list) (book position, member position) pairs.
+    """
+    rng = random.Random(seed)
+    return [(book, rng.randrange(members)) for book in rng.sample(range(books), min(count, books))]
+
+
+def write_csv(path, fields, rows):
+    """
+    Write generated rows to a CSV file.
+    :param path (str): The path of the file.
+    :param fields (list): The header of the file.
+    :param rows (iterable): The rows as dicts.
+    :return: None
+    """
+    with open(path, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def silenced(enabled):
+    """
+    Swallow the per-call print() output of the Library methods.
+    :param enabled (bool): Whether to swallow it.
+    :return: A context manager.
+    """
+    if not enabled:
+        return contextlib.nullcontext()
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def timed(results, name, ops, fn, *args):
+    """
+    Run fn once and record its timing under name.
+    :param results (dict): The dict the timing is stored in.
+    :param name (str): The name of the benchmark.
+    :param ops (int): The number of operations fn performs.
+    :return: The return value of fn.
+    """
+    start = time.perf_counter()
+    value = fn(*args)
+    record(results, name, ops, time.perf_counter() - start)
+    return value
+
+
+def record(results, name, ops, seconds):
+    """
+    Store a timing under name.
+    :param results (dict): The dict the timing is stored in.
+    :param name (str): The name of the benchmark.
+    :param ops (int): The number of operations timed.
+    :param seconds (float): The time they took.
+    :return: None
+    """
+    results[name] = {
+        "ops": ops,
+        "seconds": seconds,
+        "us_per_op": seconds / ops * 1e6 if ops else 0.0,
+        "ops_per_second": ops / seconds if seconds else 0.0,
+    }
+
+
+def peak_memory(fn, *args):
+    """
+    Run fn once and measure the memory it allocates.
+    :return: (float) The peak traced memory in MiB.
+    """
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def backing_up(backups, fn, *args):
+    """
+    Run fn while snapshots are taken back to back on another thread.
+    :param backups (DatabaseBackup): The backup settings.
+    :return: The return value of fn.
+    """
+    done = threading.Event()
+
+    def snapshots():
+        while not done.is_set():
+            backups.snapshot()
+
+    thread = threading.Thread(target=snapshots)
+    thread.start()
+    try:
+        return fn(*args)
+    finally:
+        done.set()
+        thread.join()
+
+
+def run_suite(size, ops=1000, quiet=True):
+    """
+    Benchmark the Library hot paths against a freshly generated library.
+    :param size (int): The number of books and members.
+    :param ops (int): The number of single-row operations timed per benchmark.
+    :param quiet (bool): Silence the print() calls of the Library methods.
+    :return: (dict) The timings, keyed by benchmark name.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        books_csv = os.path.join(tmp, "books.csv")
+        members_csv = os.path.join(tmp, "members.csv")
+        write_csv(books_csv, BOOK_FIELDS, generate_books(size))
+        write_csv(members_csv, MEMBER_FIELDS, generate_members(size))
+        books = list(generate_books(min(size, ops * 10)))
+        members = list(generate_members(min(size, ops * 10)))
+        loans = generate_loans(len(books), len(members), ops)
+
+        library = Library(ConnectionProfile(path=os.path.join(tmp, "library.db")))
+        timed(results, "add_books_from_csv", size, library.add_books_from_csv, books_csv)
+        timed(results, "register_members_from_csv", size, library.register_members_from_csv, members_csv)
+
+        # numbered from 900000000, so the ISBNs stay clear of the generated books
+        new_isbns = [f"{900000000 + i}-{isbn10_check_digit(str(900000000 + i))}" for i in range(ops)]
+        new_books = [Book(f"New Book {i}", "Author", "Publisher", 2000, 3.0, isbn) for i, isbn in enumerate(new_isbns)]
+        with silenced(quiet):
+            timed(results, "add_book", ops, lambda: [library.add_book(book) for book in new_books])
+
+        titles = [books[book]["title"] for book, _ in loans]
+        member_nos = [members[member]["member_no"] for _, member in loans]
+        cold = Library(library.profile, id_cache_size=0)
+        timed(results, "_get_book_id", len(titles), lambda: [cold._get_book_id(title) for title in titles])
+        timed(results, "_get_member_id", len(member_nos),
+              lambda: [cold._get_member_id(member_no) for member_no in member_nos])
+        cold.conn.close()
+        [library._get_book_id(title) for title in titles]
+        timed(results, "_get_book_id (cached)", len(titles),
+              lambda: [library._get_book_id(title) for title in titles])
+
+        with silenced(quiet):
+            timed(results, "lend_book", len(loans),
+                  lambda: [library.lend_book(title, member_no) for title, member_no in zip(titles, member_nos)])
+            timed(results, "lent_books", 1, library.lent_books)
+            timed(results, "return_book", len(loans), lambda: [library.return_book(title) for title in titles])
+            timed(results, "lend_many", len(loans), library.lend_many, list(zip(titles, member_nos)))
+            timed(results, "return_many", len(loans), library.return_many, titles)
+
+        backups = DatabaseBackup(library.profile, os.path.join(tmp, "backups"), keep=1)
+        timed(results, "snapshot", 1, backups.snapshot)
+        with silenced(quiet):
+            timed(results, "lend_book (during backup)", len(loans), backing_up, backups,
+                  lambda: [library.lend_book(title, member_no) for title, member_no in zip(titles, member_nos)])
+            library.return_many(titles)
+
+        timed(results, "select_books", size, library.select_books)
+        results["select_books"]["peak_mib"] = peak_memory(library.select_books)
+        timed(results, "iter_books", size, lambda: sum(1 for _ in library.iter_books(page_size=1000)))
+        export_csv = os.path.join(tmp, "export.csv")
+        timed(results, "export_books", size, library.export_books, export_csv)
+        results["export_books"]["peak_mib"] = peak_memory(library.export_books, export_csv)
+        library.conn.close()
+    return results
+
+
+def cold_start(code, runs):
+    """
+    Time fresh interpreters running code, as starting the app does.
+    :param code (str): The Python code to run.
+    :param runs (int): The number of runs.
+    :return: (float) The fastest run in seconds, or None if code failed.
+    """
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                 capture_output=True)
+        seconds = time.perf_counter() - start
+        if process.returncode:
+            return None
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def run_startup(runs=5):
+    """
+    Benchmark starting the app: the interpreter, importing main, opening an
+    up-to-date library and, when a display is available, drawing the first frame.
+    :param runs (int): The number of cold starts; the fastest one counts.
+    :return: (dict) The timings, keyed by benchmark name.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "library.db")
+        # the schema is created up front, as it is on every start but the first
+        Library(ConnectionProfile(path=path)).conn.close()
+        profile = f"main.ConnectionProfile(path={path!r})"
+        steps = [
+            ("python", "pass"),
+            ("import main", "import main"),
+            ("open library", f"import main; main.Library({profile})"),
+            ("first frame", f"import main; root = main.tk.Tk(); main.LibraryGUI(root, {profile}); root.update()"),
+        ]
+        for name, code in steps:
+            seconds = cold_start(code, runs)
+            if seconds is not None:
+                record(results, name, 1, seconds)
+    return results
+
+
+def compare(baseline, current, threshold):
+    """
+    Print the change of every benchmark between two result files.
+    :param baseline (dict): The results of an earlier run.
+    :param current (dict): The results of this run.
+    :param threshold (float): The slowdown ratio reported as a regression.
+    :return: (int) The number of regressions.
+    """
+    regressions = 0
+    for scale, results in current["scales"].items():
+        old_results = baseline["scales"].get(scale, {})
+        for name, result in results.items():
+            if name not in old_results or not old_results[name]["us_per_op"]:
+                continue
+            ratio = result["us_per_op"] / old_results[name]["us_per_op"]
+            flag = ""
+            if ratio > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{scale:>6} {name:<28} {old_results[name]['us_per_op']:>12.2f} -> "
+                  f"{result['us_per_op']:>12.2f} us/op ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Library data layer.")
+    parser.add_argument("scales", nargs="*", default=["startup", "1k", "100k"],
+                        help="startup, or library sizes: 1k, 100k, 1m or a number of rows")
+    parser.add_argument("--ops", type=int, default=1000, help="single-row operations per benchmark")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against an earlier JSON results file")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    parser.add_argument("--startup-target", type=float, default=STARTUP_TARGET_MS,
+                        help="milliseconds the app may take to start")
+    args = parser.parse_args()
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "scales": {},
+    }
+    for scale in args.scales:
+        if scale.lower() == "startup":
+            results = run_startup()
+            print(f"--- {scale} (cold starts, target {args.startup_target:.0f} ms)")
+        else:
+            size = SCALES.get(scale.lower()) or int(scale)
+            results = run_suite(size, args.ops)
+            print(f"--- {scale} ({size} rows)")
+        report["scales"][scale] = results
+        for name, result in results.items():
+            peak = f" {result['peak_mib']:>9.1f} MiB peak" if "peak_mib" in result else ""
+            print(f"{name:<28} {result['ops']:>9} ops {result['us_per_op']:>12.2f} us/op "
+                  f"{result['ops_per_second']:>14.0f} ops/s{peak}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    failures = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline:
+            regressions = compare(json.load(baseline), report, args.threshold)
+        if regressions:
+            failures.append(f"{regressions} benchmark(s) regressed by more than {args.threshold}x")
+
+    # checked last, so a slow start still leaves the results and the comparison behind
+    startup = report["scales"].get("startup", {})
+    slowest = max((startup[name]["seconds"] for name in ("open library", "first frame") if name in startup),
+                  default=0)
+    if slowest * 1000 > args.startup_target:
+        failures.append(f"Starting the app took {slowest * 1000:.0f} ms, more than {args.startup_target:.0f} ms")
+    if failures:
+        raise SystemExit("\n".join(failures))
+
+
+if __name__ == "__main__":
+    main()
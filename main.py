@@ -1,107 +1,1439 @@
 import os
+import re
+import bisect
 import sqlite3
-import csv
-import webbrowser
 import datetime
+import functools
+import io
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from operator import itemgetter
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
-from tkinter import filedialog
+# asyncio, concurrent.futures, multiprocessing, csv, json, gzip, webbrowser and
+# tkinter.filedialog are imported where they are first needed (once, when the
+# object using them is built, for the ones used on every call): together they
+# make up most of the import time of this module, which every start of the app
+# (and every CSV import worker process) pays, while most sessions need few of them
 
 
-class Book:
+class Book(tuple):
     """
     Class representing a book.
+    A book is an immutable tuple in BOOKS column order, so a Book binds to
+    and compares with a plain BOOKS row (see row_factory). The id is None
+    until the book is stored.
     """
-    def __init__(self, title, author, publisher, published_year, rating, isbn):
+    __slots__ = ()
+
+    id = property(itemgetter(0), doc="The ID of the book.")
+    title = property(itemgetter(1), doc="The title of the book.")
+    author = property(itemgetter(2), doc="The author of the book.")
+    publisher = property(itemgetter(3), doc="The publisher of the book.")
+    published_year = property(itemgetter(4), doc="The year the book was published.")
+    rating = property(itemgetter(5), doc="The rating of the book.")
+    isbn = property(itemgetter(6), doc="The ISBN of the book.")
+
+    def __new__(cls, title, author, publisher, published_year, rating, isbn, id=None):
         """
-        Initialize a Book object.
+        Create a Book object.
         :param title (str): The title of the book.
         :param author (str): The author of the book.
         :param publisher (str): The publisher of the book.
         :param published_year (str): The year the book was published.
         :param rating (str): The rating of the book.
         :param isbn (str): The ISBN of the book.
+        :param id (int): The ID of the book in the database.
+        """
+        return tuple.__new__(cls, (id, title, author, publisher, published_year, rating, isbn))
+
+    def __reduce__(self):
+        # rebuilt by the C tuple constructor, so unpickling a batch from an import worker stays cheap
+        return tuple.__new__, (type(self), tuple(self))
+
+    def __repr__(self):
+        return f"Book(id={self[0]!r}, title={self[1]!r}, isbn={self[6]!r})"
+
+    @staticmethod
+    def row_factory(cursor, row):
         """
-        self.title = title
-        self.author = author
-        self.publisher = publisher
-        self.published_year = published_year
-        self.rating = rating
-        self.isbn = isbn
+        sqlite3 row factory turning a SELECT * FROM BOOKS row into a Book.
+        Used only for single-book lookups and search results; bulk reads,
+        pages and windows return plain tuples.
+        """
+        return tuple.__new__(Book, row)
 
 
-class Member:
+class Member(tuple):
     """
     Class representing a library member.
+    A member is an immutable tuple in MEMBERS column order, so a Member binds
+    to and compares with a plain MEMBERS row (see row_factory). The id is None
+    until the member is stored.
     """
-    def __init__(self, first_name, last_name, email, gender, state, member_no):
+    __slots__ = ()
+
+    id = property(itemgetter(0), doc="The ID of the member.")
+    first_name = property(itemgetter(1), doc="The first name of the member.")
+    last_name = property(itemgetter(2), doc="The last name of the member.")
+    email = property(itemgetter(3), doc="The email address of the member.")
+    gender = property(itemgetter(4), doc="The gender of the member.")
+    state = property(itemgetter(5), doc="The state of the member.")
+    member_no = property(itemgetter(6), doc="The unique member number of the member.")
+
+    def __new__(cls, first_name, last_name, email, gender, state, member_no, id=None):
         """
-        Initialize a Member object.
+        Create a Member object.
         :param first_name (str): The first name of the member.
         :param last_name (str): The last name of the member.
         :param email (str): The email address of the member.
         :param gender (str): The gender of the member.
         :param state (str): The state of the member.
         :param member_no (str): The unique member number of the member.
+        :param id (int): The ID of the member in the database.
+        """
+        return tuple.__new__(cls, (id, first_name, last_name, email, gender, state, member_no))
+
+    def __reduce__(self):
+        # rebuilt by the C tuple constructor, so unpickling a batch from an import worker stays cheap
+        return tuple.__new__, (type(self), tuple(self))
+
+    def __repr__(self):
+        return f"Member(id={self[0]!r}, member_no={self[6]!r})"
+
+    @staticmethod
+    def row_factory(cursor, row):
+        """
+        sqlite3 row factory turning a SELECT * FROM MEMBERS row into a Member.
+        Used only for single-member lookups; bulk reads, pages and windows
+        return plain tuples.
+        """
+        return tuple.__new__(Member, row)
+
+
+SCHEMA_MIGRATIONS = [
+    # 1: initial tables
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS BOOKS (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            TITLE VARCHAR(300),
+            AUTHOR VARCHAR(100),
+            PUBLISHER VARCHAR(200),
+            PUBLISHED_YEAR SMALLINT,
+            RATING FLOAT,
+            ISBN VARCHAR(11)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS MEMBERS (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            FIRST_NAME VARCHAR(100),
+            LAST_NAME VARCHAR(100),
+            EMAIL VARCHAR(200),
+            GENDER VARCHAR(15),
+            STATE VARCHAR(20),
+            MEMBER_NO VARCHAR(11)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS LEND_BOOKS (
+            BOOK_ID INTEGER,
+            MEMBER_ID INTEGER,
+            FOREIGN KEY (BOOK_ID) REFERENCES BOOKS(ID),
+            FOREIGN KEY (MEMBER_ID) REFERENCES MEMBERS(ID),
+            PRIMARY KEY (BOOK_ID, MEMBER_ID)
+        )
+        ''',
+    ],
+    # 2: indexes for the ISBN, title and member no lookups; duplicates that slipped
+    # past the old application-level checks are moved to *_DUPLICATES tables so the
+    # unique indexes apply, and loans left pointing at them to LEND_BOOKS_ORPHANS
+    [
+        'CREATE TABLE IF NOT EXISTS BOOKS_DUPLICATES AS SELECT * FROM BOOKS WHERE 0',
+        'CREATE TABLE IF NOT EXISTS MEMBERS_DUPLICATES AS SELECT * FROM MEMBERS WHERE 0',
+        'CREATE TABLE IF NOT EXISTS LEND_BOOKS_ORPHANS AS SELECT * FROM LEND_BOOKS WHERE 0',
+        '''
+        INSERT INTO BOOKS_DUPLICATES SELECT * FROM BOOKS
+        WHERE ISBN IS NOT NULL AND ID NOT IN (SELECT MIN(ID) FROM BOOKS GROUP BY ISBN)
+        ''',
+        'DELETE FROM BOOKS WHERE ID IN (SELECT ID FROM BOOKS_DUPLICATES)',
+        '''
+        INSERT INTO MEMBERS_DUPLICATES SELECT * FROM MEMBERS
+        WHERE MEMBER_NO IS NOT NULL AND ID NOT IN (SELECT MIN(ID) FROM MEMBERS GROUP BY MEMBER_NO)
+        ''',
+        'DELETE FROM MEMBERS WHERE ID IN (SELECT ID FROM MEMBERS_DUPLICATES)',
+        '''
+        INSERT INTO LEND_BOOKS_ORPHANS SELECT * FROM LEND_BOOKS
+        WHERE BOOK_ID NOT IN (SELECT ID FROM BOOKS) OR MEMBER_ID NOT IN (SELECT ID FROM MEMBERS)
+        ''',
+        'DELETE FROM LEND_BOOKS WHERE BOOK_ID NOT IN (SELECT ID FROM BOOKS) OR MEMBER_ID NOT IN (SELECT ID FROM MEMBERS)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS IDX_BOOKS_ISBN ON BOOKS (ISBN)',
+        'CREATE INDEX IF NOT EXISTS IDX_BOOKS_TITLE ON BOOKS (TITLE)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS IDX_MEMBERS_MEMBER_NO ON MEMBERS (MEMBER_NO)',
+        'CREATE INDEX IF NOT EXISTS IDX_LEND_BOOKS_MEMBER_ID ON LEND_BOOKS (MEMBER_ID)',
+    ],
+    # 3: full-text index over title, author and publisher, kept in sync by triggers
+    [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS BOOKS_FTS USING fts5(
+            TITLE, AUTHOR, PUBLISHER,
+            content='BOOKS', content_rowid='ID', prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS BOOKS_FTS_INSERT AFTER INSERT ON BOOKS BEGIN
+            INSERT INTO BOOKS_FTS (rowid, TITLE, AUTHOR, PUBLISHER)
+            VALUES (new.ID, new.TITLE, new.AUTHOR, new.PUBLISHER);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS BOOKS_FTS_DELETE AFTER DELETE ON BOOKS BEGIN
+            INSERT INTO BOOKS_FTS (BOOKS_FTS, rowid, TITLE, AUTHOR, PUBLISHER)
+            VALUES ('delete', old.ID, old.TITLE, old.AUTHOR, old.PUBLISHER);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS BOOKS_FTS_UPDATE AFTER UPDATE ON BOOKS BEGIN
+            INSERT INTO BOOKS_FTS (BOOKS_FTS, rowid, TITLE, AUTHOR, PUBLISHER)
+            VALUES ('delete', old.ID, old.TITLE, old.AUTHOR, old.PUBLISHER);
+            INSERT INTO BOOKS_FTS (rowid, TITLE, AUTHOR, PUBLISHER)
+            VALUES (new.ID, new.TITLE, new.AUTHOR, new.PUBLISHER);
+        END
+        ''',
+        "INSERT INTO BOOKS_FTS (BOOKS_FTS) VALUES ('rebuild')",
+    ],
+    # 4: a book can only be lent once at a time; the later loans of a book lent
+    # more than once are moved to LEND_BOOKS_DUPLICATES
+    [
+        'CREATE TABLE IF NOT EXISTS LEND_BOOKS_DUPLICATES AS SELECT * FROM LEND_BOOKS WHERE 0',
+        '''
+        INSERT INTO LEND_BOOKS_DUPLICATES SELECT * FROM LEND_BOOKS
+        WHERE rowid NOT IN (SELECT MIN(rowid) FROM LEND_BOOKS GROUP BY BOOK_ID)
+        ''',
+        'DELETE FROM LEND_BOOKS WHERE rowid NOT IN (SELECT MIN(rowid) FROM LEND_BOOKS GROUP BY BOOK_ID)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS IDX_LEND_BOOKS_BOOK_ID ON LEND_BOOKS (BOOK_ID)',
+    ],
+    # 5: loan history with per book, per member and per day counts kept up to date
+    # by triggers; timestamps are UTC 'YYYY-MM-DD HH:MM:SS' text
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS LOANS (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            BOOK_ID INTEGER NOT NULL,
+            MEMBER_ID INTEGER NOT NULL,
+            LENT_AT TEXT NOT NULL,
+            DUE_AT TEXT NOT NULL,
+            RETURNED_AT TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS IDX_LOANS_LENT_AT ON LOANS (LENT_AT, BOOK_ID)',
+        'CREATE INDEX IF NOT EXISTS IDX_LOANS_BOOK_ID ON LOANS (BOOK_ID, LENT_AT)',
+        'CREATE INDEX IF NOT EXISTS IDX_LOANS_MEMBER_ID ON LOANS (MEMBER_ID, LENT_AT)',
+        'CREATE INDEX IF NOT EXISTS IDX_LOANS_DUE_AT ON LOANS (DUE_AT) WHERE RETURNED_AT IS NULL',
+        '''
+        CREATE TABLE IF NOT EXISTS BOOK_LOAN_STATS (
+            BOOK_ID INTEGER PRIMARY KEY,
+            LOANS INTEGER NOT NULL DEFAULT 0,
+            ACTIVE INTEGER NOT NULL DEFAULT 0,
+            LAST_LENT_AT TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS IDX_BOOK_LOAN_STATS_LOANS ON BOOK_LOAN_STATS (LOANS)',
+        '''
+        CREATE TABLE IF NOT EXISTS MEMBER_LOAN_STATS (
+            MEMBER_ID INTEGER PRIMARY KEY,
+            LOANS INTEGER NOT NULL DEFAULT 0,
+            ACTIVE INTEGER NOT NULL DEFAULT 0,
+            LAST_LENT_AT TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS IDX_MEMBER_LOAN_STATS_LOANS ON MEMBER_LOAN_STATS (LOANS)',
+        '''
+        CREATE TABLE IF NOT EXISTS DAILY_LOAN_STATS (
+            DAY TEXT PRIMARY KEY,
+            LENT INTEGER NOT NULL DEFAULT 0,
+            RETURNED INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS LOANS_STATS_INSERT AFTER INSERT ON LOANS BEGIN
+            INSERT INTO BOOK_LOAN_STATS (BOOK_ID, LOANS, ACTIVE, LAST_LENT_AT)
+            VALUES (new.BOOK_ID, 1, new.RETURNED_AT IS NULL, new.LENT_AT)
+            ON CONFLICT (BOOK_ID) DO UPDATE SET LOANS = LOANS + 1, ACTIVE = ACTIVE + excluded.ACTIVE,
+                LAST_LENT_AT = max(coalesce(LAST_LENT_AT, ''), excluded.LAST_LENT_AT);
+            INSERT INTO MEMBER_LOAN_STATS (MEMBER_ID, LOANS, ACTIVE, LAST_LENT_AT)
+            VALUES (new.MEMBER_ID, 1, new.RETURNED_AT IS NULL, new.LENT_AT)
+            ON CONFLICT (MEMBER_ID) DO UPDATE SET LOANS = LOANS + 1, ACTIVE = ACTIVE + excluded.ACTIVE,
+                LAST_LENT_AT = max(coalesce(LAST_LENT_AT, ''), excluded.LAST_LENT_AT);
+            INSERT INTO DAILY_LOAN_STATS (DAY, LENT) VALUES (date(new.LENT_AT), 1)
+            ON CONFLICT (DAY) DO UPDATE SET LENT = LENT + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS LOANS_STATS_RETURN AFTER UPDATE OF RETURNED_AT ON LOANS
+        WHEN old.RETURNED_AT IS NULL AND new.RETURNED_AT IS NOT NULL BEGIN
+            UPDATE BOOK_LOAN_STATS SET ACTIVE = ACTIVE - 1 WHERE BOOK_ID = new.BOOK_ID;
+            UPDATE MEMBER_LOAN_STATS SET ACTIVE = ACTIVE - 1 WHERE MEMBER_ID = new.MEMBER_ID;
+            INSERT INTO DAILY_LOAN_STATS (DAY, RETURNED) VALUES (date(new.RETURNED_AT), 1)
+            ON CONFLICT (DAY) DO UPDATE SET RETURNED = RETURNED + 1;
+        END
+        ''',
+        # loans made before the history existed start today with the default loan period
+        '''
+        INSERT INTO LOANS (BOOK_ID, MEMBER_ID, LENT_AT, DUE_AT)
+        SELECT BOOK_ID, MEMBER_ID, datetime('now'), datetime('now', '+14 days') FROM LEND_BOOKS
+        ''',
+    ],
+    # 6: CURRENT_LOANS, the open loans joined with their book and member, kept up to
+    # date by triggers on LOANS and on edits or deletes of the books and members
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS CURRENT_LOANS (
+            BOOK_ID INTEGER PRIMARY KEY,
+            MEMBER_ID INTEGER NOT NULL,
+            TITLE VARCHAR(300),
+            MEMBER_NO VARCHAR(11),
+            FIRST_NAME VARCHAR(100),
+            LAST_NAME VARCHAR(100),
+            LENT_AT TEXT,
+            DUE_AT TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS IDX_CURRENT_LOANS_TITLE ON CURRENT_LOANS (TITLE)',
+        'CREATE INDEX IF NOT EXISTS IDX_CURRENT_LOANS_MEMBER_NO ON CURRENT_LOANS (MEMBER_NO, TITLE)',
+        'CREATE INDEX IF NOT EXISTS IDX_CURRENT_LOANS_MEMBER_ID ON CURRENT_LOANS (MEMBER_ID)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_LEND AFTER INSERT ON LOANS
+        WHEN new.RETURNED_AT IS NULL BEGIN
+            INSERT OR REPLACE INTO CURRENT_LOANS
+            SELECT new.BOOK_ID, new.MEMBER_ID, BO.TITLE, ME.MEMBER_NO, ME.FIRST_NAME, ME.LAST_NAME,
+                   new.LENT_AT, new.DUE_AT
+            FROM BOOKS AS BO, MEMBERS AS ME WHERE BO.ID = new.BOOK_ID AND ME.ID = new.MEMBER_ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_RETURN AFTER UPDATE OF RETURNED_AT ON LOANS
+        WHEN old.RETURNED_AT IS NULL AND new.RETURNED_AT IS NOT NULL BEGIN
+            DELETE FROM CURRENT_LOANS WHERE BOOK_ID = new.BOOK_ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_BOOK_UPDATE AFTER UPDATE OF TITLE ON BOOKS BEGIN
+            UPDATE CURRENT_LOANS SET TITLE = new.TITLE WHERE BOOK_ID = new.ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_BOOK_DELETE AFTER DELETE ON BOOKS BEGIN
+            DELETE FROM CURRENT_LOANS WHERE BOOK_ID = old.ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_MEMBER_UPDATE
+        AFTER UPDATE OF MEMBER_NO, FIRST_NAME, LAST_NAME ON MEMBERS BEGIN
+            UPDATE CURRENT_LOANS SET MEMBER_NO = new.MEMBER_NO, FIRST_NAME = new.FIRST_NAME,
+                                     LAST_NAME = new.LAST_NAME
+            WHERE MEMBER_ID = new.ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_MEMBER_DELETE AFTER DELETE ON MEMBERS BEGIN
+            DELETE FROM CURRENT_LOANS WHERE MEMBER_ID = old.ID;
+        END
+        ''',
+        '''
+        INSERT OR REPLACE INTO CURRENT_LOANS
+        SELECT LB.BOOK_ID, LB.MEMBER_ID, BO.TITLE, ME.MEMBER_NO, ME.FIRST_NAME, ME.LAST_NAME,
+               LO.LENT_AT, LO.DUE_AT
+        FROM LEND_BOOKS AS LB
+        JOIN BOOKS AS BO ON BO.ID = LB.BOOK_ID
+        JOIN MEMBERS AS ME ON ME.ID = LB.MEMBER_ID
+        LEFT JOIN LOANS AS LO ON LO.BOOK_ID = LB.BOOK_ID AND LO.RETURNED_AT IS NULL
+        ''',
+    ],
+    # 7: bulk imports index their books for search in one statement per batch; while
+    # a batch holds a BOOKS_FTS_DEFERRED row the per-row FTS trigger stands aside
+    [
+        'CREATE TABLE IF NOT EXISTS BOOKS_FTS_DEFERRED (FLAG INTEGER)',
+        'DROP TRIGGER IF EXISTS BOOKS_FTS_INSERT',
+        '''
+        CREATE TRIGGER IF NOT EXISTS BOOKS_FTS_INSERT AFTER INSERT ON BOOKS
+        WHEN NOT EXISTS (SELECT 1 FROM BOOKS_FTS_DEFERRED) BEGIN
+            INSERT INTO BOOKS_FTS (rowid, TITLE, AUTHOR, PUBLISHER)
+            VALUES (new.ID, new.TITLE, new.AUTHOR, new.PUBLISHER);
+        END
+        ''',
+    ],
+    # 8: copies. A book has one or more copies, each with a barcode and a status;
+    # loans are per copy and BOOK_COPY_COUNTS keeps the number of copies and
+    # available copies per book. Existing books get one copy, lent if the book is.
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS COPIES (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            BOOK_ID INTEGER NOT NULL,
+            BARCODE VARCHAR(32),
+            STATUS VARCHAR(10) NOT NULL DEFAULT 'available',
+            FOREIGN KEY (BOOK_ID) REFERENCES BOOKS(ID)
+        )
+        ''',
+        '''
+        INSERT INTO COPIES (ID, BOOK_ID, BARCODE, STATUS)
+        SELECT ID, ID, printf('C%07d', ID),
+               CASE WHEN ID IN (SELECT BOOK_ID FROM LEND_BOOKS) THEN 'lent' ELSE 'available' END
+        FROM BOOKS
+        ''',
+        'CREATE UNIQUE INDEX IF NOT EXISTS IDX_COPIES_BARCODE ON COPIES (BARCODE)',
+        'CREATE INDEX IF NOT EXISTS IDX_COPIES_BOOK_ID ON COPIES (BOOK_ID)',
+        # the first available copy of a book is one seek into this index
+        "CREATE INDEX IF NOT EXISTS IDX_COPIES_AVAILABLE ON COPIES (BOOK_ID, ID) WHERE STATUS = 'available'",
+        '''
+        CREATE TABLE IF NOT EXISTS BOOK_COPY_COUNTS (
+            BOOK_ID INTEGER PRIMARY KEY,
+            COPIES INTEGER NOT NULL DEFAULT 0,
+            AVAILABLE INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        INSERT INTO BOOK_COPY_COUNTS (BOOK_ID, COPIES, AVAILABLE)
+        SELECT BOOK_ID, COUNT(*), SUM(STATUS = 'available') FROM COPIES GROUP BY BOOK_ID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS COPIES_BARCODE AFTER INSERT ON COPIES
+        WHEN new.BARCODE IS NULL BEGIN
+            UPDATE COPIES SET BARCODE = printf('C%07d', new.ID) WHERE ID = new.ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS COPIES_COUNT_INSERT AFTER INSERT ON COPIES BEGIN
+            INSERT INTO BOOK_COPY_COUNTS (BOOK_ID, COPIES, AVAILABLE)
+            VALUES (new.BOOK_ID, 1, new.STATUS = 'available')
+            ON CONFLICT (BOOK_ID) DO UPDATE SET COPIES = COPIES + 1, AVAILABLE = AVAILABLE + excluded.AVAILABLE;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS COPIES_COUNT_DELETE AFTER DELETE ON COPIES BEGIN
+            UPDATE BOOK_COPY_COUNTS SET COPIES = COPIES - 1, AVAILABLE = AVAILABLE - (old.STATUS = 'available')
+            WHERE BOOK_ID = old.BOOK_ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS COPIES_COUNT_STATUS AFTER UPDATE OF STATUS ON COPIES
+        WHEN old.STATUS IS NOT new.STATUS BEGIN
+            UPDATE BOOK_COPY_COUNTS
+            SET AVAILABLE = AVAILABLE + (new.STATUS = 'available') - (old.STATUS = 'available')
+            WHERE BOOK_ID = new.BOOK_ID;
+        END
+        ''',
+        # bulk imports add the first copies of their books with one statement per batch,
+        # like their search index rows, so the flag table gets a general name
+        'ALTER TABLE BOOKS_FTS_DEFERRED RENAME TO BOOKS_BULK_INSERT',
+        '''
+        CREATE TRIGGER IF NOT EXISTS BOOKS_FIRST_COPY AFTER INSERT ON BOOKS
+        WHEN NOT EXISTS (SELECT 1 FROM BOOKS_BULK_INSERT) BEGIN
+            INSERT INTO COPIES (BOOK_ID) VALUES (new.ID);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS BOOKS_COPIES_DELETE AFTER DELETE ON BOOKS BEGIN
+            DELETE FROM COPIES WHERE BOOK_ID = old.ID;
+            DELETE FROM BOOK_COPY_COUNTS WHERE BOOK_ID = old.ID;
+        END
+        ''',
+        # LEND_BOOKS becomes one row per lent copy
+        '''
+        CREATE TABLE LEND_COPIES (
+            COPY_ID INTEGER PRIMARY KEY,
+            BOOK_ID INTEGER NOT NULL,
+            MEMBER_ID INTEGER NOT NULL,
+            FOREIGN KEY (COPY_ID) REFERENCES COPIES(ID),
+            FOREIGN KEY (BOOK_ID) REFERENCES BOOKS(ID),
+            FOREIGN KEY (MEMBER_ID) REFERENCES MEMBERS(ID)
+        )
+        ''',
+        'INSERT INTO LEND_COPIES (COPY_ID, BOOK_ID, MEMBER_ID) SELECT BOOK_ID, BOOK_ID, MEMBER_ID FROM LEND_BOOKS',
+        'DROP TABLE LEND_BOOKS',
+        'ALTER TABLE LEND_COPIES RENAME TO LEND_BOOKS',
+        'CREATE INDEX IF NOT EXISTS IDX_LEND_BOOKS_BOOK_ID ON LEND_BOOKS (BOOK_ID)',
+        'CREATE INDEX IF NOT EXISTS IDX_LEND_BOOKS_MEMBER_ID ON LEND_BOOKS (MEMBER_ID)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS LEND_BOOKS_COPY_LENT AFTER INSERT ON LEND_BOOKS BEGIN
+            UPDATE COPIES SET STATUS = 'lent' WHERE ID = new.COPY_ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS LEND_BOOKS_COPY_RETURNED AFTER DELETE ON LEND_BOOKS BEGIN
+            UPDATE COPIES SET STATUS = 'available' WHERE ID = old.COPY_ID AND STATUS = 'lent';
+        END
+        ''',
+        'ALTER TABLE LOANS ADD COLUMN COPY_ID INTEGER',
+        'UPDATE LOANS SET COPY_ID = BOOK_ID',
+        'CREATE INDEX IF NOT EXISTS IDX_LOANS_OPEN_COPY ON LOANS (COPY_ID) WHERE RETURNED_AT IS NULL',
+        # CURRENT_LOANS is rebuilt with one row per lent copy
+        'DROP TRIGGER IF EXISTS CURRENT_LOANS_LEND',
+        'DROP TRIGGER IF EXISTS CURRENT_LOANS_RETURN',
+        'DROP TRIGGER IF EXISTS CURRENT_LOANS_BOOK_UPDATE',
+        'DROP TRIGGER IF EXISTS CURRENT_LOANS_BOOK_DELETE',
+        'DROP TRIGGER IF EXISTS CURRENT_LOANS_MEMBER_UPDATE',
+        'DROP TRIGGER IF EXISTS CURRENT_LOANS_MEMBER_DELETE',
+        'DROP TABLE IF EXISTS CURRENT_LOANS',
+        '''
+        CREATE TABLE CURRENT_LOANS (
+            COPY_ID INTEGER PRIMARY KEY,
+            BOOK_ID INTEGER NOT NULL,
+            MEMBER_ID INTEGER NOT NULL,
+            TITLE VARCHAR(300),
+            BARCODE VARCHAR(32),
+            MEMBER_NO VARCHAR(11),
+            FIRST_NAME VARCHAR(100),
+            LAST_NAME VARCHAR(100),
+            LENT_AT TEXT,
+            DUE_AT TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS IDX_CURRENT_LOANS_TITLE ON CURRENT_LOANS (TITLE)',
+        'CREATE INDEX IF NOT EXISTS IDX_CURRENT_LOANS_MEMBER_NO ON CURRENT_LOANS (MEMBER_NO, TITLE)',
+        'CREATE INDEX IF NOT EXISTS IDX_CURRENT_LOANS_MEMBER_ID ON CURRENT_LOANS (MEMBER_ID)',
+        'CREATE INDEX IF NOT EXISTS IDX_CURRENT_LOANS_BOOK_ID ON CURRENT_LOANS (BOOK_ID)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_LEND AFTER INSERT ON LOANS
+        WHEN new.RETURNED_AT IS NULL BEGIN
+            INSERT OR REPLACE INTO CURRENT_LOANS
+            SELECT new.COPY_ID, new.BOOK_ID, new.MEMBER_ID, BO.TITLE,
+                   (SELECT BARCODE FROM COPIES WHERE ID = new.COPY_ID),
+                   ME.MEMBER_NO, ME.FIRST_NAME, ME.LAST_NAME, new.LENT_AT, new.DUE_AT
+            FROM BOOKS AS BO, MEMBERS AS ME WHERE BO.ID = new.BOOK_ID AND ME.ID = new.MEMBER_ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_RETURN AFTER UPDATE OF RETURNED_AT ON LOANS
+        WHEN old.RETURNED_AT IS NULL AND new.RETURNED_AT IS NOT NULL BEGIN
+            DELETE FROM CURRENT_LOANS WHERE COPY_ID = new.COPY_ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_BOOK_UPDATE AFTER UPDATE OF TITLE ON BOOKS BEGIN
+            UPDATE CURRENT_LOANS SET TITLE = new.TITLE WHERE BOOK_ID = new.ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_BOOK_DELETE AFTER DELETE ON BOOKS BEGIN
+            DELETE FROM CURRENT_LOANS WHERE BOOK_ID = old.ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_MEMBER_UPDATE
+        AFTER UPDATE OF MEMBER_NO, FIRST_NAME, LAST_NAME ON MEMBERS BEGIN
+            UPDATE CURRENT_LOANS SET MEMBER_NO = new.MEMBER_NO, FIRST_NAME = new.FIRST_NAME,
+                                     LAST_NAME = new.LAST_NAME
+            WHERE MEMBER_ID = new.ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_MEMBER_DELETE AFTER DELETE ON MEMBERS BEGIN
+            DELETE FROM CURRENT_LOANS WHERE MEMBER_ID = old.ID;
+        END
+        ''',
+        '''
+        INSERT INTO CURRENT_LOANS
+        SELECT LB.COPY_ID, LB.BOOK_ID, LB.MEMBER_ID, BO.TITLE, CO.BARCODE,
+               ME.MEMBER_NO, ME.FIRST_NAME, ME.LAST_NAME, LO.LENT_AT, LO.DUE_AT
+        FROM LEND_BOOKS AS LB
+        JOIN BOOKS AS BO ON BO.ID = LB.BOOK_ID
+        JOIN MEMBERS AS ME ON ME.ID = LB.MEMBER_ID
+        LEFT JOIN COPIES AS CO ON CO.ID = LB.COPY_ID
+        LEFT JOIN LOANS AS LO ON LO.COPY_ID = LB.COPY_ID AND LO.RETURNED_AT IS NULL
+        ''',
+    ],
+    # 9: while a batch lend or return holds a LOANS_BULK_WRITE row, the per-row loan
+    # statistics and CURRENT_LOANS triggers stand aside; the batch updates them with
+    # one statement per table instead
+    [
+        'CREATE TABLE IF NOT EXISTS LOANS_BULK_WRITE (FLAG INTEGER)',
+        'DROP TRIGGER IF EXISTS LOANS_STATS_INSERT',
+        'DROP TRIGGER IF EXISTS LOANS_STATS_RETURN',
+        'DROP TRIGGER IF EXISTS CURRENT_LOANS_LEND',
+        'DROP TRIGGER IF EXISTS CURRENT_LOANS_RETURN',
+        '''
+        CREATE TRIGGER IF NOT EXISTS LOANS_STATS_INSERT AFTER INSERT ON LOANS
+        WHEN NOT EXISTS (SELECT 1 FROM LOANS_BULK_WRITE) BEGIN
+            INSERT INTO BOOK_LOAN_STATS (BOOK_ID, LOANS, ACTIVE, LAST_LENT_AT)
+            VALUES (new.BOOK_ID, 1, new.RETURNED_AT IS NULL, new.LENT_AT)
+            ON CONFLICT (BOOK_ID) DO UPDATE SET LOANS = LOANS + 1, ACTIVE = ACTIVE + excluded.ACTIVE,
+                LAST_LENT_AT = max(coalesce(LAST_LENT_AT, ''), excluded.LAST_LENT_AT);
+            INSERT INTO MEMBER_LOAN_STATS (MEMBER_ID, LOANS, ACTIVE, LAST_LENT_AT)
+            VALUES (new.MEMBER_ID, 1, new.RETURNED_AT IS NULL, new.LENT_AT)
+            ON CONFLICT (MEMBER_ID) DO UPDATE SET LOANS = LOANS + 1, ACTIVE = ACTIVE + excluded.ACTIVE,
+                LAST_LENT_AT = max(coalesce(LAST_LENT_AT, ''), excluded.LAST_LENT_AT);
+            INSERT INTO DAILY_LOAN_STATS (DAY, LENT) VALUES (date(new.LENT_AT), 1)
+            ON CONFLICT (DAY) DO UPDATE SET LENT = LENT + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS LOANS_STATS_RETURN AFTER UPDATE OF RETURNED_AT ON LOANS
+        WHEN old.RETURNED_AT IS NULL AND new.RETURNED_AT IS NOT NULL
+             AND NOT EXISTS (SELECT 1 FROM LOANS_BULK_WRITE) BEGIN
+            UPDATE BOOK_LOAN_STATS SET ACTIVE = ACTIVE - 1 WHERE BOOK_ID = new.BOOK_ID;
+            UPDATE MEMBER_LOAN_STATS SET ACTIVE = ACTIVE - 1 WHERE MEMBER_ID = new.MEMBER_ID;
+            INSERT INTO DAILY_LOAN_STATS (DAY, RETURNED) VALUES (date(new.RETURNED_AT), 1)
+            ON CONFLICT (DAY) DO UPDATE SET RETURNED = RETURNED + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_LEND AFTER INSERT ON LOANS
+        WHEN new.RETURNED_AT IS NULL AND NOT EXISTS (SELECT 1 FROM LOANS_BULK_WRITE) BEGIN
+            INSERT OR REPLACE INTO CURRENT_LOANS
+            SELECT new.COPY_ID, new.BOOK_ID, new.MEMBER_ID, BO.TITLE,
+                   (SELECT BARCODE FROM COPIES WHERE ID = new.COPY_ID),
+                   ME.MEMBER_NO, ME.FIRST_NAME, ME.LAST_NAME, new.LENT_AT, new.DUE_AT
+            FROM BOOKS AS BO, MEMBERS AS ME WHERE BO.ID = new.BOOK_ID AND ME.ID = new.MEMBER_ID;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS CURRENT_LOANS_RETURN AFTER UPDATE OF RETURNED_AT ON LOANS
+        WHEN old.RETURNED_AT IS NULL AND new.RETURNED_AT IS NOT NULL
+             AND NOT EXISTS (SELECT 1 FROM LOANS_BULK_WRITE) BEGIN
+            DELETE FROM CURRENT_LOANS WHERE COPY_ID = new.COPY_ID;
+        END
+        ''',
+    ],
+    # 10: members and books used to be deletable while they had copies lent, which
+    # left their loans open for good; those loans are closed as returned today and
+    # their LEND_BOOKS rows are moved to LEND_BOOKS_ORPHANS
+    [
+        '''
+        UPDATE LOANS SET RETURNED_AT = datetime('now')
+        WHERE RETURNED_AT IS NULL
+          AND (MEMBER_ID NOT IN (SELECT ID FROM MEMBERS) OR COPY_ID NOT IN (SELECT ID FROM COPIES))
+        ''',
+        'ALTER TABLE LEND_BOOKS_ORPHANS ADD COLUMN COPY_ID INTEGER',
+        '''
+        INSERT INTO LEND_BOOKS_ORPHANS (BOOK_ID, MEMBER_ID, COPY_ID)
+        SELECT BOOK_ID, MEMBER_ID, COPY_ID FROM LEND_BOOKS
+        WHERE MEMBER_ID NOT IN (SELECT ID FROM MEMBERS) OR COPY_ID NOT IN (SELECT ID FROM COPIES)
+        ''',
+        'DELETE FROM LEND_BOOKS WHERE MEMBER_ID NOT IN (SELECT ID FROM MEMBERS) OR COPY_ID NOT IN (SELECT ID FROM COPIES)',
+        'DELETE FROM CURRENT_LOANS WHERE COPY_ID NOT IN (SELECT COPY_ID FROM LEND_BOOKS)',
+    ],
+]
+
+
+# per-connection scratch tables of the batch lend and return methods
+BATCH_TABLES = [
+    '''
+    CREATE TEMP TABLE IF NOT EXISTS LEND_BATCH (
+        SEQ INTEGER PRIMARY KEY,
+        TITLE TEXT,
+        MEMBER_NO TEXT,
+        BARCODE TEXT,
+        BOOK_ID INTEGER,
+        MEMBER_ID INTEGER,
+        COPY_ID INTEGER
+    )
+    ''',
+    '''
+    CREATE TEMP TABLE IF NOT EXISTS RETURN_BATCH (
+        SEQ INTEGER PRIMARY KEY,
+        TITLE TEXT,
+        BARCODE TEXT,
+        BOOK_ID INTEGER,
+        MEMBER_ID INTEGER,
+        COPY_ID INTEGER
+    )
+    ''',
+]
+
+
+class ConnectionProfile:
+    """
+    Class representing the SQLite connection settings of a library.
+    """
+    JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+    SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+    def __init__(self, path="library.db", journal_mode="WAL", synchronous="NORMAL",
+                 mmap_size=256 * 1024 * 1024, cache_size=-64 * 1024, busy_timeout=5000):
+        """
+        Initialize a ConnectionProfile object.
+        The defaults favour write throughput: WAL with synchronous=NORMAL only
+        syncs on checkpoints instead of on every commit.
+        :param path (str): The path to the database file.
+        :param journal_mode (str): The SQLite journal mode.
+        :param synchronous (str): The SQLite synchronous level.
+        :param mmap_size (int): The number of bytes of the database to memory-map.
+        :param cache_size (int): The page cache size; negative values are in KiB.
+        :param busy_timeout (int): Milliseconds to wait on a locked database.
+        """
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+        if journal_mode not in self.JOURNAL_MODES:
+            raise ValueError(f"Unknown journal mode: {journal_mode}")
+        if synchronous not in self.SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unknown synchronous level: {synchronous}")
+        self.path = path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.mmap_size = int(mmap_size)
+        self.cache_size = int(cache_size)
+        self.busy_timeout = int(busy_timeout)
+
+    def connect(self, factory=sqlite3.Connection, check_same_thread=True):
+        """
+        Open a connection to the database and apply the profile to it.
+        :param factory (type): The sqlite3.Connection subclass to create.
+        :param check_same_thread (bool): False lets other threads use the connection under a lock.
+        :return: (sqlite3.Connection) The configured connection.
+        """
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000, factory=factory,
+                               check_same_thread=check_same_thread)
+        conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        conn.execute(f"PRAGMA cache_size = {self.cache_size}")
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+        return conn
+
+
+class DatabaseBackup:
+    """
+    Class representing online backups and rotated snapshots of a library database.
+    Pages are copied with the SQLite backup API in small steps, sleeping
+    between them, so lends and returns keep running during a backup. In WAL
+    mode the copy is made inside one read transaction: writers are not
+    blocked and the backup is a consistent snapshot of the moment it started,
+    instead of restarting whenever the database changes.
+    """
+    PAGES = 256
+    SLEEP = 0.005
+    KEEP = 7
+    DIRECTORY = "backups"
+
+    def __init__(self, profile=None, directory=None, keep=None, pages=None, sleep=None):
+        """
+        Initialize the DatabaseBackup object.
+        :param profile (ConnectionProfile): The connection settings of the database; defaults to library.db.
+        :param directory (str): Where snapshots are kept; defaults to a backups folder next to the database.
+        :param keep (int): The number of snapshots kept; older ones are deleted.
+        :param pages (int): The number of pages copied per step.
+        :param sleep (float): Seconds to wait between steps.
+        """
+        self.profile = profile or ConnectionProfile()
+        self.directory = directory or os.path.join(os.path.dirname(os.path.abspath(self.profile.path)),
+                                                   self.DIRECTORY)
+        self.keep = self.KEEP if keep is None else keep
+        self.pages = pages or self.PAGES
+        self.sleep = self.SLEEP if sleep is None else sleep
+        self.stem = os.path.splitext(os.path.basename(self.profile.path))[0]
+        self.snapshot_name = re.compile(rf"{re.escape(self.stem)}-\d{{8}}-\d{{6}}-\d{{6}}\.db")
+
+    def backup(self, target, progress=None):
+        """
+        Copy the database to target while it stays in use.
+        The copy is written to target.partial and only replaces target once
+        it is complete.
+        :param target (str): The path of the backup file.
+        :param progress (callable): Called after each step with the copied and the total number of pages.
+        :return: (int) The number of copied pages.
+        """
+        partial = f"{target}.partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        source = self.profile.connect()
+        source.isolation_level = None
+        destination = sqlite3.connect(partial)
+        copied = [0]
+
+        def step(status, remaining, total):
+            copied[0] = total - remaining
+            if progress:
+                progress(copied[0], total)
+            if remaining and self.sleep:
+                time.sleep(self.sleep)
+
+        try:
+            if self.profile.journal_mode == "WAL":
+                # pins the snapshot; in rollback modes this lock would stall writers
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            source.backup(destination, pages=self.pages, progress=step)
+            destination.execute("PRAGMA journal_mode = DELETE")
+            destination.close()
+            os.replace(partial, target)
+        except BaseException:
+            destination.close()
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        finally:
+            source.close()
+        return copied[0]
+
+    def snapshot(self, progress=None, protect=None):
+        """
+        Back the database up to a new timestamped file and delete the oldest snapshots beyond keep.
+        :param progress (callable): Called after each step with the copied and the total number of pages.
+        :param protect (str): A snapshot that is never deleted, e.g. one about to be restored.
+        :return: (str) The path of the snapshot.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self.stem}-{datetime.datetime.now():%Y%m%d-%H%M%S-%f}.db")
+        self.backup(path, progress)
+        protected = os.path.abspath(protect) if protect else None
+        for old in self.snapshots()[self.keep:]:
+            if os.path.abspath(old) != protected:
+                os.remove(old)
+        return path
+
+    def snapshots(self):
+        """
+        List the snapshots of the database.
+        :return: (list) The paths of the snapshots, newest first.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted((name for name in os.listdir(self.directory) if self.snapshot_name.fullmatch(name)),
+                       reverse=True)
+        return [os.path.join(self.directory, name) for name in names]
+
+    @staticmethod
+    def verify(path):
+        """
+        Check that a backup file is an intact SQLite database.
+        :param path (str): The path of the backup file.
+        :return: None
+        """
+        if not os.path.isfile(path):
+            raise ValueError(f"No backup file at {path}")
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            result = conn.execute("PRAGMA quick_check").fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"{path} is not a library database: {e}")
+        finally:
+            conn.close()
+        if result != "ok":
+            raise ValueError(f"{path} is damaged: {result}")
+
+
+class ImportResult:
+    """
+    Class representing the outcome of a bulk CSV import.
+    Every row that was not inserted is listed in rejected with its line number
+    and the reason; duplicates counts the ones skipped because their ISBN or
+    member no was repeated in the file or already stored.
+    """
+    def __init__(self):
+        """
+        Initialize an empty ImportResult object.
+        """
+        self.inserted = 0
+        self.duplicates = 0
+        self.rejected = []
+        self.cancelled = False
+
+    def reject(self, line_no, reason):
+        """
+        Record a row that could not be imported.
+        :param line_no (int): The line number of the row in the CSV file.
+        :param reason (str): Why the row was rejected.
+        :return: None
+        """
+        self.rejected.append((line_no, reason))
+
+    def duplicate(self, line_no, reason):
+        """
+        Record a row skipped because its key is already taken.
+        :param line_no (int): The line number of the row in the CSV file.
+        :param reason (str): Which key was repeated.
+        :return: None
+        """
+        self.duplicates += 1
+        self.reject(line_no, reason)
+
+    def __repr__(self):
+        return (f"ImportResult(inserted={self.inserted}, duplicates={self.duplicates}, "
+                f"rejected={len(self.rejected)}, cancelled={self.cancelled})")
+
+
+class ImportProgress:
+    """
+    Class representing how far a CSV import has got.
+    """
+    def __init__(self, total_bytes):
+        """
+        Initialize an ImportProgress object at the start of a file.
+        :param total_bytes (int): The size of the file.
+        """
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.rows = 0
+        self.started = time.monotonic()
+
+    def update(self, rows, bytes_read):
+        """
+        Record a processed chunk.
+        :param rows (int): The number of rows in the chunk.
+        :param bytes_read (int): The byte offset reached in the file.
+        :return: None
+        """
+        self.rows += rows
+        self.bytes_read = bytes_read
+
+    @property
+    def percent(self):
+        return 100.0 * self.bytes_read / self.total_bytes if self.total_bytes else 100.0
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.monotonic() - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """
+        Estimate the seconds left from the byte rate so far.
+        :return: (float) The seconds left, or None before anything was read.
+        """
+        if not self.bytes_read:
+            return None
+        elapsed = time.monotonic() - self.started
+        return elapsed * (self.total_bytes - self.bytes_read) / self.bytes_read
+
+
+def isbn_is_valid(isbn):
+    """
+    Check the check digit of an ISBN-10 or ISBN-13; hyphens and spaces are ignored.
+    :param isbn (str): The ISBN to check.
+    :return: (bool) True if the ISBN is well formed and its checksum matches.
+    """
+    digits = isbn.replace("-", "").replace(" ", "").upper()
+    if len(digits) == 10 and digits[:9].isdigit() and (digits[9].isdigit() or digits[9] == "X"):
+        total = sum((10 - i) * (10 if digit == "X" else int(digit)) for i, digit in enumerate(digits))
+        return total % 11 == 0
+    if len(digits) == 13 and digits.isdigit():
+        return sum((3 if i % 2 else 1) * int(digit) for i, digit in enumerate(digits)) % 10 == 0
+    return False
+
+
+def parse_book_row(row, columns, today):
+    """
+    Coerce and validate one books CSV row, with the checks of the Add Book window.
+    :param row (list): The fields of the row.
+    :param columns (dict): Header names mapped to field positions.
+    :param today (datetime.date): The date the import runs, bounding the published year.
+    :return: (Book) The book; raises ValueError with the reason if the row is invalid.
+    """
+    try:
+        title = row[columns["title"]].strip()
+        author = row[columns["author"]]
+        publisher = row[columns["publisher"]]
+        published_year = row[columns["published_year"]]
+        rating = row[columns["rating"]]
+        isbn = row[columns["ISBN"]].strip()
+    except (KeyError, IndexError):
+        raise ValueError("missing column")
+    if not title or not isbn:
+        raise ValueError("missing title or ISBN")
+    try:
+        published_year = int(published_year)
+        rating = float(rating)
+    except ValueError:
+        raise ValueError("published year and rating must be numbers")
+    if rating > 5 or rating < 1:
+        raise ValueError(f"rating {rating} is not between 1 and 5")
+    if published_year < 1850 or published_year > today.year:
+        raise ValueError(f"published year {published_year} is not between 1850 and {today.year}")
+    if not isbn_is_valid(isbn):
+        raise ValueError(f"ISBN {isbn} has a wrong check digit")
+    return Book(title, author, publisher, published_year, rating, isbn)
+
+
+def parse_member_row(row, columns, today):
+    """
+    Validate one members CSV row.
+    :param row (list): The fields of the row.
+    :param columns (dict): Header names mapped to field positions.
+    :param today (datetime.date): The date the import runs.
+    :return: (Member) The member; raises ValueError with the reason if the row is invalid.
+    """
+    try:
+        member = Member(row[columns["first_name"]], row[columns["last_name"]], row[columns["email"]],
+                        row[columns["gender"]], row[columns["state"]], row[columns["member_no"]].strip())
+    except (KeyError, IndexError):
+        raise ValueError("missing column")
+    if not member.member_no:
+        raise ValueError("missing member no")
+    return member
+
+
+def csv_byte_ranges(filename, chunk_bytes):
+    """
+    Split a CSV file into byte ranges that start and end on record boundaries.
+    A line break only ends a record when an even number of quote characters
+    came before it in the range (escaped quotes are doubled), so a quoted
+    field with line breaks in it never straddles two ranges.
+    :param filename (str): The path to the CSV file.
+    :param chunk_bytes (int): The approximate size of a range.
+    :return: (tuple) The header fields and a list of (start, end) offsets after the header.
+    """
+    import csv
+
+    def read_record(csvfile, quoted=0):
+        """
+        Read on to the end of the record the file position is in.
+        :param quoted (int): 1 if the position is inside a quoted field.
+        :return: (bytes) The lines read.
+        """
+        lines = [csvfile.readline()]
+        quoted ^= lines[-1].count(b'"') % 2
+        while quoted and lines[-1]:
+            lines.append(csvfile.readline())
+            quoted ^= lines[-1].count(b'"') % 2
+        return b"".join(lines)
+
+    with open(filename, "rb") as csvfile:
+        header = next(csv.reader(io.StringIO(read_record(csvfile).decode("utf-8-sig"), newline="")), [])
+        size = os.fstat(csvfile.fileno()).st_size
+        ranges = []
+        start = csvfile.tell()
+        while start < size:
+            quoted = csvfile.read(chunk_bytes).count(b'"') % 2
+            read_record(csvfile, quoted)
+            end = min(csvfile.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return [name.strip() for name in header], ranges
+
+
+def parse_csv_range(filename, start, end, header, parse_row):
+    """
+    Parse and validate the rows in one byte range of a CSV file.
+    Runs in an import worker process, so everything it takes and returns is picklable.
+    :param filename (str): The path to the CSV file.
+    :param start (int): The offset of the first byte.
+    :param end (int): The offset after the last byte.
+    :param header (list): The header fields of the file.
+    :param parse_row (callable): parse_book_row or parse_member_row.
+    :return: (tuple) The valid records, their line numbers and (line number, reason)
+             rejections, both relative to the range, and the number of lines in it.
+    """
+    import csv
+
+    with open(filename, "rb") as csvfile:
+        csvfile.seek(start)
+        data = csvfile.read(end - start)
+    columns = {name: i for i, name in enumerate(header)}
+    today = datetime.date.today()
+    records, line_numbers, rejected = [], [], []
+    reader = csv.reader(io.StringIO(data.decode("utf-8"), newline=""))
+    for row in reader:
+        if not row:
+            continue
+        try:
+            records.append(parse_row(row, columns, today))
+            line_numbers.append(reader.line_num)
+        except ValueError as e:
+            rejected.append((reader.line_num, str(e)))
+    return records, line_numbers, rejected, data.count(b"\n")
+
+
+class LRUCache:
+    """
+    Class representing a bounded, thread-safe mapping that evicts the least recently used key.
+    Every invalidation bumps a generation counter; a put made with the
+    generation read before its lookup is dropped if an invalidation happened
+    in between, so a concurrent delete can never be undone by a slow reader.
+    """
+    def __init__(self, capacity=1024):
+        """
+        Initialize an empty LRUCache object.
+        :param capacity (int): The maximum number of keys kept; 0 disables the cache.
+        """
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up a key and mark it as recently used.
+        :param key: The key to look up.
+        :return: The cached value, or None on a miss.
+        """
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation=None):
+        """
+        Store a value, evicting the least recently used key if the cache is full.
+        :param key: The key to store.
+        :param value: The value to store; None values are not cached.
+        :param generation (int): The generation read before the value was looked up.
+        :return: None
+        """
+        if value is None or not self.capacity:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        Drop a key from the cache.
+        :param key: The key to drop.
+        :return: None
+        """
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """
+        Drop every key from the cache.
+        :return: None
+        """
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return f"LRUCache(size={len(self)}/{self.capacity}, hits={self.hits}, misses={self.misses})"
+
+
+class Histogram:
+    """
+    Class representing a latency histogram with fixed, roughly logarithmic buckets.
+    """
+    BOUNDS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+
+    def __init__(self):
+        """
+        Initialize an empty Histogram object.
+        """
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(self.BOUNDS_MS)
+
+    def record(self, ms):
+        """
+        Add one measurement.
+        :param ms (float): The duration in milliseconds.
+        :return: None
+        """
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        self.buckets[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+
+    def percentile(self, fraction):
+        """
+        Estimate a percentile as the upper bound of the bucket it falls in.
+        :param fraction (float): The percentile as a fraction, e.g. 0.95.
+        :return: (float) The estimated duration in milliseconds.
+        """
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bound, bucket in zip(self.BOUNDS_MS, self.buckets):
+            seen += bucket
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        """
+        Summarize the histogram.
+        :return: (dict) count, total, mean, p50, p95, max and the non-empty bucket counts.
+        """
+        return {
+            "count": self.count,
+            "total_ms": self.total_ms,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": self.max_ms,
+            "buckets": {str(bound): bucket for bound, bucket in zip(self.BOUNDS_MS, self.buckets) if bucket},
+        }
+
+
+class Metrics:
+    """
+    Class collecting timings of Library operations, SQL statements and commits.
+    Anything slower than slow_ms is also kept in a bounded slow-query log.
+    """
+    def __init__(self, slow_ms=50, slow_log_size=200):
+        """
+        Initialize an empty Metrics object.
+        :param slow_ms (float): The duration, in milliseconds, from which a call is logged as slow.
+        :param slow_log_size (int): The number of slow calls kept.
+        """
+        self.slow_ms = slow_ms
+        self.histograms = {}
+        self.slow_log = deque(maxlen=slow_log_size)
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, kind, name, seconds):
+        """
+        Record one timed call.
+        :param kind (str): "op" for Library methods, "sql" for statements, "commit" for commits.
+        :param name (str): The method name or the normalized SQL text.
+        :param seconds (float): The duration.
+        :return: None
+        """
+        ms = seconds * 1000
+        with self.lock:
+            histogram = self.histograms.get((kind, name))
+            if histogram is None:
+                histogram = self.histograms[(kind, name)] = Histogram()
+            histogram.record(ms)
+            if ms >= self.slow_ms:
+                self.slow_log.append({"time": time.time(), "kind": kind, "name": name, "ms": ms})
+
+    def snapshot(self):
+        """
+        Summarize everything recorded so far.
+        :return: (dict) The histograms by kind and name, and the slow-query log.
+        """
+        stats = {}
+        with self.lock:
+            for (kind, name), histogram in self.histograms.items():
+                stats.setdefault(kind, {})[name] = histogram.summary()
+            slow_log = list(self.slow_log)
+        return {
+            "since": self.started,
+            "slow_ms": self.slow_ms,
+            "stats": stats,
+            "slow_log": slow_log,
+        }
+
+    def dump(self, path):
+        """
+        Write a snapshot to a JSON metrics file.
+        :param path (str): The path of the file.
+        :return: None
+        """
+        import json
+
+        with open(path, "w", encoding="utf-8") as metrics_file:
+            json.dump(self.snapshot(), metrics_file, indent=2)
+
+    def reset(self):
+        """
+        Forget every measurement.
+        :return: None
+        """
+        with self.lock:
+            self.histograms.clear()
+            self.slow_log.clear()
+            self.started = time.time()
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Class representing a connection whose explicit commits are timed.
+    """
+    metrics = None
+
+    def commit(self):
+        if self.metrics is None:
+            return super().commit()
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            self.metrics.record("commit", "COMMIT", time.perf_counter() - start)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Class representing a cursor whose statements are timed per normalized SQL text.
+    """
+    metrics = None
+    PLACEHOLDERS = re.compile(r"\?(?:\s*,\s*\?)+")
+    WHITESPACE = re.compile(r"\s+")
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def normalize(sql):
+        """
+        Collapse whitespace and placeholder lists so equivalent statements share a histogram.
+        :param sql (str): The SQL text.
+        :return: (str) The normalized text.
+        """
+        return TimedCursor.PLACEHOLDERS.sub("?, ...", TimedCursor.WHITESPACE.sub(" ", sql).strip())
+
+    def execute(self, sql, *args):
+        if self.metrics is None:
+            return super().execute(sql, *args)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            self.metrics.record("sql", self.normalize(sql), time.perf_counter() - start)
+
+    def executemany(self, sql, *args):
+        if self.metrics is None:
+            return super().executemany(sql, *args)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            self.metrics.record("sql", self.normalize(sql), time.perf_counter() - start)
+
+
+def instrumented(method):
+    """
+    Decorate a Library method so every call is timed in Library.metrics.
+    :param method (function): The method to time.
+    :return: (function) The timed method.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.metrics is None:
+            return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.metrics.record("op", method.__name__, time.perf_counter() - start)
+    return wrapper
+
+
+class CirculationResult:
+    """
+    Class representing the outcome of a lend or return.
+    It is true only when the operation succeeded, so callers can still test it as a bool.
+    """
+    OK = "ok"
+    UNKNOWN_BOOK = "unknown book"
+    UNKNOWN_MEMBER = "unknown member"
+    ALREADY_LENT = "already lent"  # every copy of the book is lent
+    NOT_LENT = "not lent"
+
+    def __init__(self, status, book_id=None, member_id=None, copy_id=None):
+        """
+        Initialize a CirculationResult object.
+        :param status (str): One of the status constants of the class.
+        :param book_id (int): The ID of the book, if it was found.
+        :param member_id (int): The ID of the member, if it was found.
+        :param copy_id (int): The ID of the copy lent or returned.
         """
-        self.first_name = first_name
-        self.last_name = last_name
-        self.email = email
-        self.gender = gender
-        self.state = state
-        self.member_no = member_no
+        self.status = status
+        self.book_id = book_id
+        self.member_id = member_id
+        self.copy_id = copy_id
+
+    def __bool__(self):
+        return self.status == self.OK
+
+    def __repr__(self):
+        return (f"CirculationResult({self.status!r}, book_id={self.book_id}, member_id={self.member_id}, "
+                f"copy_id={self.copy_id})")
 
 
 class Library:
     """
     Class representing a library and its operations.
     """
-    def __init__(self):
+    CSV_CHUNK_BYTES = 1024 * 1024
+    IMPORT_WORKERS = os.cpu_count() or 1
+    SQL_VARIABLE_LIMIT = 900
+    PAGE_SIZE = 100
+    SEARCH_RESULTS_LIMIT = 10000
+    LOAN_DAYS = 14
+    # the barcodes given to copies added without one; reserved for them
+    AUTO_BARCODE = re.compile(r"C\d{7,}")
+    BOOK_COLUMNS = ("ID", "TITLE", "AUTHOR", "PUBLISHER", "PUBLISHED_YEAR", "RATING", "ISBN")
+    MEMBER_COLUMNS = ("ID", "FIRST_NAME", "LAST_NAME", "EMAIL", "GENDER", "STATE", "MEMBER_NO")
+    CURRENT_LOAN_COLUMNS = ("TITLE", "BARCODE", "MEMBER_NO", "FIRST_NAME", "LAST_NAME", "LENT_AT", "DUE_AT")
+    # export headers, in the layout add_books_from_csv / register_members_from_csv read
+    BOOK_EXPORT_FIELDS = ("id", "title", "author", "publisher", "published_year", "rating", "ISBN")
+    MEMBER_EXPORT_FIELDS = ("id", "first_name", "last_name", "email", "gender", "state", "member_no")
+    LOAN_EXPORT_FIELDS = ("id", "title", "barcode", "member_no", "lent_at", "due_at", "returned_at")
+    EXPORT_CHUNK_ROWS = 1000
+
+    def __init__(self, profile=None, id_cache_size=4096, metrics=None, check_same_thread=True,
+                 book_ids=None, member_ids=None):
         """
         Initialize the Library object and connect to the database.
+        :param profile (ConnectionProfile): The connection settings; defaults to library.db.
+        :param id_cache_size (int): How many title and member no -> ID lookups to cache each.
+        :param metrics (Metrics): Where operation and query timings are collected; False turns timing off.
+        :param check_same_thread (bool): False lets other threads use the connection under a lock.
+        :param book_ids (LRUCache): A title -> ID cache shared with other Library objects.
+        :param member_ids (LRUCache): A member no -> ID cache shared with other Library objects.
         """
-        self.conn = sqlite3.connect("library.db")
-        self.cursor = self.conn.cursor()
+        self.profile = profile or ConnectionProfile()
+        self.metrics = None if metrics is False else metrics or Metrics()
+        self.conn = self.profile.connect(factory=TimedConnection, check_same_thread=check_same_thread)
+        self.conn.metrics = self.metrics
+        self.cursor = self._open_cursor()
+        # lookups of single books and members and search results come back as records;
+        # bulk reads, pages and windows keep the plain tuples, which are cheaper to fetch
+        self.book_cursor = self._open_cursor(Book.row_factory)
+        self.member_cursor = self._open_cursor(Member.row_factory)
+        self.book_ids = book_ids if book_ids is not None else LRUCache(id_cache_size)
+        self.member_ids = member_ids if member_ids is not None else LRUCache(id_cache_size)
+        # (FTS query, data generation, ranked book IDs) of the last search
+        self.search_ranking = (None, None, [])
+        # table -> (data generation, positions, IDs at those positions) seen by _select_window
+        self.window_anchors = {}
+        # held around each CSV import chunk; ConcurrentLibrary puts its writer lock here
+        self.write_lock = threading.Lock()
         self._create_tables()
 
+    def _open_cursor(self, row_factory=None):
+        """
+        Open a timed cursor on the connection.
+        :param row_factory (callable): Turns each fetched row into a record; None keeps tuples.
+        :return: (TimedCursor) The cursor.
+        """
+        cursor = self.conn.cursor(TimedCursor)
+        cursor.metrics = self.metrics
+        cursor.row_factory = row_factory
+        return cursor
+
     def _create_tables(self):
         """
-        Create necessary tables in the database if they do not exist.
+        Bring the database schema up to date.
+        The applied schema version is stored in PRAGMA user_version, so each
+        migration in SCHEMA_MIGRATIONS runs exactly once per database file.
         :return: None
         """
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS BOOKS (
-                ID INTEGER PRIMARY KEY AUTOINCREMENT,
-                TITLE VARCHAR(300),
-                AUTHOR VARCHAR(100),
-                PUBLISHER VARCHAR(200),
-                PUBLISHED_YEAR SMALLINT,
-                RATING FLOAT,
-                ISBN VARCHAR(11)
-            )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS MEMBERS (
-                ID INTEGER PRIMARY KEY AUTOINCREMENT,
-                FIRST_NAME VARCHAR(100),
-                LAST_NAME VARCHAR(100),
-                EMAIL VARCHAR(200),
-                GENDER VARCHAR(15),
-                STATE VARCHAR(20),
-                MEMBER_NO VARCHAR(11)
-            )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS LEND_BOOKS (
-                BOOK_ID INTEGER,
-                MEMBER_ID INTEGER,
-                FOREIGN KEY (BOOK_ID) REFERENCES BOOKS(ID),
-                FOREIGN KEY (MEMBER_ID) REFERENCES MEMBERS(ID),
-                PRIMARY KEY (BOOK_ID, MEMBER_ID)
-            )
-        ''')
-        self.conn.commit()
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        for target, statements in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+            self.cursor.execute("BEGIN")
+            try:
+                for statement in statements:
+                    self.cursor.execute(statement)
+                self.cursor.execute(f"PRAGMA user_version = {target}")
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
 
     def _book_validation(self, book):
         """
@@ -113,46 +1445,102 @@ class Library:
         result = self.cursor.fetchone()
         return result if result else None
 
+    @instrumented
     def add_book(self, book):
         """
         Add a book to the library database.
+        The ISBN check digit is checked as in add_books_from_csv, so every book
+        added here survives an export and an import into another database.
         :param book (Book): The book object to add to the database.
         :return: None
         """
+        if not isbn_is_valid(book.isbn):
+            raise ValueError(f"ISBN {book.isbn} has a wrong check digit")
         if not self._book_validation(book):
             self.cursor.execute('''INSERT INTO books (TITLE, AUTHOR, PUBLISHER, PUBLISHED_YEAR, RATING, ISBN)
                                 VALUES (?, ?, ?, ?, ?, ?)''',
                                 (book.title, book.author, book.publisher,
                                  book.published_year, book.rating, book.isbn))
             self.conn.commit()
+            self.book_ids.invalidate(book.title)
         else:
             print("Invalid book!")
 
+    def _checked_id(self, cache, key, lookup, query):
+        """
+        Run a query for the cached ID of a key, looking the ID up on a miss.
+        The query has to match the key as well as the ID, so it finds nothing
+        for an ID left behind by a delete through another connection; that ID
+        is dropped and the key looked up again. The same goes for IDs cached
+        before a restore, so no per-call check for restores is needed.
+        :param cache (LRUCache): The title or member no -> ID cache.
+        :param key (str): The title or member number.
+        :param lookup (str): The query selecting the ID of the key.
+        :param query (callable): Runs the query for an ID; returns None if nothing matches.
+        :return: What query returned, or None if the key cannot be found.
+        """
+        cached = cache.get(key)
+        if cached is not None:
+            result = query(cached)
+            if result is not None:
+                return result
+            cache.invalidate(key)
+        generation = cache.generation
+        found = self.cursor.execute(lookup, (key,)).fetchone()
+        if not found:
+            return None
+        cache.put(key, found[0], generation)
+        return query(found[0])
+
+    def _with_book_id(self, title, query):
+        """
+        Run a query for the ID of a book, from the cache or the database.
+        :param title (str): The title of the book.
+        :param query (callable): Runs the query for an ID; it must match the title too.
+        :return: What query returned, or None if the book cannot be found.
+        """
+        return self._checked_id(self.book_ids, title, 'SELECT ID FROM BOOKS WHERE TITLE = ?', query)
+
     def _get_book_id(self, title):
         """
-        Get the ID of a book by its title from the database.
+        Get the ID of a book by its title, from the cache or the database.
         :param title (str): The title of the book.
         :return: (int) The ID of the book.
         """
-        self.cursor.execute('SELECT ID FROM BOOKS WHERE TITLE = ?', (title,))
-        result = self.cursor.fetchone()
+        result = self._with_book_id(title, lambda book_id: self.cursor.execute(
+            'SELECT ID FROM BOOKS WHERE ID = ? AND TITLE = ?', (book_id, title)).fetchone())
         return result[0] if result else None
 
+    @instrumented
     def remove_book(self, title):
         """
         Remove a book from the library database by its title.
+        A book with lent copies is kept until they are returned; removing it
+        raises ValueError.
         :param title (str): The title of the book to remove.
-        :return: None
+        :return: (bool) Whether the book was removed; False if it cannot be found.
         """
-        book_id = self._get_book_id(title)
-        if book_id:
-            self.cursor.execute('DELETE FROM BOOKS WHERE ID=?', (book_id,))
+        def loan_state(book_id):
+            return self.cursor.execute(
+                'SELECT ID, EXISTS (SELECT 1 FROM LEND_BOOKS WHERE BOOK_ID = BOOKS.ID) '
+                'FROM BOOKS WHERE ID = ? AND TITLE = ?', (book_id, title)).fetchone()
+
+        book = self._with_book_id(title, loan_state)
+        if book and not book[1]:
+            self.cursor.execute('DELETE FROM BOOKS WHERE ID=? AND NOT EXISTS '
+                                '(SELECT 1 FROM LEND_BOOKS WHERE BOOK_ID=?)', (book[0], book[0]))
+            removed = self.cursor.rowcount
             self.conn.commit()
-            print("book deleted!")
-            return True
-        else:
-            print("no book!")
-            return False
+            if removed:
+                self.book_ids.invalidate(title)
+                print("book deleted!")
+                return True
+            # lent or removed through another connection since the check
+            book = loan_state(book[0])
+        if book:
+            raise ValueError("The book has lent copies; they must be returned first.")
+        print("no book!")
+        return False
 
     def _member_validation(self, member):
         """
@@ -164,197 +1552,1897 @@ class Library:
         result = self.cursor.fetchone()
         return result if result else None
 
+    @instrumented
     def register_member(self, member):
         """
         Register a member in the library database.
         :param member (Member): The member object to register.
         :return: None
         """
-        if not self._member_validation(member):
-            self.cursor.execute('''INSERT INTO members (FIRST_NAME, LAST_NAME, EMAIL, GENDER, STATE, MEMBER_NO)
-                                VALUES (?, ?, ?, ?, ?, ?)''',
-                                (member.first_name, member.last_name, member.email,
-                                 member.gender, member.state, member.member_no))
-            self.conn.commit()
-        else:
-            print("Invalid member!")
+        if not self._member_validation(member):
+            self.cursor.execute('''INSERT INTO members (FIRST_NAME, LAST_NAME, EMAIL, GENDER, STATE, MEMBER_NO)
+                                VALUES (?, ?, ?, ?, ?, ?)''',
+                                (member.first_name, member.last_name, member.email,
+                                 member.gender, member.state, member.member_no))
+            self.conn.commit()
+            self.member_ids.invalidate(member.member_no)
+        else:
+            print("Invalid member!")
+
+    def _with_member_id(self, member_no, query):
+        """
+        Run a query for the ID of a member, from the cache or the database.
+        :param member_no (str): The member number of the member.
+        :param query (callable): Runs the query for an ID; it must match the member number too.
+        :return: What query returned, or None if the member cannot be found.
+        """
+        return self._checked_id(self.member_ids, member_no, "SELECT ID FROM MEMBERS WHERE MEMBER_NO = ?", query)
+
+    def _get_member_id(self, member_no):
+        """
+        Get the ID of a member by their member number, from the cache or the database.
+        :param member_no (str): The member number of the member.
+        :return: (int) The ID of the member.
+        """
+        result = self._with_member_id(member_no, lambda member_id: self.cursor.execute(
+            "SELECT ID FROM MEMBERS WHERE ID = ? AND MEMBER_NO = ?", (member_id, member_no)).fetchone())
+        return result[0] if result else None
+
+    @instrumented
+    def remove_member(self, member_no):
+        """
+        Remove a member from the library database by their member number.
+        A member with lent books is kept until they return them; removing them
+        raises ValueError.
+        :param member_no (str): The member number of the member to remove.
+        :return: (bool) Whether the member was removed; False if they cannot be found.
+        """
+        def loan_state(member_id):
+            return self.cursor.execute(
+                "SELECT ID, EXISTS (SELECT 1 FROM LEND_BOOKS WHERE MEMBER_ID = MEMBERS.ID) "
+                "FROM MEMBERS WHERE ID = ? AND MEMBER_NO = ?", (member_id, member_no)).fetchone()
+
+        member = self._with_member_id(member_no, loan_state)
+        if member and not member[1]:
+            self.cursor.execute("DELETE FROM MEMBERS WHERE ID = ? AND NOT EXISTS "
+                                "(SELECT 1 FROM LEND_BOOKS WHERE MEMBER_ID = ?)", (member[0], member[0]))
+            removed = self.cursor.rowcount
+            self.conn.commit()
+            if removed:
+                self.member_ids.invalidate(member_no)
+                print(f"The member with the {member_no} member no, has been deleted from the system.")
+                return True
+            # lent to or removed through another connection since the check
+            member = loan_state(member[0])
+        if member:
+            raise ValueError("The member has lent books; they must be returned first.")
+        print("This member cannot be found.")
+        return False
+
+    def _existing_values(self, table, column, values):
+        """
+        Find which of the given values are already stored in a column.
+        :param table (str): The table to look in.
+        :param column (str): The column to compare against.
+        :param values (list): The candidate values.
+        :return: (set) The subset of values present in the table.
+        """
+        found = set()
+        for start in range(0, len(values), self.SQL_VARIABLE_LIMIT):
+            batch = values[start:start + self.SQL_VARIABLE_LIMIT]
+            placeholders = ", ".join("?" * len(batch))
+            self.cursor.execute(f"SELECT {column} FROM {table} WHERE {column} IN ({placeholders})", batch)
+            found.update(row[0] for row in self.cursor.fetchall())
+        return found
+
+    def _parsed_chunks(self, filename, parse_row, chunk_bytes=None, progress=None, workers=None):
+        """
+        Parse and validate a CSV file in byte-range chunks, on a process pool when it pays off.
+        Chunks are yielded in file order, so a single writer can insert them;
+        at most two chunks per worker are parsed ahead of the writer. After each
+        chunk has been processed, progress is called with an ImportProgress.
+        :param filename (str): The path to the CSV file.
+        :param parse_row (callable): parse_book_row or parse_member_row.
+        :param chunk_bytes (int): The approximate size of a chunk; defaults to CSV_CHUNK_BYTES.
+        :param progress (callable): Called with an ImportProgress after each chunk.
+        :param workers (int): The number of parser processes; defaults to IMPORT_WORKERS.
+        :return: (generator) Yields (records, line numbers, rejections) per chunk.
+        """
+        chunk_bytes = chunk_bytes or self.CSV_CHUNK_BYTES
+        workers = workers or self.IMPORT_WORKERS
+        header, ranges = csv_byte_ranges(filename, chunk_bytes)
+        tracker = ImportProgress(os.path.getsize(filename))
+        pool = None
+        if workers > 1 and len(ranges) > 1:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn, because forking a process that runs Tk and database threads is unsafe
+            pool = ProcessPoolExecutor(max_workers=min(workers, len(ranges)),
+                                       mp_context=multiprocessing.get_context("spawn"))
+
+        def submit(start, end):
+            """
+            Queue the parsing of one byte range.
+            :return: None
+            """
+            if pool is None:
+                pending.append((end, parse_csv_range(filename, start, end, header, parse_row)))
+            else:
+                pending.append((end, pool.submit(parse_csv_range, filename, start, end, header, parse_row)))
+
+        pending = deque()
+        line_base = 1
+        ranges = iter(ranges)
+        try:
+            for start, end in itertools.islice(ranges, 2 * workers if pool else 1):
+                submit(start, end)
+            while pending:
+                end, parsed = pending.popleft()
+                records, line_numbers, rejected, lines = parsed if pool is None else parsed.result()
+                for start, next_end in itertools.islice(ranges, 1):
+                    submit(start, next_end)
+                yield (records, [line_base + line_no for line_no in line_numbers],
+                       [(line_base + line_no, reason) for line_no, reason in rejected])
+                line_base += lines
+                tracker.update(len(records) + len(rejected), end)
+                if progress:
+                    progress(tracker)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    def _insert_books(self, books):
+        """
+        Insert a batch of books, index them for search and give each its first
+        copy, in one transaction.
+        FTS5 flushes its pending terms at every statement savepoint, so the
+        per-row BOOKS_FTS_INSERT trigger writes one tiny index segment per book.
+        For a batch the per-row triggers are switched off with a BOOKS_BULK_INSERT
+        row and the new rows are indexed and given copies by one INSERT ... SELECT
+        each; the flag row is gone again before the commit, so no other
+        connection sees it.
+        :param books (list): Book records without IDs.
+        :return: None
+        """
+        with self.conn:
+            self.cursor.execute("INSERT INTO BOOKS_BULK_INSERT VALUES (1)")
+            last_id = self.cursor.execute("SELECT coalesce(max(ID), 0) FROM BOOKS").fetchone()[0]
+            # the records are in column order with a None ID, so they bind as they are
+            self.cursor.executemany('''
+                INSERT INTO BOOKS (ID, TITLE, AUTHOR, PUBLISHER, PUBLISHED_YEAR, RATING, ISBN)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', books)
+            self.cursor.execute('''
+                INSERT INTO BOOKS_FTS (rowid, TITLE, AUTHOR, PUBLISHER)
+                SELECT ID, TITLE, AUTHOR, PUBLISHER FROM BOOKS WHERE ID > ?
+            ''', (last_id,))
+            self.cursor.execute('INSERT INTO COPIES (BOOK_ID) SELECT ID FROM BOOKS WHERE ID > ?', (last_id,))
+            self.cursor.execute("DELETE FROM BOOKS_BULK_INSERT")
+
+    @instrumented
+    def add_books_from_csv(self, filename, chunk_bytes=None, progress=None, cancel=None, workers=None):
+        """
+        Add multiple books to the library database from a CSV file.
+        Worker processes parse the file and apply the checks of the Add Book
+        window (numeric year and rating, rating 1-5, year 1850-current year,
+        ISBN check digit); invalid rows are rejected with the reason. ISBNs
+        are deduplicated within the whole file with a set; each validated chunk
+        is checked against the existing ISBNs with one query and inserted in a
+        single transaction. Duplicates are counted and rejected with the reason.
+        :param filename (str): The path to the CSV file containing book information.
+        :param chunk_bytes (int): The approximate number of bytes per chunk and transaction.
+        :param progress (callable): Called with an ImportProgress after each chunk.
+        :param cancel (threading.Event): When set, the import stops and the unwritten chunk is discarded.
+        :param workers (int): The number of parser processes; 1 parses in this process.
+        :return: (ImportResult) Counts of inserted and duplicate rows, plus rejected rows.
+        """
+        result = ImportResult()
+        seen = set()
+        chunks = self._parsed_chunks(filename, parse_book_row, chunk_bytes, progress, workers)
+        try:
+            for records, line_numbers, rejected in chunks:
+                if cancel is not None and cancel.is_set():
+                    result.cancelled = True
+                    break
+                for line_no, reason in rejected:
+                    result.reject(line_no, reason)
+                books = []
+                for line_no, book in zip(line_numbers, records):
+                    if book.isbn in seen:
+                        result.duplicate(line_no, f"ISBN {book.isbn} repeated in file")
+                    else:
+                        seen.add(book.isbn)
+                        books.append((line_no, book))
+
+                with self.write_lock:
+                    existing = self._existing_values("BOOKS", "ISBN", [book.isbn for _, book in books])
+                    rows = []
+                    for line_no, book in books:
+                        if book.isbn in existing:
+                            result.duplicate(line_no, f"ISBN {book.isbn} already in the library")
+                        else:
+                            rows.append(book)
+                    self._insert_books(rows)
+                    for book in rows:
+                        self.book_ids.invalidate(book.title)
+                result.inserted += len(rows)
+        finally:
+            chunks.close()
+        if result.inserted:
+            # merge the per-chunk index segments, or later single-row inserts pay for it
+            with self.write_lock, self.conn:
+                self.cursor.execute("INSERT INTO BOOKS_FTS (BOOKS_FTS) VALUES ('optimize')")
+        result.rejected.sort()
+        return result
+
+    @instrumented
+    def register_members_from_csv(self, filename, chunk_bytes=None, progress=None, cancel=None, workers=None):
+        """
+        Register multiple members in the library database from a CSV file.
+        Worker processes parse the file; member numbers are deduplicated within
+        the whole file with a set, checked against the existing members with
+        one query per chunk and inserted in bulk. Like with books, a repeated
+        or already registered member number is counted as a duplicate and
+        rejected with its line number.
+        :param filename (str): The path to the CSV file containing member information.
+        :param chunk_bytes (int): The approximate number of bytes per chunk and transaction.
+        :param progress (callable): Called with an ImportProgress after each chunk.
+        :param cancel (threading.Event): When set, the import stops and the unwritten chunk is discarded.
+        :param workers (int): The number of parser processes; 1 parses in this process.
+        :return: (ImportResult) Counts of inserted and duplicate rows, plus rejected rows.
+        """
+        result = ImportResult()
+        seen = set()
+        chunks = self._parsed_chunks(filename, parse_member_row, chunk_bytes, progress, workers)
+        try:
+            for records, line_numbers, rejected in chunks:
+                if cancel is not None and cancel.is_set():
+                    result.cancelled = True
+                    break
+                for line_no, reason in rejected:
+                    result.reject(line_no, reason)
+                members = []
+                for line_no, member in zip(line_numbers, records):
+                    if member.member_no in seen:
+                        result.duplicate(line_no, f"member no {member.member_no} repeated in file")
+                    else:
+                        seen.add(member.member_no)
+                        members.append((line_no, member))
+
+                with self.write_lock:
+                    existing = self._existing_values("MEMBERS", "MEMBER_NO", [m.member_no for _, m in members])
+                    rows = []
+                    for line_no, member in members:
+                        if member.member_no in existing:
+                            result.duplicate(line_no, f"member no {member.member_no} already registered")
+                        else:
+                            rows.append(member)
+                    with self.conn:
+                        self.cursor.executemany('''
+                            INSERT INTO MEMBERS (ID, FIRST_NAME, LAST_NAME, EMAIL, GENDER, STATE, MEMBER_NO)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ''', rows)
+                    for member in rows:
+                        self.member_ids.invalidate(member.member_no)
+                result.inserted += len(rows)
+        finally:
+            chunks.close()
+        result.rejected.sort()
+        return result
+
+    @instrumented
+    def select_books(self):
+        """
+        Retrieve all books from the database.
+        :return: (list) A list of rows in BOOKS column order.
+        """
+        self.cursor.execute("SELECT * FROM BOOKS")
+        books = self.cursor.fetchall()
+        return books
+
+    @instrumented
+    def select_members(self):
+        """
+        Retrieve all members from the database.
+        :return: (list) A list of rows in MEMBERS column order.
+        """
+        self.cursor.execute("SELECT * FROM MEMBERS")
+        members = self.cursor.fetchall()
+        return members
+
+    def _select_page(self, table, columns, after=None, limit=None, order_by="ID", descending=False):
+        """
+        Retrieve one page of a table using keyset pagination.
+        Rows are ordered by (order_by, ID), so a page is found with an index
+        seek from the previous page's last row instead of an OFFSET scan.
+        :param table (str): The table to read.
+        :param columns (tuple): The columns of the table, in SELECT * order.
+        :param after: The key returned with the previous page, or None for the first page.
+        :param limit (int): The maximum number of rows in the page.
+        :param order_by (str): The column to sort by.
+        :param descending (bool): Sort from the largest value to the smallest.
+        :return: (tuple) The list of rows and the key of the next page (None on the last page).
+        """
+        order_by = order_by.upper()
+        if order_by not in columns:
+            raise ValueError(f"Cannot sort {table} by {order_by}")
+        limit = limit or self.PAGE_SIZE
+        direction, op = ("DESC", "<") if descending else ("ASC", ">")
+        where, params = "", ()
+        if after is not None and order_by == "ID":
+            where, params = f"WHERE ID {op} ?", (after,)
+        elif after is not None:
+            value, last_id = after
+            if value is None:
+                # NULLs sort first ascending and last descending
+                where = f"WHERE ({order_by} IS NULL AND ID {op} ?)"
+                if not descending:
+                    where += f" OR {order_by} IS NOT NULL"
+                params = (last_id,)
+            else:
+                where = f"WHERE {order_by} {op} ? OR ({order_by} = ? AND ID {op} ?)"
+                if descending:
+                    where += f" OR {order_by} IS NULL"
+                params = (value, value, last_id)
+        order = f"ID {direction}" if order_by == "ID" else f"{order_by} {direction}, ID {direction}"
+        self.cursor.execute(f"SELECT * FROM {table} {where} ORDER BY {order} LIMIT ?", params + (limit,))
+        rows = self.cursor.fetchall()
+        if len(rows) < limit:
+            return rows, None
+        last = rows[-1]
+        if order_by == "ID":
+            return rows, last[0]
+        return rows, (last[columns.index(order_by)], last[0])
+
+    def _iter_table(self, table, columns, page_size=None, order_by="ID", descending=False):
+        """
+        Stream every row of a table one page at a time.
+        :param table (str): The table to read.
+        :param columns (tuple): The columns of the table, in SELECT * order.
+        :param page_size (int): The number of rows fetched per query.
+        :param order_by (str): The column to sort by.
+        :param descending (bool): Sort from the largest value to the smallest.
+        :return: (generator) Yields the rows.
+        """
+        after = None
+        while True:
+            rows, after = self._select_page(table, columns, after, page_size, order_by, descending)
+            yield from rows
+            if after is None:
+                return
+
+    @instrumented
+    def select_books_page(self, after=None, limit=None, order_by="ID", descending=False):
+        """
+        Retrieve one page of books.
+        :param after: The key returned with the previous page, or None for the first page.
+        :param limit (int): The maximum number of books in the page.
+        :param order_by (str): The BOOKS column to sort by.
+        :param descending (bool): Sort from the largest value to the smallest.
+        :return: (tuple) The list of books and the key of the next page (None on the last page).
+        """
+        return self._select_page("BOOKS", self.BOOK_COLUMNS, after, limit, order_by, descending)
+
+    @instrumented
+    def select_members_page(self, after=None, limit=None, order_by="ID", descending=False):
+        """
+        Retrieve one page of members.
+        :param after: The key returned with the previous page, or None for the first page.
+        :param limit (int): The maximum number of members in the page.
+        :param order_by (str): The MEMBERS column to sort by.
+        :param descending (bool): Sort from the largest value to the smallest.
+        :return: (tuple) The list of members and the key of the next page (None on the last page).
+        """
+        return self._select_page("MEMBERS", self.MEMBER_COLUMNS, after, limit, order_by, descending)
+
+    def iter_books(self, page_size=None, order_by="ID", descending=False):
+        """
+        Stream all books from the database without loading them at once.
+        :param page_size (int): The number of books fetched per query.
+        :param order_by (str): The BOOKS column to sort by.
+        :param descending (bool): Sort from the largest value to the smallest.
+        :return: (generator) Yields rows in BOOKS column order.
+        """
+        return self._iter_table("BOOKS", self.BOOK_COLUMNS, page_size, order_by, descending)
+
+    def iter_members(self, page_size=None, order_by="ID", descending=False):
+        """
+        Stream all members from the database without loading them at once.
+        :param page_size (int): The number of members fetched per query.
+        :param order_by (str): The MEMBERS column to sort by.
+        :param descending (bool): Sort from the largest value to the smallest.
+        :return: (generator) Yields rows in MEMBERS column order.
+        """
+        return self._iter_table("MEMBERS", self.MEMBER_COLUMNS, page_size, order_by, descending)
+
+    def _select_window(self, table, offset, limit):
+        """
+        Retrieve the rows at the given positions of a table, ordered by ID.
+        The ID at the start of every window is remembered until the database
+        changes, so the next window is read with an index seek from the
+        nearest known position instead of an OFFSET scan from the first row;
+        scrolling either way only skips the rows between two windows.
+        :param table (str): The table to read.
+        :param offset (int): The position of the first row.
+        :param limit (int): The maximum number of rows to return.
+        :return: (list) The rows.
+        """
+        generation = self._data_generation()
+        if self.window_anchors.get(table, (None,))[0] != generation:
+            self.window_anchors[table] = (generation, [], [])
+        _, positions, ids = self.window_anchors[table]
+        i = bisect.bisect_right(positions, offset)
+        skip = offset - positions[i - 1] if i else offset
+        if i < len(positions) and offset + limit <= positions[i] < offset + limit + skip:
+            self.cursor.execute(f"SELECT * FROM {table} WHERE ID < ? ORDER BY ID DESC LIMIT ? OFFSET ?",
+                                (ids[i], limit, positions[i] - offset - limit))
+            rows = self.cursor.fetchall()[::-1]
+        elif i:
+            self.cursor.execute(f"SELECT * FROM {table} WHERE ID >= ? ORDER BY ID LIMIT ? OFFSET ?",
+                                (ids[i - 1], limit, skip))
+            rows = self.cursor.fetchall()
+        else:
+            self.cursor.execute(f"SELECT * FROM {table} ORDER BY ID LIMIT ? OFFSET ?", (limit, offset))
+            rows = self.cursor.fetchall()
+        if rows and (not i or positions[i - 1] != offset):
+            positions.insert(i, offset)
+            ids.insert(i, rows[0][0])
+        return rows
+
+    @instrumented
+    def count_books(self):
+        """
+        Count the books in the database.
+        :return: (int) The number of books.
+        """
+        return self.cursor.execute("SELECT COUNT(*) FROM BOOKS").fetchone()[0]
+
+    @instrumented
+    def count_members(self):
+        """
+        Count the members in the database.
+        :return: (int) The number of members.
+        """
+        return self.cursor.execute("SELECT COUNT(*) FROM MEMBERS").fetchone()[0]
+
+    @instrumented
+    def select_books_window(self, offset, limit):
+        """
+        Retrieve the books at the given positions of the catalog, ordered by ID.
+        :param offset (int): The position of the first book.
+        :param limit (int): The maximum number of books to return.
+        :return: (list) The rows in BOOKS column order.
+        """
+        return self._select_window("BOOKS", offset, limit)
+
+    @instrumented
+    def select_members_window(self, offset, limit):
+        """
+        Retrieve the members at the given positions of the member list, ordered by ID.
+        :param offset (int): The position of the first member.
+        :param limit (int): The maximum number of members to return.
+        :return: (list) The rows in MEMBERS column order.
+        """
+        return self._select_window("MEMBERS", offset, limit)
+
+    @staticmethod
+    def _fts_query(text):
+        """
+        Turn free text typed by a user into an FTS5 prefix query.
+        Every word is quoted, so FTS5 operators in the input are matched literally.
+        :param text (str): The text to search for.
+        :return: (str) The FTS5 query, or None if the text has no words.
+        """
+        words = re.findall(r"\w+", text)
+        return " ".join(f'"{word}"*' for word in words) or None
+
+    def _data_generation(self):
+        """
+        Identify the current contents of the database.
+        PRAGMA data_version changes with every commit made by other connections,
+        total_changes with every change made by this one.
+        :return: (tuple) The two counters.
+        """
+        return self.cursor.execute("PRAGMA data_version").fetchone()[0], self.conn.total_changes
+
+    def _ranked_matches(self, fts_query):
+        """
+        Rank every book matching an FTS5 query by relevance (bm25).
+        The ranking of the last query is kept until the database changes, so
+        all pages of a search and its count come from the same ranking.
+        :param fts_query (str): The FTS5 query.
+        :return: (list) The IDs of the SEARCH_RESULTS_LIMIT best matches, best first.
+        """
+        generation = self._data_generation()
+        if self.search_ranking[:2] != (fts_query, generation):
+            self.cursor.execute("SELECT rowid FROM BOOKS_FTS WHERE BOOKS_FTS MATCH ? ORDER BY rank LIMIT ?",
+                                (fts_query, self.SEARCH_RESULTS_LIMIT))
+            self.search_ranking = (fts_query, generation, [row[0] for row in self.cursor.fetchall()])
+        return self.search_ranking[2]
+
+    @instrumented
+    def search_books(self, query, limit=20, offset=0):
+        """
+        Search the titles, authors and publishers of the books.
+        Every word in the query must match the start of a word in one of those
+        fields. All matches are ranked by relevance and the best
+        SEARCH_RESULTS_LIMIT of them can be paged through.
+        :param query (str): The text to search for.
+        :param limit (int): The maximum number of books to return.
+        :param offset (int): The number of best matches to skip.
+        :return: (list) The matching Book records.
+        """
+        fts_query = self._fts_query(query)
+        if not fts_query:
+            return []
+        ids = self._ranked_matches(fts_query)[offset:offset + limit]
+        books = {}
+        for start in range(0, len(ids), self.SQL_VARIABLE_LIMIT):
+            batch = ids[start:start + self.SQL_VARIABLE_LIMIT]
+            self.book_cursor.execute(f"SELECT * FROM BOOKS WHERE ID IN ({', '.join('?' * len(batch))})", batch)
+            books.update((book[0], book) for book in self.book_cursor.fetchall())
+        return [books[book_id] for book_id in ids if book_id in books]
+
+    @instrumented
+    def count_search_results(self, query):
+        """
+        Count the books search_books can page through for a query, up to SEARCH_RESULTS_LIMIT.
+        :param query (str): The text to search for.
+        :return: (int) The number of matching books.
+        """
+        fts_query = self._fts_query(query)
+        if not fts_query:
+            return 0
+        return len(self._ranked_matches(fts_query))
+
+    @instrumented
+    def select_one_book(self, title):
+        """
+        Retrieve the selected book from the database.
+        :param book_title (str): The title of the book to be borrowed.
+        :return: (Book) The book, or None if it cannot be found.
+        """
+        return self._with_book_id(title, lambda book_id: self.book_cursor.execute(
+            'SELECT * FROM BOOKS WHERE ID=? AND TITLE=?', (book_id, title)).fetchone())
+
+    @instrumented
+    def select_one_member(self, member_no):
+        """
+        Retrieve the selected member from the database.
+        :param member_no (int): The title of the member to be borrowed.
+        :return: (Member) The member, or None if they cannot be found.
+        """
+        return self._with_member_id(member_no, lambda member_id: self.member_cursor.execute(
+            'SELECT * FROM MEMBERS WHERE ID=? AND MEMBER_NO=?', (member_id, member_no)).fetchone())
+
+    @instrumented
+    def lent_books(self):
+        """
+        Retrieve all lent books along with member information from the database.
+        The rows are read from CURRENT_LOANS, so no join runs.
+        :return: (list) (title, member first name, member last name) rows.
+        """
+        self.cursor.execute('SELECT TITLE, FIRST_NAME, LAST_NAME FROM CURRENT_LOANS')
+        lent_books = self.cursor.fetchall()
+        return lent_books
+
+    @staticmethod
+    def _lent_filter(member_no=None, title=None):
+        """
+        Build the WHERE conditions for filtering CURRENT_LOANS.
+        :param member_no (str): Only loans to the member with this member no.
+        :param title (str): Only books whose title starts with this text.
+        :return: (tuple) The list of conditions and their parameters.
+        """
+        conditions, params = [], []
+        if member_no:
+            conditions.append("MEMBER_NO = ?")
+            params.append(member_no)
+        if title:
+            # a range instead of LIKE, so the TITLE index is used
+            conditions.append("TITLE >= ? AND TITLE < ?")
+            params += [title, title + "\U0010ffff"]
+        return conditions, params
+
+    @instrumented
+    def lent_books_page(self, after=None, limit=None, member_no=None, title=None):
+        """
+        Retrieve one page of the lent books ordered by title, using keyset pagination.
+        :param after: The key returned with the previous page, or None for the first page.
+        :param limit (int): The maximum number of loans in the page.
+        :param member_no (str): Only loans to the member with this member no.
+        :param title (str): Only books whose title starts with this text.
+        :return: (tuple) (title, barcode, member no, first name, last name, lent at, due at) rows
+                 and the key of the next page (None on the last page).
+        """
+        limit = limit or self.PAGE_SIZE
+        conditions, params = self._lent_filter(member_no, title)
+        if after is not None:
+            conditions.append("(TITLE > ? OR (TITLE = ? AND COPY_ID > ?))")
+            params += [after[0], after[0], after[1]]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        self.cursor.execute(f'''
+            SELECT COPY_ID, {", ".join(self.CURRENT_LOAN_COLUMNS)} FROM CURRENT_LOANS {where}
+            ORDER BY TITLE, COPY_ID LIMIT ?
+        ''', params + [limit])
+        rows = self.cursor.fetchall()
+        next_key = (rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+        return [row[1:] for row in rows], next_key
+
+    @instrumented
+    def select_lent_books_window(self, offset, limit, member_no=None, title=None):
+        """
+        Retrieve the lent books at the given positions, ordered by title.
+        :param offset (int): The position of the first loan.
+        :param limit (int): The maximum number of loans to return.
+        :param member_no (str): Only loans to the member with this member no.
+        :param title (str): Only books whose title starts with this text.
+        :return: (list) (title, barcode, member no, first name, last name, lent at, due at) rows.
+        """
+        conditions, params = self._lent_filter(member_no, title)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        self.cursor.execute(f'''
+            SELECT {", ".join(self.CURRENT_LOAN_COLUMNS)} FROM CURRENT_LOANS {where}
+            ORDER BY TITLE, COPY_ID LIMIT ? OFFSET ?
+        ''', params + [limit, offset])
+        return self.cursor.fetchall()
+
+    @instrumented
+    def count_lent_books(self, member_no=None, title=None):
+        """
+        Count the lent copies.
+        :param member_no (str): Only loans to the member with this member no.
+        :param title (str): Only books whose title starts with this text.
+        :return: (int) The number of lent copies.
+        """
+        conditions, params = self._lent_filter(member_no, title)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.cursor.execute(f"SELECT COUNT(*) FROM CURRENT_LOANS {where}", params).fetchone()[0]
+
+    @instrumented
+    def lend_book(self, title, member_no, loan_days=None, barcode=None):
+        """
+        Allow a member to borrow a copy of a book from the library.
+        With a barcode that copy is lent; with only a title, the first
+        available copy, found through the partial IDX_COPIES_AVAILABLE index.
+        The loan is written by one INSERT ... SELECT; triggers mark the copy
+        lent and update the availability counts. Only a failed lend runs a
+        query to find out why. The loan is recorded in LOANS in the same
+        transaction.
+        :param title (str): The title of the book to be borrowed.
+        :param member_no (str): The member number of the member borrowing the book.
+        :param loan_days (int): Days until the book is due; defaults to LOAN_DAYS.
+        :param barcode (str): The barcode of the copy to be borrowed.
+        :return: (CirculationResult) The outcome; true only if a copy was lent.
+        """
+        if barcode:
+            self.cursor.execute('''
+                INSERT INTO LEND_BOOKS (COPY_ID, BOOK_ID, MEMBER_ID)
+                SELECT CO.ID, CO.BOOK_ID, ME.ID FROM COPIES AS CO, MEMBERS AS ME
+                WHERE CO.BARCODE = ? AND CO.STATUS = 'available' AND ME.MEMBER_NO = ?
+                ON CONFLICT DO NOTHING
+                RETURNING BOOK_ID, MEMBER_ID, COPY_ID
+            ''', (barcode, member_no))
+        else:
+            self.cursor.execute('''
+                INSERT INTO LEND_BOOKS (COPY_ID, BOOK_ID, MEMBER_ID)
+                SELECT CO.ID, CO.BOOK_ID, ME.ID
+                FROM (
+                    SELECT CO.ID, CO.BOOK_ID FROM BOOKS AS BO
+                    JOIN COPIES AS CO ON CO.BOOK_ID = BO.ID AND CO.STATUS = 'available'
+                    WHERE BO.TITLE = ?
+                    ORDER BY BO.ID, CO.ID LIMIT 1
+                ) AS CO, MEMBERS AS ME
+                WHERE ME.MEMBER_NO = ?
+                ON CONFLICT DO NOTHING
+                RETURNING BOOK_ID, MEMBER_ID, COPY_ID
+            ''', (title, member_no))
+        lent = self.cursor.fetchone()
+        if lent:
+            self.cursor.execute('''
+                INSERT INTO LOANS (BOOK_ID, MEMBER_ID, COPY_ID, LENT_AT, DUE_AT)
+                VALUES (?, ?, ?, datetime('now'), datetime('now', ?))
+            ''', (*lent, f"{self.LOAN_DAYS if loan_days is None else loan_days:+d} days"))
+        self.conn.commit()
+        name = title or barcode
+        if lent:
+            print(f"The book named {name} is lent by the member with {member_no} member no.")
+            return CirculationResult(CirculationResult.OK, *lent)
+
+        book_id, member_id = self.cursor.execute('''
+            SELECT CASE WHEN ? IS NULL THEN (SELECT ID FROM BOOKS WHERE TITLE = ? LIMIT 1)
+                        ELSE (SELECT BOOK_ID FROM COPIES WHERE BARCODE = ?) END,
+                   (SELECT ID FROM MEMBERS WHERE MEMBER_NO = ?)
+        ''', (barcode or None, title, barcode, member_no)).fetchone()
+        if not book_id:
+            status = CirculationResult.UNKNOWN_BOOK
+        elif not member_id:
+            status = CirculationResult.UNKNOWN_MEMBER
+        else:
+            status = CirculationResult.ALREADY_LENT
+        print(f"The book named {name} cannot be lent: {status}.")
+        return CirculationResult(status, book_id, member_id)
+
+    @instrumented
+    def return_book(self, title=None, barcode=None):
+        """
+        Allow a member to return a borrowed copy of a book to the library.
+        With a barcode that copy is returned; with only a title, its lent copy
+        with the lowest ID. The loan is removed by one DELETE ... RETURNING;
+        only a failed return runs a query to find out why. The open LOANS row
+        is closed in the same transaction.
+        :param title (str): The title of the book to be returned.
+        :param barcode (str): The barcode of the copy to be returned.
+        :return: (CirculationResult) The outcome; true only if a copy was returned.
+        """
+        if barcode:
+            self.cursor.execute('''
+                DELETE FROM LEND_BOOKS WHERE COPY_ID = (SELECT ID FROM COPIES WHERE BARCODE = ?)
+                RETURNING BOOK_ID, MEMBER_ID, COPY_ID
+            ''', (barcode,))
+        else:
+            self.cursor.execute('''
+                DELETE FROM LEND_BOOKS WHERE COPY_ID = (
+                    SELECT LB.COPY_ID FROM BOOKS AS BO
+                    JOIN LEND_BOOKS AS LB ON LB.BOOK_ID = BO.ID
+                    WHERE BO.TITLE = ?
+                    ORDER BY BO.ID, LB.COPY_ID LIMIT 1
+                )
+                RETURNING BOOK_ID, MEMBER_ID, COPY_ID
+            ''', (title,))
+        returned = self.cursor.fetchone()
+        if returned:
+            self.cursor.execute("UPDATE LOANS SET RETURNED_AT = datetime('now') "
+                                "WHERE COPY_ID = ? AND RETURNED_AT IS NULL", (returned[2],))
+        self.conn.commit()
+        name = title or barcode
+        if returned:
+            print(f"{name} has returned to the library system.")
+            return CirculationResult(CirculationResult.OK, *returned)
+
+        if barcode:
+            copy = self.cursor.execute('SELECT BOOK_ID, ID FROM COPIES WHERE BARCODE = ?', (barcode,)).fetchone()
+            book_id, copy_id = copy if copy else (None, None)
+        else:
+            book_id, copy_id = self._get_book_id(title), None
+        if book_id:
+            print(f"{name} is already in the library.")
+            return CirculationResult(CirculationResult.NOT_LENT, book_id, copy_id=copy_id)
+        print("Unknown book name.")
+        return CirculationResult(CirculationResult.UNKNOWN_BOOK)
+
+    @instrumented
+    def add_copies(self, title, count=1, barcodes=None):
+        """
+        Add copies of a book to the library.
+        Copies without a barcode are labelled C followed by their ID (at least
+        seven digits); given barcodes cannot have that form.
+        :param title (str): The title of the book.
+        :param count (int): The number of copies, when no barcodes are given.
+        :param barcodes (list): The barcodes of the new copies.
+        :return: (list) The barcodes of the new copies, or None if the book cannot be found.
+        """
+        book_id = self._get_book_id(title)
+        if not book_id:
+            print("no book!")
+            return None
+        barcodes = list(barcodes) if barcodes else [None] * count
+        labelled = [barcode for barcode in barcodes if barcode]
+        if len(set(labelled)) != len(labelled):
+            raise ValueError("The barcodes are not unique.")
+        reserved = [barcode for barcode in labelled if self.AUTO_BARCODE.fullmatch(barcode)]
+        if reserved:
+            raise ValueError(f"Barcodes of the form C0000001 are given out automatically: {', '.join(reserved)}")
+        taken = self._existing_values("COPIES", "BARCODE", labelled)
+        if taken:
+            raise ValueError(f"Barcodes already in use: {', '.join(sorted(taken))}")
+        with self.conn:
+            last_id = self.cursor.execute("SELECT coalesce(max(ID), 0) FROM COPIES").fetchone()[0]
+            self.cursor.executemany('INSERT INTO COPIES (BOOK_ID, BARCODE) VALUES (?, ?)',
+                                    [(book_id, barcode) for barcode in barcodes])
+            self.cursor.execute('SELECT BARCODE FROM COPIES WHERE ID > ? ORDER BY ID', (last_id,))
+            return [row[0] for row in self.cursor.fetchall()]
+
+    @instrumented
+    def remove_copy(self, barcode):
+        """
+        Remove a copy of a book from the library by its barcode.
+        A lent copy is kept until it is returned.
+        :param barcode (str): The barcode of the copy to remove.
+        :return: (bool) Whether the copy was removed.
+        """
+        self.cursor.execute("DELETE FROM COPIES WHERE BARCODE = ? AND STATUS <> 'lent' RETURNING ID", (barcode,))
+        removed = self.cursor.fetchone()
+        self.conn.commit()
+        if removed:
+            print("copy deleted!")
+            return True
+        print("no copy or the copy is lent!")
+        return False
+
+    @instrumented
+    def book_availability(self, title):
+        """
+        Count the copies of a book and how many of them can be lent, from BOOK_COPY_COUNTS.
+        :param title (str): The title of the book.
+        :return: (tuple) The number of copies and of available copies.
+        """
+        return self.cursor.execute('''
+            SELECT coalesce(sum(CC.COPIES), 0), coalesce(sum(CC.AVAILABLE), 0)
+            FROM BOOKS AS BO JOIN BOOK_COPY_COUNTS AS CC ON CC.BOOK_ID = BO.ID
+            WHERE BO.TITLE = ?
+        ''', (title,)).fetchone()
+
+    @instrumented
+    def select_copies(self, title):
+        """
+        Retrieve the copies of a book.
+        :param title (str): The title of the book.
+        :return: (list) (barcode, status) rows in the order the copies were added.
+        """
+        return self.cursor.execute('''
+            SELECT CO.BARCODE, CO.STATUS FROM BOOKS AS BO
+            JOIN COPIES AS CO ON CO.BOOK_ID = BO.ID
+            WHERE BO.TITLE = ?
+            ORDER BY CO.ID
+        ''', (title,)).fetchall()
+
+    def _lend_batch(self, loans, loan_days=None):
+        """
+        Lend a batch of copies without committing.
+        The items are loaded into LEND_BATCH and resolved with one UPDATE per
+        step: IDs first, then copies named by barcode, then the n-th loan of a
+        title in the batch gets the n-th available copy of that title. The loan
+        statistics and CURRENT_LOANS are updated once for the whole batch,
+        with a LOANS_BULK_WRITE row holding their per-row triggers back.
+        Because barcodes are resolved first, a copy named by barcode goes to
+        its item even when an earlier title item could have taken it; title
+        items then share the copies that are left.
+        :param loans (list): (title, member no, barcode) items; title or barcode may be None.
+        :param loan_days (int): Days until the books are due; defaults to LOAN_DAYS.
+        :return: (list) A CirculationResult per item, in order.
+        """
+        for statement in BATCH_TABLES:
+            self.cursor.execute(statement)
+        self.cursor.execute("DELETE FROM LEND_BATCH")
+        self.cursor.executemany("INSERT INTO LEND_BATCH (TITLE, MEMBER_NO, BARCODE) VALUES (?, ?, ?)", loans)
+        self.cursor.execute('''
+            UPDATE LEND_BATCH SET
+                MEMBER_ID = (SELECT ID FROM MEMBERS WHERE MEMBER_NO = LEND_BATCH.MEMBER_NO),
+                BOOK_ID = CASE WHEN BARCODE IS NULL
+                               THEN (SELECT ID FROM BOOKS WHERE TITLE = LEND_BATCH.TITLE LIMIT 1)
+                               ELSE (SELECT BOOK_ID FROM COPIES WHERE BARCODE = LEND_BATCH.BARCODE) END
+        ''')
+        # a copy scanned twice goes to the first scan
+        self.cursor.execute('''
+            WITH SCANNED AS (
+                SELECT SEQ, BARCODE, ROW_NUMBER() OVER (PARTITION BY BARCODE ORDER BY SEQ) AS N
+                FROM LEND_BATCH WHERE BARCODE IS NOT NULL AND MEMBER_ID IS NOT NULL
+            )
+            UPDATE LEND_BATCH SET COPY_ID = CO.ID
+            FROM SCANNED JOIN COPIES AS CO ON CO.BARCODE = SCANNED.BARCODE AND CO.STATUS = 'available'
+            WHERE SCANNED.SEQ = LEND_BATCH.SEQ AND SCANNED.N = 1
+        ''')
+        self.cursor.execute('''
+            WITH WANTED AS (
+                SELECT SEQ, TITLE, ROW_NUMBER() OVER (PARTITION BY TITLE ORDER BY SEQ) AS N
+                FROM LEND_BATCH WHERE BARCODE IS NULL AND BOOK_ID IS NOT NULL AND MEMBER_ID IS NOT NULL
+            ), FREE AS (
+                SELECT BO.TITLE, CO.ID, CO.BOOK_ID,
+                       ROW_NUMBER() OVER (PARTITION BY BO.TITLE ORDER BY BO.ID, CO.ID) AS N
+                FROM (SELECT DISTINCT TITLE FROM WANTED) AS WT
+                JOIN BOOKS AS BO ON BO.TITLE = WT.TITLE
+                JOIN COPIES AS CO ON CO.BOOK_ID = BO.ID AND CO.STATUS = 'available'
+                WHERE CO.ID NOT IN (SELECT COPY_ID FROM LEND_BATCH WHERE COPY_ID IS NOT NULL)
+            )
+            UPDATE LEND_BATCH SET COPY_ID = FREE.ID, BOOK_ID = FREE.BOOK_ID
+            FROM WANTED JOIN FREE ON FREE.TITLE = WANTED.TITLE AND FREE.N = WANTED.N
+            WHERE WANTED.SEQ = LEND_BATCH.SEQ
+        ''')
+        self.cursor.execute('''
+            INSERT INTO LEND_BOOKS (COPY_ID, BOOK_ID, MEMBER_ID)
+            SELECT COPY_ID, BOOK_ID, MEMBER_ID FROM LEND_BATCH WHERE COPY_ID IS NOT NULL ORDER BY SEQ
+        ''')
+        loan_days = self.LOAN_DAYS if loan_days is None else loan_days
+        lent_at, due_at = self.cursor.execute("SELECT datetime('now'), datetime('now', ?)",
+                                              (f"{loan_days:+d} days",)).fetchone()
+        self.cursor.execute("INSERT INTO LOANS_BULK_WRITE VALUES (1)")
+        self.cursor.execute('''
+            INSERT INTO LOANS (BOOK_ID, MEMBER_ID, COPY_ID, LENT_AT, DUE_AT)
+            SELECT BOOK_ID, MEMBER_ID, COPY_ID, ?, ? FROM LEND_BATCH WHERE COPY_ID IS NOT NULL ORDER BY SEQ
+        ''', (lent_at, due_at))
+        for table, key in (("BOOK_LOAN_STATS", "BOOK_ID"), ("MEMBER_LOAN_STATS", "MEMBER_ID")):
+            self.cursor.execute(f'''
+                INSERT INTO {table} ({key}, LOANS, ACTIVE, LAST_LENT_AT)
+                SELECT {key}, COUNT(*), COUNT(*), ? FROM LEND_BATCH WHERE COPY_ID IS NOT NULL GROUP BY {key}
+                ON CONFLICT ({key}) DO UPDATE SET LOANS = LOANS + excluded.LOANS,
+                    ACTIVE = ACTIVE + excluded.ACTIVE,
+                    LAST_LENT_AT = max(coalesce(LAST_LENT_AT, ''), excluded.LAST_LENT_AT)
+            ''', (lent_at,))
+        self.cursor.execute('''
+            INSERT INTO DAILY_LOAN_STATS (DAY, LENT)
+            SELECT date(?), COUNT(*) FROM LEND_BATCH WHERE COPY_ID IS NOT NULL HAVING COUNT(*) > 0
+            ON CONFLICT (DAY) DO UPDATE SET LENT = LENT + excluded.LENT
+        ''', (lent_at,))
+        self.cursor.execute('''
+            INSERT OR REPLACE INTO CURRENT_LOANS
+            SELECT LB.COPY_ID, LB.BOOK_ID, LB.MEMBER_ID, BO.TITLE, CO.BARCODE,
+                   ME.MEMBER_NO, ME.FIRST_NAME, ME.LAST_NAME, ?, ?
+            FROM LEND_BATCH AS LB
+            JOIN BOOKS AS BO ON BO.ID = LB.BOOK_ID
+            JOIN MEMBERS AS ME ON ME.ID = LB.MEMBER_ID
+            JOIN COPIES AS CO ON CO.ID = LB.COPY_ID
+        ''', (lent_at, due_at))
+        self.cursor.execute("DELETE FROM LOANS_BULK_WRITE")
+
+        results = []
+        for book_id, member_id, copy_id in self.cursor.execute(
+                "SELECT BOOK_ID, MEMBER_ID, COPY_ID FROM LEND_BATCH ORDER BY SEQ"):
+            if copy_id:
+                status = CirculationResult.OK
+            elif not book_id:
+                status = CirculationResult.UNKNOWN_BOOK
+            elif not member_id:
+                status = CirculationResult.UNKNOWN_MEMBER
+            else:
+                status = CirculationResult.ALREADY_LENT
+            results.append(CirculationResult(status, book_id, member_id, copy_id))
+        return results
+
+    def _return_batch(self, returns):
+        """
+        Return a batch of copies without committing.
+        The items are loaded into RETURN_BATCH and resolved like in _lend_batch;
+        the n-th return of a title in the batch takes the n-th lent copy of it
+        that no barcode item in the batch returns.
+        The loan statistics and CURRENT_LOANS are updated once for the batch.
+        :param returns (list): (title, barcode) items; either may be None.
+        :return: (list) A CirculationResult per item, in order.
+        """
+        for statement in BATCH_TABLES:
+            self.cursor.execute(statement)
+        self.cursor.execute("DELETE FROM RETURN_BATCH")
+        self.cursor.executemany("INSERT INTO RETURN_BATCH (TITLE, BARCODE) VALUES (?, ?)", returns)
+        self.cursor.execute('''
+            UPDATE RETURN_BATCH SET BOOK_ID = CO.BOOK_ID, COPY_ID = CO.ID
+            FROM COPIES AS CO WHERE CO.BARCODE = RETURN_BATCH.BARCODE
+        ''')
+        self.cursor.execute('''
+            UPDATE RETURN_BATCH SET BOOK_ID = (SELECT ID FROM BOOKS WHERE TITLE = RETURN_BATCH.TITLE LIMIT 1)
+            WHERE BARCODE IS NULL
+        ''')
+        # a copy scanned twice is returned by the first scan
+        self.cursor.execute('''
+            WITH SCANNED AS (
+                SELECT SEQ, COPY_ID, ROW_NUMBER() OVER (PARTITION BY COPY_ID ORDER BY SEQ) AS N
+                FROM RETURN_BATCH WHERE COPY_ID IS NOT NULL
+            )
+            UPDATE RETURN_BATCH SET MEMBER_ID = LB.MEMBER_ID
+            FROM SCANNED JOIN LEND_BOOKS AS LB ON LB.COPY_ID = SCANNED.COPY_ID
+            WHERE SCANNED.SEQ = RETURN_BATCH.SEQ AND SCANNED.N = 1
+        ''')
+        self.cursor.execute('''
+            WITH WANTED AS (
+                SELECT SEQ, TITLE, ROW_NUMBER() OVER (PARTITION BY TITLE ORDER BY SEQ) AS N
+                FROM RETURN_BATCH WHERE BARCODE IS NULL AND BOOK_ID IS NOT NULL
+            ), OUT AS (
+                SELECT BO.TITLE, LB.COPY_ID, LB.BOOK_ID, LB.MEMBER_ID,
+                       ROW_NUMBER() OVER (PARTITION BY BO.TITLE ORDER BY BO.ID, LB.COPY_ID) AS N
+                FROM (SELECT DISTINCT TITLE FROM WANTED) AS WT
+                JOIN BOOKS AS BO ON BO.TITLE = WT.TITLE
+                JOIN LEND_BOOKS AS LB ON LB.BOOK_ID = BO.ID
+                WHERE LB.COPY_ID NOT IN (SELECT COPY_ID FROM RETURN_BATCH WHERE MEMBER_ID IS NOT NULL)
+            )
+            UPDATE RETURN_BATCH SET COPY_ID = OUT.COPY_ID, BOOK_ID = OUT.BOOK_ID, MEMBER_ID = OUT.MEMBER_ID
+            FROM WANTED JOIN OUT ON OUT.TITLE = WANTED.TITLE AND OUT.N = WANTED.N
+            WHERE WANTED.SEQ = RETURN_BATCH.SEQ
+        ''')
+        self.cursor.execute('''
+            DELETE FROM LEND_BOOKS
+            WHERE COPY_ID IN (SELECT COPY_ID FROM RETURN_BATCH WHERE MEMBER_ID IS NOT NULL)
+        ''')
+        returned_at = self.cursor.execute("SELECT datetime('now')").fetchone()[0]
+        self.cursor.execute("INSERT INTO LOANS_BULK_WRITE VALUES (1)")
+        self.cursor.execute('''
+            UPDATE LOANS SET RETURNED_AT = ?
+            WHERE COPY_ID IN (SELECT COPY_ID FROM RETURN_BATCH WHERE MEMBER_ID IS NOT NULL)
+              AND RETURNED_AT IS NULL
+        ''', (returned_at,))
+        for table, key in (("BOOK_LOAN_STATS", "BOOK_ID"), ("MEMBER_LOAN_STATS", "MEMBER_ID")):
+            self.cursor.execute(f'''
+                UPDATE {table} SET ACTIVE = ACTIVE - RB.RETURNED
+                FROM (
+                    SELECT {key}, COUNT(*) AS RETURNED FROM RETURN_BATCH
+                    WHERE MEMBER_ID IS NOT NULL GROUP BY {key}
+                ) AS RB
+                WHERE {table}.{key} = RB.{key}
+            ''')
+        self.cursor.execute('''
+            INSERT INTO DAILY_LOAN_STATS (DAY, RETURNED)
+            SELECT date(?), COUNT(*) FROM RETURN_BATCH WHERE MEMBER_ID IS NOT NULL HAVING COUNT(*) > 0
+            ON CONFLICT (DAY) DO UPDATE SET RETURNED = RETURNED + excluded.RETURNED
+        ''', (returned_at,))
+        self.cursor.execute('''
+            DELETE FROM CURRENT_LOANS
+            WHERE COPY_ID IN (SELECT COPY_ID FROM RETURN_BATCH WHERE MEMBER_ID IS NOT NULL)
+        ''')
+        self.cursor.execute("DELETE FROM LOANS_BULK_WRITE")
+
+        results = []
+        for book_id, member_id, copy_id in self.cursor.execute(
+                "SELECT BOOK_ID, MEMBER_ID, COPY_ID FROM RETURN_BATCH ORDER BY SEQ"):
+            if member_id:
+                results.append(CirculationResult(CirculationResult.OK, book_id, member_id, copy_id))
+            elif book_id:
+                results.append(CirculationResult(CirculationResult.NOT_LENT, book_id, copy_id=copy_id))
+            else:
+                results.append(CirculationResult(CirculationResult.UNKNOWN_BOOK))
+        return results
+
+    @instrumented
+    def lend_many(self, loans, loan_days=None):
+        """
+        Lend many copies in one transaction, e.g. for a self-checkout queue.
+        Every ID and copy is resolved with set-based queries, so the cost per
+        loan is a fraction of a lend_book call; either all loans are written
+        or none. Items naming a barcode claim their copies before items naming
+        only a title, wherever they are in the batch, so a mixed batch can
+        lend a copy that lend_book calls in the same order would have refused.
+        :param loans (iterable): (title, member no) or (title, member no, barcode) items.
+        :param loan_days (int): Days until the books are due; defaults to LOAN_DAYS.
+        :return: (list) A CirculationResult per item, in order.
+        """
+        loans = [(loan[0], loan[1], loan[2] if len(loan) > 2 else None) for loan in loans]
+        with self.conn:
+            results = self._lend_batch(loans, loan_days)
+        print(f"{sum(map(bool, results))} of {len(results)} books are lent.")
+        return results
+
+    @instrumented
+    def return_many(self, returns):
+        """
+        Return many copies in one transaction, e.g. for the book drop.
+        Every ID and copy is resolved with set-based queries; either all
+        returns are written or none. Items naming a barcode return their
+        copies before items naming only a title, wherever they are in the
+        batch, and a title item then returns another lent copy of the book.
+        :param returns (iterable): Titles, or (title, barcode) items.
+        :return: (list) A CirculationResult per item, in order.
+        """
+        returns = [(item, None) if isinstance(item, str) else tuple(item) for item in returns]
+        with self.conn:
+            results = self._return_batch(returns)
+        print(f"{sum(map(bool, results))} of {len(results)} books have returned to the library system.")
+        return results
+
+    @instrumented
+    def process_scan_file(self, filename, loan_days=None):
+        """
+        Lend and return the copies listed in a scan file, in one transaction.
+        The CSV file needs a title or barcode column; an action column may say
+        'lend' or 'return' (the default, as for a book drop) and lends need a
+        member_no column. Returns are applied before lends, so a copy dropped
+        off and checked out again in the same file ends up lent.
+        :param filename (str): The path to the CSV scan file.
+        :param loan_days (int): Days until the lent books are due; defaults to LOAN_DAYS.
+        :return: (list) (line no, action, CirculationResult) rows in file order.
+        """
+        import csv
+
+        lends, returns = [], []
+        with open(filename, newline="", encoding="utf-8-sig") as scan_file:
+            reader = csv.DictReader(scan_file)
+            for row in reader:
+                action = (row.get("action") or "return").strip().lower()
+                title = (row.get("title") or "").strip() or None
+                barcode = (row.get("barcode") or "").strip() or None
+                if action not in ("lend", "return"):
+                    raise ValueError(f"Line {reader.line_num}: unknown action {action!r}.")
+                if not (title or barcode):
+                    raise ValueError(f"Line {reader.line_num}: no title or barcode.")
+                if action == "lend":
+                    lends.append((reader.line_num, (title, (row.get("member_no") or "").strip(), barcode)))
+                else:
+                    returns.append((reader.line_num, (title, barcode)))
+
+        with self.conn:
+            returned = self._return_batch([item for _, item in returns])
+            lent = self._lend_batch([item for _, item in lends], loan_days)
+        rows = [(line_no, "return", result) for (line_no, _), result in zip(returns, returned)]
+        rows += [(line_no, "lend", result) for (line_no, _), result in zip(lends, lent)]
+        rows.sort(key=itemgetter(0))
+        print(f"{sum(map(bool, returned))} returns and {sum(map(bool, lent))} loans from {filename}.")
+        return rows
+
+    @instrumented
+    def loan_history(self, start=None, end=None, limit=None):
+        """
+        Retrieve the loans made in a time range, oldest first.
+        :param start (str): The first lend timestamp or date to include, e.g. '2024-05-01'.
+        :param end (str): The lend timestamp or date to stop before.
+        :param limit (int): The maximum number of loans; defaults to PAGE_SIZE.
+        :return: (list) (loan ID, title, member no, lent at, due at, returned at) rows.
+        """
+        return self.cursor.execute('''
+            SELECT LO.ID, BO.TITLE, ME.MEMBER_NO, LO.LENT_AT, LO.DUE_AT, LO.RETURNED_AT
+            FROM LOANS AS LO
+            LEFT JOIN BOOKS AS BO ON BO.ID = LO.BOOK_ID
+            LEFT JOIN MEMBERS AS ME ON ME.ID = LO.MEMBER_ID
+            WHERE LO.LENT_AT >= ? AND LO.LENT_AT < ?
+            ORDER BY LO.LENT_AT, LO.ID
+            LIMIT ?
+        ''', (start or "", end or "9999", limit or self.PAGE_SIZE)).fetchall()
+
+    @instrumented
+    def overdue_loans(self, limit=None):
+        """
+        Retrieve the open loans whose due date has passed, most overdue first.
+        :param limit (int): The maximum number of loans; defaults to PAGE_SIZE.
+        :return: (list) (title, member no, first name, last name, due at) rows.
+        """
+        return self.cursor.execute('''
+            SELECT BO.TITLE, ME.MEMBER_NO, ME.FIRST_NAME, ME.LAST_NAME, LO.DUE_AT
+            FROM LOANS AS LO
+            LEFT JOIN BOOKS AS BO ON BO.ID = LO.BOOK_ID
+            LEFT JOIN MEMBERS AS ME ON ME.ID = LO.MEMBER_ID
+            WHERE LO.RETURNED_AT IS NULL AND LO.DUE_AT < datetime('now')
+            ORDER BY LO.DUE_AT
+            LIMIT ?
+        ''', (limit or self.PAGE_SIZE,)).fetchall()
+
+    @instrumented
+    def most_borrowed(self, limit=10, since=None):
+        """
+        Retrieve the most borrowed books.
+        All-time counts come from BOOK_LOAN_STATS; a since date scans only
+        the LOANS index range after it.
+        :param limit (int): The number of books.
+        :param since (str): Only count loans made from this timestamp or date on.
+        :return: (list) (title, loans) rows, most borrowed first.
+        """
+        if since is None:
+            return self.cursor.execute('''
+                SELECT BO.TITLE, ST.LOANS FROM BOOK_LOAN_STATS AS ST
+                JOIN BOOKS AS BO ON BO.ID = ST.BOOK_ID
+                ORDER BY ST.LOANS DESC LIMIT ?
+            ''', (limit,)).fetchall()
+        return self.cursor.execute('''
+            SELECT BO.TITLE, LO.LOANS FROM (
+                SELECT BOOK_ID, COUNT(*) AS LOANS FROM LOANS WHERE LENT_AT >= ? GROUP BY BOOK_ID
+            ) AS LO
+            JOIN BOOKS AS BO ON BO.ID = LO.BOOK_ID
+            ORDER BY LO.LOANS DESC LIMIT ?
+        ''', (since, limit)).fetchall()
+
+    @instrumented
+    def top_borrowers(self, limit=10):
+        """
+        Retrieve the members with the most loans, from MEMBER_LOAN_STATS.
+        :param limit (int): The number of members.
+        :return: (list) (member no, first name, last name, loans, active loans) rows.
+        """
+        return self.cursor.execute('''
+            SELECT ME.MEMBER_NO, ME.FIRST_NAME, ME.LAST_NAME, ST.LOANS, ST.ACTIVE
+            FROM MEMBER_LOAN_STATS AS ST
+            JOIN MEMBERS AS ME ON ME.ID = ST.MEMBER_ID
+            ORDER BY ST.LOANS DESC LIMIT ?
+        ''', (limit,)).fetchall()
+
+    @instrumented
+    def daily_circulation(self, start=None, end=None):
+        """
+        Retrieve the number of books lent and returned per day, from DAILY_LOAN_STATS.
+        :param start (str): The first day to include, 'YYYY-MM-DD'.
+        :param end (str): The last day to include, 'YYYY-MM-DD'.
+        :return: (list) (day, lent, returned) rows in date order.
+        """
+        return self.cursor.execute(
+            "SELECT DAY, LENT, RETURNED FROM DAILY_LOAN_STATS WHERE DAY >= ? AND DAY <= ? ORDER BY DAY",
+            (start or "", end or "9999")).fetchall()
+
+    def _export(self, sql, fields, path, file_format=None, compress=None, chunk_rows=None):
+        """
+        Stream the rows of a query to a CSV or JSON Lines file.
+        The rows are read with fetchmany from a cursor of their own, so memory
+        use does not grow with the table. They are written to path.partial,
+        which replaces path only once the export is complete.
+        :param sql (str): The query; its columns are in the order of fields.
+        :param fields (tuple): The CSV header, or the JSON keys.
+        :param path (str): The path of the file.
+        :param file_format (str): 'csv' or 'jsonl'; defaults to the extension of path.
+        :param compress (bool): Gzip the file; defaults to whether path ends with .gz.
+        :param chunk_rows (int): The number of rows fetched at a time; defaults to EXPORT_CHUNK_ROWS.
+        :return: (int) The number of exported rows.
+        """
+        import csv
+        import gzip
+        import json
+
+        name = path[:-3] if path.endswith(".gz") else path
+        file_format = (file_format or ("jsonl" if name.endswith((".jsonl", ".json")) else "csv")).lower()
+        if file_format not in ("csv", "jsonl"):
+            raise ValueError(f"Unknown export format: {file_format}")
+        compress = path.endswith(".gz") if compress is None else compress
+        chunk_rows = chunk_rows or self.EXPORT_CHUNK_ROWS
+        partial = f"{path}.partial"
+        cursor = self._open_cursor()
+        exported = 0
+        try:
+            if compress:
+                export_file = gzip.open(partial, "wt", compresslevel=6, newline="", encoding="utf-8")
+            else:
+                export_file = open(partial, "w", newline="", encoding="utf-8")
+            with export_file:
+                cursor.execute(sql)
+                if file_format == "csv":
+                    writer = csv.writer(export_file)
+                    writer.writerow(fields)
+                    write_rows = writer.writerows
+                else:
+                    def write_rows(rows):
+                        export_file.writelines(json.dumps(dict(zip(fields, row))) + "\n" for row in rows)
+                rows = cursor.fetchmany(chunk_rows)
+                while rows:
+                    write_rows(rows)
+                    exported += len(rows)
+                    rows = cursor.fetchmany(chunk_rows)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        finally:
+            cursor.close()
+        return exported
+
+    @instrumented
+    def export_books(self, path, file_format=None, compress=None, chunk_rows=None):
+        """
+        Export the books in the column layout add_books_from_csv reads.
+        Only an uncompressed CSV export can be imported again.
+        :param path (str): The path of the file, e.g. books.csv, books.jsonl or books.csv.gz.
+        :param file_format (str): 'csv' or 'jsonl'; defaults to the extension of path.
+        :param compress (bool): Gzip the file; defaults to whether path ends with .gz.
+        :param chunk_rows (int): The number of rows fetched at a time.
+        :return: (int) The number of exported books.
+        """
+        return self._export(f"SELECT {', '.join(self.BOOK_COLUMNS)} FROM BOOKS ORDER BY ID",
+                            self.BOOK_EXPORT_FIELDS, path, file_format, compress, chunk_rows)
+
+    @instrumented
+    def export_members(self, path, file_format=None, compress=None, chunk_rows=None):
+        """
+        Export the members in the column layout register_members_from_csv reads.
+        Only an uncompressed CSV export can be imported again.
+        :param path (str): The path of the file, e.g. members.csv, members.jsonl or members.csv.gz.
+        :param file_format (str): 'csv' or 'jsonl'; defaults to the extension of path.
+        :param compress (bool): Gzip the file; defaults to whether path ends with .gz.
+        :param chunk_rows (int): The number of rows fetched at a time.
+        :return: (int) The number of exported members.
+        """
+        return self._export(f"SELECT {', '.join(self.MEMBER_COLUMNS)} FROM MEMBERS ORDER BY ID",
+                            self.MEMBER_EXPORT_FIELDS, path, file_format, compress, chunk_rows)
+
+    @instrumented
+    def export_loans(self, path, file_format=None, compress=None, chunk_rows=None):
+        """
+        Export the loan history, oldest loan first.
+        :param path (str): The path of the file, e.g. loans.csv, loans.jsonl or loans.csv.gz.
+        :param file_format (str): 'csv' or 'jsonl'; defaults to the extension of path.
+        :param compress (bool): Gzip the file; defaults to whether path ends with .gz.
+        :param chunk_rows (int): The number of rows fetched at a time.
+        :return: (int) The number of exported loans.
+        """
+        return self._export('''
+            SELECT LO.ID, BO.TITLE, CO.BARCODE, ME.MEMBER_NO, LO.LENT_AT, LO.DUE_AT, LO.RETURNED_AT
+            FROM LOANS AS LO
+            LEFT JOIN BOOKS AS BO ON BO.ID = LO.BOOK_ID
+            LEFT JOIN COPIES AS CO ON CO.ID = LO.COPY_ID
+            LEFT JOIN MEMBERS AS ME ON ME.ID = LO.MEMBER_ID
+            ORDER BY LO.ID
+        ''', self.LOAN_EXPORT_FIELDS, path, file_format, compress, chunk_rows)
+
+    @instrumented
+    def snapshot(self, directory=None, keep=None, progress=None):
+        """
+        Back the database up to a new timestamped snapshot without stopping the library.
+        :param directory (str): Where snapshots are kept; defaults to a backups folder next to the database.
+        :param keep (int): The number of snapshots kept.
+        :param progress (callable): Called after each step with the copied and the total number of pages.
+        :return: (str) The path of the snapshot.
+        """
+        return DatabaseBackup(self.profile, directory, keep).snapshot(progress)
+
+    @instrumented
+    def restore(self, snapshot, directory=None):
+        """
+        Replace the contents of the database with a backup.
+        The current database is snapshotted first, so a restore can be undone.
+        Libraries on other connections, in this process or another, drop their
+        cached IDs when the key no longer matches and their search and window
+        caches when PRAGMA data_version moves.
+        :param snapshot (str): The path of the backup file.
+        :param directory (str): Where the snapshot of the current database goes.
+        :return: (str) The path of the snapshot of the replaced database.
+        """
+        DatabaseBackup.verify(snapshot)
+        previous = DatabaseBackup(self.profile, directory).snapshot(protect=snapshot)
+        source = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+        try:
+            source.backup(self.conn)
+        finally:
+            source.close()
+        self.book_ids.clear()
+        self.member_ids.clear()
+        # the backup is not counted in total_changes, so these would look current
+        self.search_ranking = (None, None, [])
+        self.window_anchors.clear()
+        # an older snapshot is brought up to the current schema
+        self._create_tables()
+        print(f"The database is restored from {snapshot}.")
+        return previous
+
+
+class ConcurrentLibrary:
+    """
+    Class representing a thread-safe Library backed by a pool of connections.
+    Each thread reads through its own connection, so lookups run in parallel
+    (WAL lets readers proceed while a write is in progress). Writes go through
+    one shared connection under a lock. Calls that hit SQLITE_BUSY or
+    SQLITE_LOCKED are retried with exponential backoff. The ID caches and the
+    metrics are shared by every connection.
+    Every public Library method is available; WRITE_METHODS decides which
+    connection a call uses. CSV imports take the writer lock once per chunk
+    transaction rather than for the whole file, so other writes get in
+    between chunks.
+    """
+    WRITE_METHODS = frozenset({
+        "add_book", "remove_book", "register_member", "remove_member",
+        "add_books_from_csv", "register_members_from_csv", "lend_book", "return_book",
+        "add_copies", "remove_copy", "lend_many", "return_many", "process_scan_file", "restore",
+    })
+    IMPORT_METHODS = frozenset({"add_books_from_csv", "register_members_from_csv"})
+    BUSY_ERRORS = (5, 6)  # SQLITE_BUSY, SQLITE_LOCKED
+
+    def __init__(self, profile=None, id_cache_size=4096, metrics=None, busy_retries=5, busy_backoff=0.01):
+        """
+        Initialize the ConcurrentLibrary object and open the writer connection.
+        :param profile (ConnectionProfile): The connection settings; defaults to library.db.
+        :param id_cache_size (int): How many title and member no -> ID lookups to cache each.
+        :param metrics (Metrics): Where timings are collected; False turns timing off.
+        :param busy_retries (int): How often a busy call is retried before the error is raised.
+        :param busy_backoff (float): Seconds to wait before the first retry; doubled on each retry.
+        """
+        self.profile = profile or ConnectionProfile()
+        self.metrics = None if metrics is False else metrics or Metrics()
+        self.book_ids = LRUCache(id_cache_size)
+        self.member_ids = LRUCache(id_cache_size)
+        self.busy_retries = busy_retries
+        self.busy_backoff = busy_backoff
+        self.local = threading.local()
+        self.readers = []
+        self.readers_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.writer = self._open()
+        self.writer.write_lock = self.write_lock
+
+    def _open(self):
+        """
+        Open a Library that shares this pool's caches and metrics.
+        Thread checks are off so close() can close readers from any thread;
+        each reader is still only used by the thread that opened it.
+        :return: (Library) The new Library.
+        """
+        return Library(self.profile, metrics=self.metrics if self.metrics is not None else False,
+                       check_same_thread=False, book_ids=self.book_ids, member_ids=self.member_ids)
+
+    def _reader(self):
+        """
+        Get the calling thread's read Library, opening it on first use.
+        :return: (Library) The thread's Library.
+        """
+        library = getattr(self.local, "library", None)
+        if library is None:
+            library = self.local.library = self._open()
+            with self.readers_lock:
+                self.readers.append(library)
+        return library
+
+    def _retry(self, library, fn, args, kwargs):
+        """
+        Call fn, retrying with exponential backoff while the database is busy.
+        :param library (Library): The Library fn belongs to; rolled back before a retry.
+        :param fn (callable): The bound Library method.
+        :return: The return value of fn.
+        """
+        delay = self.busy_backoff
+        for attempt in range(self.busy_retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if getattr(e, "sqlite_errorcode", None) not in self.BUSY_ERRORS or attempt == self.busy_retries:
+                    raise
+                library.conn.rollback()
+                time.sleep(delay)
+                delay *= 2
+
+    def __getattr__(self, name):
+        """
+        Route a Library method to the writer or the calling thread's reader.
+        :param name (str): The method name.
+        :return: (callable) The thread-safe method.
+        """
+        if name.startswith("__") or not callable(getattr(Library, name, None)):
+            raise AttributeError(name)
+        if name in self.IMPORT_METHODS:
+            # the writer locks each chunk itself; retrying the whole call would
+            # run the chunks already committed again
+            return getattr(self.writer, name)
+        if name in self.WRITE_METHODS:
+            def write(*args, **kwargs):
+                with self.write_lock:
+                    return self._retry(self.writer, getattr(self.writer, name), args, kwargs)
+            return write
+
+        def read(*args, **kwargs):
+            library = self._reader()
+            return self._retry(library, getattr(library, name), args, kwargs)
+        return read
+
+    def close(self):
+        """
+        Close the writer and every reader connection.
+        Readers must not be in use by other threads at this point.
+        :return: None
+        """
+        with self.write_lock:
+            self.writer.conn.close()
+        with self.readers_lock:
+            for library in self.readers:
+                library.conn.close()
+            self.readers.clear()
+
+
+class AsyncLibrary:
+    """
+    Class exposing the Library operations as coroutines for asyncio services.
+    Reads run on a bounded thread pool over a ConcurrentLibrary, with
+    per-thread connections. Writes go to a thread of their own, since the
+    writer connection runs them one at a time anyway; a queue of writes can
+    then never take every pool thread and leave reads waiting. CSV imports
+    lock per chunk, so they run on the pool, at most max_workers - 1 at once.
+    Writes and bulk imports take a semaphore slot first. When the slots are
+    full, callers wait in the event loop instead of piling jobs into the pools.
+    """
+    def __init__(self, library=None, max_workers=8, max_pending_writes=64, max_imports=1):
+        """
+        Initialize the AsyncLibrary object.
+        :param library (ConcurrentLibrary): The thread-safe library to wrap; defaults to library.db.
+        :param max_workers (int): The number of threads for reads and imports.
+        :param max_pending_writes (int): How many writes may be queued or running at once.
+        :param max_imports (int): How many CSV imports may run at once.
+        """
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.library = library or ConcurrentLibrary()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="library")
+        self.write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="library-write")
+        self.write_slots = asyncio.Semaphore(max_pending_writes)
+        self.import_slots = asyncio.Semaphore(min(max_imports, max_workers - 1) or 1)
+        self.get_running_loop = asyncio.get_running_loop
+
+    async def _run(self, name, *args, **kwargs):
+        """
+        Run a ConcurrentLibrary method on the thread pool.
+        :param name (str): The method name.
+        :return: The return value of the method.
+        """
+        loop = self.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(getattr(self.library, name),
+                                                                           *args, **kwargs))
+
+    async def _write(self, name, *args, **kwargs):
+        """
+        Run a ConcurrentLibrary write method on the write thread.
+        :param name (str): The method name.
+        :return: The return value of the method.
+        """
+        loop = self.get_running_loop()
+        return await loop.run_in_executor(self.write_executor, functools.partial(getattr(self.library, name),
+                                                                                 *args, **kwargs))
+
+    def __getattr__(self, name):
+        """
+        Return a coroutine function for a Library method.
+        :param name (str): The method name.
+        :return: (callable) The coroutine function.
+        """
+        if name.startswith("__") or name.startswith("iter_") or not callable(getattr(Library, name, None)):
+            raise AttributeError(name)
+        if name in ConcurrentLibrary.WRITE_METHODS:
+            async def write(*args, **kwargs):
+                async with self.write_slots:
+                    return await self._write(name, *args, **kwargs)
+            return write
+
+        async def read(*args, **kwargs):
+            return await self._run(name, *args, **kwargs)
+        return read
+
+    async def add_books_from_csv(self, filename, **kwargs):
+        """
+        Import books from a CSV file; at most max_imports imports run at once.
+        :param filename (str): The path to the CSV file.
+        :return: (ImportResult) The outcome of the import.
+        """
+        async with self.import_slots, self.write_slots:
+            return await self._run("add_books_from_csv", filename, **kwargs)
+
+    async def register_members_from_csv(self, filename, **kwargs):
+        """
+        Register members from a CSV file; at most max_imports imports run at once.
+        :param filename (str): The path to the CSV file.
+        :return: (ImportResult) The outcome of the import.
+        """
+        async with self.import_slots, self.write_slots:
+            return await self._run("register_members_from_csv", filename, **kwargs)
+
+    async def _pages(self, method, page_size, order_by, descending):
+        """
+        Yield a table one keyset page at a time.
+        :return: (async generator) Yields lists of rows.
+        """
+        after = None
+        while True:
+            rows, after = await self._run(method, after, page_size, order_by, descending)
+            if rows:
+                yield rows
+            if after is None:
+                return
+
+    def book_pages(self, page_size=None, order_by="ID", descending=False):
+        """
+        Iterate over the books page by page with async for.
+        :param page_size (int): The number of books per page.
+        :param order_by (str): The BOOKS column to sort by.
+        :param descending (bool): Sort from the largest value to the smallest.
+        :return: (async generator) Yields lists of books.
+        """
+        return self._pages("select_books_page", page_size, order_by, descending)
+
+    def member_pages(self, page_size=None, order_by="ID", descending=False):
+        """
+        Iterate over the members page by page with async for.
+        :param page_size (int): The number of members per page.
+        :param order_by (str): The MEMBERS column to sort by.
+        :param descending (bool): Sort from the largest value to the smallest.
+        :return: (async generator) Yields lists of members.
+        """
+        return self._pages("select_members_page", page_size, order_by, descending)
+
+    async def close(self):
+        """
+        Wait for running calls, then close the connections.
+        :return: None
+        """
+        loop = self.get_running_loop()
+        await loop.run_in_executor(None, self.write_executor.shutdown)
+        await loop.run_in_executor(None, self.executor.shutdown)
+        self.library.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class DatabaseExecutor:
+    """
+    Class running Library operations on a dedicated worker thread.
+    The worker creates and owns the Library (sqlite3 connections are bound to
+    the thread that made them); results are handed back to the Tk thread by
+    polling with root.after, so callbacks can safely touch widgets.
+    """
+    POLL_INTERVAL = 30
+
+    def __init__(self, root, factory, on_busy=None):
+        """
+        Initialize the DatabaseExecutor object and start its worker thread.
+        :param root: The Tk root window used to schedule callbacks.
+        :param factory (callable): Creates the Library on the worker thread.
+        :param on_busy (callable): Called on the Tk thread with the number of unfinished jobs.
+        """
+        from concurrent.futures import Future
+
+        self.future_class = Future
+        self.root = root
+        self.factory = factory
+        self.on_busy = on_busy
+        self.jobs = queue.Queue()
+        self.done = queue.Queue()
+        self.pending = 0
+        self.thread = threading.Thread(target=self._run, name="library-db", daemon=True)
+        self.thread.start()
+        self.root.after(self.POLL_INTERVAL, self._poll)
+
+    def _run(self):
+        """
+        Create the Library and run queued jobs until shutdown.
+        :return: None
+        """
+        try:
+            library = self.factory()
+            startup_error = None
+        except Exception as e:
+            library, startup_error = None, e
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            future, fn, args, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            if startup_error:
+                future.set_exception(startup_error)
+                continue
+            try:
+                future.set_result(fn(library, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+        if library:
+            library.conn.close()
+
+    def submit(self, fn, *args, callback=None, errback=None, **kwargs):
+        """
+        Queue fn(library, *args, **kwargs) to run on the worker thread.
+        :param fn (callable): A Library method or any function taking the library first.
+        :param callback (callable): Called on the Tk thread with the result.
+        :param errback (callable): Called on the Tk thread with the exception; defaults to an error box.
+        :return: (Future) The future of the job.
+        """
+        future = self.future_class()
+        self.pending += 1
+        self._notify_busy()
+        future.add_done_callback(lambda f: self.done.put((f, callback, errback)))
+        self.jobs.put((future, fn, args, kwargs))
+        return future
+
+    def run_in_thread(self, fn, *args, callback=None, errback=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) on a thread of its own, so long jobs that do
+        not need the worker's connection (like backups) do not hold up the queue.
+        :param fn (callable): The function to run.
+        :param callback (callable): Called on the Tk thread with the result.
+        :param errback (callable): Called on the Tk thread with the exception; defaults to an error box.
+        :return: (Future) The future of the job.
+        """
+        future = self.future_class()
+        self.pending += 1
+        self._notify_busy()
+        future.add_done_callback(lambda f: self.done.put((f, callback, errback)))
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="library-job", daemon=True).start()
+        return future
+
+    def _poll(self):
+        """
+        Run the callbacks of finished jobs on the Tk thread.
+        A failing callback is reported and does not stop the polling.
+        :return: None
+        """
+        try:
+            while True:
+                try:
+                    future, callback, errback = self.done.get_nowait()
+                except queue.Empty:
+                    break
+                self.pending -= 1
+                self._notify_busy()
+                if future.cancelled():
+                    continue
+                try:
+                    error = future.exception()
+                    if error is not None:
+                        (errback or self.show_error)(error)
+                    elif callback:
+                        callback(future.result())
+                except Exception as e:
+                    self.show_error(e)
+        finally:
+            self.root.after(self.POLL_INTERVAL, self._poll)
 
-    def _get_member_id(self, member_no):
+    def _notify_busy(self):
         """
-        Get the ID of a member by their member number from the database.
-        :param member_no (str): The member number of the member.
-        :return: (int) The ID of the member.
+        Report the number of unfinished jobs.
+        :return: None
         """
-        self.cursor.execute("SELECT ID FROM MEMBERS WHERE MEMBER_NO = ?", (member_no,))
-        result = self.cursor.fetchone()
-        return result[0] if result else None
+        if self.on_busy:
+            self.on_busy(self.pending)
 
-    def remove_member(self, member_no):
+    @staticmethod
+    def show_error(error):
         """
-        Remove a member from the library database by their member number.
-        :param member_no (str): The member number of the member to remove.
+        Default handler for failed jobs.
+        :param error (Exception): The exception raised by the job.
         :return: None
         """
-        member_id = self._get_member_id(member_no)
-        if member_id:
-            self.cursor.execute("DELETE FROM MEMBERS WHERE ID = ?", (member_id,))
-            self.conn.commit()
-            print(f"The member with the {member_no} member no, has been deleted from the system.")
-            return True
-        else:
-            print("This member cannot be found.")
-            return False
+        messagebox.showerror(title="Error!", message=f"The database operation failed:\n{error}")
 
-    def add_books_from_csv(self, filename):
+    def shutdown(self, timeout=5):
         """
-        Add multiple books to the library database from a CSV file.
-        :param filename (str): The path to the CSV file containing book information.
+        Stop the worker thread after the queued jobs and close the connection.
+        :param timeout (float): Seconds to wait for the worker to finish.
         :return: None
         """
-        with open(file=filename, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                book = Book(
-                    title=row['title'],
-                    author=row['author'],
-                    publisher=row['publisher'],
-                    published_year=row['published_year'],
-                    rating=row['rating'],
-                    isbn=row['ISBN']
-                )
-                self.add_book(book)
+        self.jobs.put(None)
+        self.thread.join(timeout)
 
-    def register_members_from_csv(self, filename):
+
+class VirtualTable:
+    """
+    Class representing a Treeview that only holds the rows on screen.
+    Rows are fetched on demand from a callback as the user scrolls, with a
+    prefetch margin around the visible window so short scrolls hit the cache.
+    """
+    def __init__(self, master, headings, count, fetch, height=30, prefetch=None):
         """
-        Register multiple members in the library database from a CSV file.
-        :param filename (str): The path to the CSV file containing member information.
-        :return: None
+        Initialize a VirtualTable object.
+        :param master: The parent widget.
+        :param headings (tuple): The column headings.
+        :param count (int): The total number of rows.
+        :param fetch (callable): Called as fetch(offset, limit, callback); callback receives the rows.
+        :param height (int): The number of visible rows.
+        :param prefetch (int): The number of extra rows loaded above and below; defaults to height.
         """
-        with open(file=filename, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                member = Member(
-                    first_name=row['first_name'],
-                    last_name=row['last_name'],
-                    email=row['email'],
-                    gender=row['gender'],
-                    state=row['state'],
-                    member_no=row['member_no']
-                )
-                self.register_member(member)
+        self.count = count
+        self.fetch = fetch
+        self.height = height
+        self.prefetch = height if prefetch is None else prefetch
+        self.first = 0
+        self.cache_start = 0
+        self.cache = []
+        self.generation = 0
+        self.loading = None
 
-    def select_books(self):
+        self.frame = ttk.Frame(master)
+        self.tree = ttk.Treeview(self.frame, columns=headings, show="headings", height=height)
+        for heading in headings:
+            self.tree.heading(heading, text=heading)
+        self.scroll = ttk.Scrollbar(self.frame, orient="vertical", command=self.on_scroll)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scroll.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self.first - 3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self.first + 3))
+        self.tree.bind("<Prior>", lambda event: self.scroll_to(self.first - self.height))
+        self.tree.bind("<Next>", lambda event: self.scroll_to(self.first + self.height))
+        self.tree.bind("<Home>", lambda event: self.scroll_to(0))
+        self.tree.bind("<End>", lambda event: self.scroll_to(self.count))
+        self.refresh()
+
+    def pack(self, **kwargs):
         """
-        Retrieve all books from the database.
-        :return: (list) A list of dicts containing book information.
+        Pack the table into its parent.
+        :return: None
         """
-        self.cursor.execute("SELECT * FROM BOOKS")
-        books = self.cursor.fetchall()
-        return books
+        self.frame.pack(**kwargs)
 
-    def select_members(self):
+    def _load(self, first, last):
         """
-        Retrieve all members from the database.
-        :return: (list) A list of dicts containing member information.
+        Request rows first..last plus the prefetch margin; refresh when they arrive.
+        :param first (int): The position of the first row.
+        :param last (int): The position after the last row.
+        :return: None
         """
-        self.cursor.execute("SELECT * FROM MEMBERS")
-        members = self.cursor.fetchall()
-        return members
+        start = max(first - self.prefetch, 0)
+        limit = last + self.prefetch - start
+        request = (self.generation, start, limit)
+        if self.loading == request:
+            return
+        self.loading = request
 
-    def select_one_book(self, title):
+        def loaded(rows):
+            # the window may have been closed while the rows were loading
+            if self.loading != request or not self.tree.winfo_exists():
+                return
+            self.loading = None
+            self.cache_start = start
+            self.cache = rows
+            if len(rows) < limit:
+                # rows were deleted since the table was counted
+                self.count = min(self.count, start + len(rows))
+                self.first = max(0, min(self.first, self.count - self.height))
+            self.refresh()
+
+        self.fetch(start, limit, loaded)
+
+    def refresh(self):
         """
-        Retrieve the selected book from the database.
-        :param book_title (str): The title of the book to be borrowed.
-        :return: (obj) Returns a book object.
+        Redraw the visible rows and update the scrollbar.
+        Rows outside the cache are requested, and drawn once they are loaded.
+        :return: None
         """
-        book_id = self._get_book_id(title)
-        if book_id:
-            book = self.cursor.execute('SELECT TITLE FROM BOOKS WHERE ID=?', (book_id,)).fetchone()
-            return book if book else None
+        last = min(self.first + self.height, self.count)
+        if self.first < self.cache_start or last > self.cache_start + len(self.cache):
+            self._load(self.first, last)
+        else:
+            self.tree.delete(*self.tree.get_children())
+            for row in self.cache[self.first - self.cache_start:last - self.cache_start]:
+                self.tree.insert("", "end", values=row)
+        if self.count:
+            self.scroll.set(self.first / self.count, last / self.count)
+        else:
+            self.scroll.set(0, 1)
 
-    def select_one_member(self, member_no):
+    def reset(self, count, fetch):
         """
-        Retrieve the selected member from the database.
-        :param member_no (int): The title of the member to be borrowed.
-        :return: (obj) Returns a member object.
+        Show a different set of rows, starting from the top.
+        :param count (int): The total number of rows.
+        :param fetch (callable): Called as fetch(offset, limit, callback); callback receives the rows.
+        :return: None
         """
-        member_id = self._get_member_id(member_no)
-        if member_id:
-            member = self.cursor.execute('SELECT * FROM MEMBERS WHERE ID=?', (member_id,)).fetchone()
-            return member if member else None
+        self.count = count
+        self.fetch = fetch
+        self.first = 0
+        self.cache_start = 0
+        self.cache = []
+        self.generation += 1
+        self.loading = None
+        self.refresh()
 
-    def lent_books(self):
+    def scroll_to(self, first):
         """
-        Retrieve all lent books along with member information from the database.
-        :return: (list) A list of dictionaries containing lent book information along with member details.
+        Move the visible window so it starts at the given row.
+        :param first (int): The position of the first visible row.
+        :return: None
         """
-        self.cursor.execute('''
-        SELECT 
-            BO.TITLE AS BOOK_TITLE,
-            ME.FIRST_NAME AS MEMBER_FIRST_NAME,
-            ME.LAST_NAME AS MEMBER_LAST_NAME
-        FROM BOOKS AS BO
-        JOIN LEND_BOOKS ON BOOK_ID = BO.ID
-        JOIN MEMBERS AS ME ON MEMBER_ID = ME.ID
-        ''')
-        lent_books = self.cursor.fetchall()
-        return lent_books
+        first = max(0, min(int(first), self.count - self.height))
+        if first != self.first:
+            self.first = first
+            self.refresh()
 
-    def lend_book(self, title, member_no):
+    def on_scroll(self, action, amount, unit=None):
         """
-        Allow a member to borrow a book from the library.
-        :param book_title (str): The title of the book to be borrowed.
-        :param member_no (str): The member number of the member borrowing the book.
+        Handle the scrollbar's moveto/scroll commands.
         :return: None
         """
-        book_id = self._get_book_id(title)
-        member_id = self._get_member_id(member_no)
-        if book_id and member_id:
-            self.cursor.execute("SELECT * FROM LEND_BOOKS WHERE BOOK_ID = ?", (book_id,))
-            current_lending = self.cursor.fetchone()
-            if current_lending:
-                print(f"The book named {title} is already lent.")
-                return False
-            else:
-                self.cursor.execute("INSERT INTO LEND_BOOKS (BOOK_ID, MEMBER_ID) VALUES (?,?)",
-                                    (book_id, member_id))
-                self.conn.commit()
-                print(f"The book named {title} is lent by the member with {member_no} member no.")
-                return True
+        if action == "moveto":
+            self.scroll_to(float(amount) * self.count)
+        elif unit == "pages":
+            self.scroll_to(self.first + int(amount) * self.height)
         else:
-            print("Unknown book name or member no.")
-            return False
+            self.scroll_to(self.first + int(amount))
 
-    def return_book(self, title):
+    def on_mouse_wheel(self, event):
         """
-        Allow a member to return a borrowed book to the library.
-        :param book_title (str): The title of the book to be returned.
+        Scroll on Windows and macOS mouse wheel events.
         :return: None
         """
-        book_id = self._get_book_id(title)
-        if book_id:
-            self.cursor.execute("SELECT * FROM LEND_BOOKS WHERE BOOK_ID=?", (book_id,))
-            current_lending = self.cursor.fetchone()
-            if current_lending:
-                self.cursor.execute("DELETE FROM LEND_BOOKS WHERE BOOK_ID=?", (book_id,))
-                self.conn.commit()
-                print(f"{title} has returned to the library system.")
-                return True
-            else:
-                print(f"{title} is already in the library.")
-                return False
-        else:
-            print("Unknown book name.")
-            return False
+        step = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_to(self.first - step * 3)
 
 
 class LibraryGUI:
-    def __init__(self, root):
+    def __init__(self, root, profile=None):
         """
         Initialize the Library Management System GUI.
         :param root: The main window of the app.
+        :param profile (ConnectionProfile): The database connection settings.
         """
         self.root = root
+        self.profile = profile or ConnectionProfile()
         self.root.title("Library Management System")
         self.root.config(padx=20, pady=20, bg="white")
         self.display_width = root.winfo_screenwidth()
@@ -383,133 +3471,237 @@ class LibraryGUI:
         self.paned_window_visibility = False
         self.paned_window_button = ttk.Button(root, text="More Options", command=self.toggle_paned_window)
         self.paned_window_button.grid(row=3, column=0, rowspan=2, padx=10, pady=10)
-        self.paned_window = tk.PanedWindow(root, orient=tk.HORIZONTAL, bg="white")
+        # the option pane is built the first time it is shown
+        self.paned_window = None
 
         self.quit_button = ttk.Button(root, text="Exit", command=self.exit)
         self.quit_button.grid(row=3, column=2)
 
-        self.add_book_button = ttk.Button(self.paned_window, text="Add Book", command=self.adding_book)
-        self.add_book_button.pack()
-        self.remove_book_button = ttk.Button(self.paned_window, text="Remove Book", command=self.removing_book)
-        self.remove_book_button.pack()
-        self.register_member_button = ttk.Button(self.paned_window, text="Register Member", command=self.adding_member)
-        self.register_member_button.pack()
-        self.remove_member_button = ttk.Button(self.paned_window, text="Remove Member", command=self.removing_member)
-        self.remove_member_button.pack()
-        self.lend_book = ttk.Button(self.paned_window, text="Lend Book", command=self.lend_book_process)
-        self.lend_book.pack()
-        self.return_book = ttk.Button(self.paned_window, text="Return Book", command=self.return_book_process)
-        self.return_book.pack()
-        self.add_csv_books_button = ttk.Button(self.paned_window,
-                                               text="Add Multiple Books\n(CSV only)",
-                                               command=self.add_books_from_csv)
-        self.add_csv_books_button.pack()
-        self.add_csv_members_button = ttk.Button(self.paned_window,
-                                                 text="Add Multiple Members\n(CSV only",
-                                                 command=self.add_members_from_csv)
-        self.add_csv_members_button.pack()
-        self.url_label = tk.Label(self.paned_window, text="About us", fg="blue", bg="white", cursor="hand2")
-        self.url_label.pack()
-        self.url_label.bind("<Button-1>", self.open_html)
+        self.status_label = ttk.Label(root, text="", background="white")
+        self.status_label.grid(row=4, column=1)
+
+        self.db = DatabaseExecutor(root, lambda: Library(self.profile), on_busy=self.show_busy)
 
-        self.library = Library()
+    def show_busy(self, pending):
+        """
+        Show whether database jobs are still running.
+        :param pending (int): The number of unfinished jobs.
+        :return: None
+        """
+        self.status_label.config(text=f"Working... ({pending})" if pending else "")
+
+    def fetch_rows(self, fn, *args):
+        """
+        Build a VirtualTable fetch callback that runs fn on the database worker.
+        :param fn (callable): A Library method taking offset and limit after *args.
+        :return: (callable) The fetch callback.
+        """
+        return lambda offset, limit, callback: self.db.submit(fn, *args, offset, limit, callback=callback)
 
     def show_books(self):
         """
-        Display the list of books in a new window.
+        Display the list of books in a new window, with a search box above it.
+        :return: None
+        """
+        self.db.submit(Library.count_books, callback=self._open_books_window)
+
+    def _open_books_window(self, count):
+        """
+        Build the books window once the books have been counted.
+        :param count (int): The number of books.
         :return: None
         """
+        if not count:
+            messagebox.showwarning(title="Error!", message="There are no books in the system!")
+            return
         books_window = tk.Toplevel(self.root)
         books_window.title("Books")
-        books = self.library.select_books()
-        if not books:
-            messagebox.showwarning(title="Error!", message="There are no books in the system!")
-            books_window.destroy()
-        else:
-            tree_frame = ttk.Frame(books_window)
-            tree_frame.pack(fill=tk.BOTH, expand=True)
-
-            book_tree = ttk.Treeview(tree_frame, columns=("ID", "Title", "Author", "Publisher",
-                                                          "Published Year", "Rating", "ISBN"), show="headings")
-            book_tree.heading("ID", text="ID")
-            book_tree.heading("Title", text="Title")
-            book_tree.heading("Author", text="Author")
-            book_tree.heading("Publisher", text="Publisher")
-            book_tree.heading("Published Year", text="Published Year")
-            book_tree.heading("Rating", text="Rating")
-            book_tree.heading("ISBN", text="ISBN")
-            for book in books:
-                book_tree.insert("", "end", values=book)
-
-            book_tree.config(height=30)
-            tree_scroll = ttk.Scrollbar(tree_frame, orient="vertical", command=book_tree.yview)
-            book_tree.configure(yscrollcommand=tree_scroll.set)
-            book_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-            tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        search_frame = ttk.Frame(books_window)
+        search_frame.pack(fill=tk.X)
+        search_label = tk.Label(search_frame, text="Search: ")
+        search_label.pack(side=tk.LEFT)
+        search_entry = ttk.Entry(search_frame, width=40)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        book_table = VirtualTable(books_window, ("ID", "Title", "Author", "Publisher",
+                                                 "Published Year", "Rating", "ISBN"),
+                                  count, self.fetch_rows(Library.select_books_window))
+        book_table.pack(fill=tk.BOTH, expand=True)
+        pending_search = [None]
+
+        def run_search():
+            """
+            Show the books matching the search box, or all books if it is empty.
+            :return: None
+            """
+            pending_search[0] = None
+            query = search_entry.get().strip()
+
+            def show_results(result_count):
+                if search_entry.winfo_exists() and search_entry.get().strip() == query:
+                    book_table.reset(result_count, fetch)
+
+            if query:
+                fetch = self.fetch_rows(lambda library, offset, limit: library.search_books(query, limit, offset))
+                self.db.submit(Library.count_search_results, query, callback=show_results)
+            else:
+                fetch = self.fetch_rows(Library.select_books_window)
+                self.db.submit(Library.count_books, callback=show_results)
+
+        def schedule_search(event):
+            """
+            Run the search shortly after the user stops typing.
+            :return: None
+            """
+            if pending_search[0]:
+                books_window.after_cancel(pending_search[0])
+            pending_search[0] = books_window.after(150, run_search)
+
+        search_entry.bind("<KeyRelease>", schedule_search)
+        search_entry.focus_set()
 
     def show_members(self):
         """
         Display the list of members in a new window.
         :return: None
         """
+        self.db.submit(Library.count_members, callback=self._open_members_window)
+
+    def _open_members_window(self, count):
+        """
+        Build the members window once the members have been counted.
+        :param count (int): The number of members.
+        :return: None
+        """
+        if not count:
+            messagebox.showwarning(title="Error!", message="There are no registered members in the system!")
+            return
         members_window = tk.Toplevel(self.root)
         members_window.title("Members")
-        members = self.library.select_members()
-        if not members:
-            messagebox.showwarning(title="Error!", message="There are no registered members in the system!")
-            members_window.destroy()
-        else:
-            tree_frame = ttk.Frame(members_window)
-            tree_frame.pack(fill=tk.BOTH, expand=True)
-
-            member_tree = ttk.Treeview(tree_frame, columns=("ID", "First Name", "Last Name", "Email",
-                                                            "Gender", "State", "Member No"), show="headings")
-            member_tree.heading("ID", text="ID")
-            member_tree.heading("First Name", text="First Name")
-            member_tree.heading("Last Name", text="Last Name")
-            member_tree.heading("Email", text="Email")
-            member_tree.heading("Gender", text="Gender")
-            member_tree.heading("State", text="State")
-            member_tree.heading("Member No", text="Member No")
-            for member in members:
-                member_tree.insert("", "end", values=member)
-
-            member_tree.config(height=30)
-            tree_scroll = ttk.Scrollbar(tree_frame, orient="vertical", command=member_tree.yview)
-            member_tree.configure(yscrollcommand=tree_scroll.set)
-            member_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-            tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        member_table = VirtualTable(members_window, ("ID", "First Name", "Last Name", "Email",
+                                                     "Gender", "State", "Member No"),
+                                    count, self.fetch_rows(Library.select_members_window))
+        member_table.pack(fill=tk.BOTH, expand=True)
 
     def show_lent_books(self):
         """
-        Display the list of lent books in a new window.
+        Display the list of lent books in a new window, with member no and title filters above it.
+        :return: None
+        """
+        self.db.submit(Library.count_lent_books, callback=self._open_lent_books_window)
+
+    def _open_lent_books_window(self, count):
+        """
+        Build the lent books window once the loans have been counted.
+        :param count (int): The number of lent books.
         :return: None
         """
+        if not count:
+            messagebox.showinfo("No Lent Books", "There are no lent books at the moment.")
+            return
         lent_books_window = tk.Toplevel(self.root)
         lent_books_window.title("Lent Books")
-        lent_books = self.library.lent_books()
+        filter_frame = ttk.Frame(lent_books_window)
+        filter_frame.pack(fill=tk.X)
+        member_no_label = tk.Label(filter_frame, text="Member No: ")
+        member_no_label.pack(side=tk.LEFT)
+        member_no_entry = ttk.Entry(filter_frame, width=15)
+        member_no_entry.pack(side=tk.LEFT)
+        title_label = tk.Label(filter_frame, text="Title: ")
+        title_label.pack(side=tk.LEFT)
+        title_entry = ttk.Entry(filter_frame, width=30)
+        title_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
-        if not lent_books:
-            messagebox.showinfo("No Lent Books", "There are no lent books at the moment.")
-            lent_books_window.destroy()
-        else:
-            lent_books_tree = ttk.Treeview(lent_books_window,
-                                           columns=("Book Title", "Member First Name", "Member Last Name"),
-                                           show="headings")
-            lent_books_tree.heading("Book Title", text="Book Title")
-            lent_books_tree.heading("Member First Name", text="Member First Name")
-            lent_books_tree.heading("Member Last Name", text="Member Last Name")
+        lent_books_table = VirtualTable(lent_books_window, ("Book Title", "Barcode", "Member No",
+                                                            "Member First Name", "Member Last Name",
+                                                            "Lent At", "Due At"),
+                                        count, self.fetch_rows(Library.select_lent_books_window))
+        lent_books_table.pack(fill=tk.BOTH, expand=True)
+        pending_filter = [None]
 
-            for book in lent_books:
-                lent_books_tree.insert("", "end", values=book)
+        def run_filter():
+            """
+            Show the loans matching the filters.
+            :return: None
+            """
+            pending_filter[0] = None
+            filters = (member_no_entry.get().strip(), title_entry.get().strip())
+
+            def show_results(result_count):
+                if member_no_entry.winfo_exists() and \
+                        (member_no_entry.get().strip(), title_entry.get().strip()) == filters:
+                    lent_books_table.reset(result_count, fetch)
+
+            fetch = self.fetch_rows(lambda library, offset, limit:
+                                    library.select_lent_books_window(offset, limit, *filters))
+            self.db.submit(Library.count_lent_books, *filters, callback=show_results)
+
+        def schedule_filter(event):
+            """
+            Apply the filters shortly after the user stops typing.
+            :return: None
+            """
+            if pending_filter[0]:
+                lent_books_window.after_cancel(pending_filter[0])
+            pending_filter[0] = lent_books_window.after(150, run_filter)
+
+        member_no_entry.bind("<KeyRelease>", schedule_filter)
+        title_entry.bind("<KeyRelease>", schedule_filter)
 
-            lent_books_tree.pack()
+    def _build_paned_window(self):
+        """
+        Create the additional option pane and its buttons.
+        :return: None
+        """
+        self.paned_window = tk.PanedWindow(self.root, orient=tk.HORIZONTAL, bg="white")
+        self.add_book_button = ttk.Button(self.paned_window, text="Add Book", command=self.adding_book)
+        self.add_book_button.pack()
+        self.remove_book_button = ttk.Button(self.paned_window, text="Remove Book", command=self.removing_book)
+        self.remove_book_button.pack()
+        self.register_member_button = ttk.Button(self.paned_window, text="Register Member", command=self.adding_member)
+        self.register_member_button.pack()
+        self.remove_member_button = ttk.Button(self.paned_window, text="Remove Member", command=self.removing_member)
+        self.remove_member_button.pack()
+        self.lend_book = ttk.Button(self.paned_window, text="Lend Book", command=self.lend_book_process)
+        self.lend_book.pack()
+        self.return_book = ttk.Button(self.paned_window, text="Return Book", command=self.return_book_process)
+        self.return_book.pack()
+        self.add_csv_books_button = ttk.Button(self.paned_window,
+                                               text="Add Multiple Books\n(CSV only)",
+                                               command=self.add_books_from_csv)
+        self.add_csv_books_button.pack()
+        self.add_csv_members_button = ttk.Button(self.paned_window,
+                                                 text="Add Multiple Members\n(CSV only",
+                                                 command=self.add_members_from_csv)
+        self.add_csv_members_button.pack()
+        self.scan_file_button = ttk.Button(self.paned_window,
+                                           text="Process Scan File\n(CSV only)",
+                                           command=self.process_scan_file)
+        self.scan_file_button.pack()
+        self.export_books_button = ttk.Button(self.paned_window, text="Export Books",
+                                              command=lambda: self.export_data(Library.export_books, "Export Books"))
+        self.export_books_button.pack()
+        self.export_members_button = ttk.Button(self.paned_window, text="Export Members",
+                                                command=lambda: self.export_data(Library.export_members,
+                                                                                 "Export Members"))
+        self.export_members_button.pack()
+        self.backup_button = ttk.Button(self.paned_window, text="Back Up Now", command=self.backup_database)
+        self.backup_button.pack()
+        self.restore_button = ttk.Button(self.paned_window, text="Restore Backup", command=self.restore_database)
+        self.restore_button.pack()
+        self.stats_button = ttk.Button(self.paned_window, text="Statistics", command=self.show_statistics)
+        self.stats_button.pack()
+        self.url_label = tk.Label(self.paned_window, text="About us", fg="blue", bg="white", cursor="hand2")
+        self.url_label.pack()
+        self.url_label.bind("<Button-1>", self.open_html)
 
     def toggle_paned_window(self):
         """
         Toggle the visibility of the additional option pane.
         :return: None
         """
+        if self.paned_window is None:
+            self._build_paned_window()
         if self.paned_window_visibility:
             self.paned_window.grid_forget()
             self.paned_window_visibility = False
@@ -576,6 +3768,9 @@ class LibraryGUI:
                     raise Exception
                 if published_year < 1850 or published_year > datetime.date.today().year:
                     raise Exception
+                if isbn and not isbn_is_valid(isbn):
+                    messagebox.showerror(title="Error!", message=f"ISBN {isbn} has a wrong check digit.")
+                    return
             except (ValueError, TypeError):
                 messagebox.showerror(title="Error!", message="Published year and rating must be entered as number.")
                 return
@@ -596,10 +3791,12 @@ Published year must be between 1850 - Current Year""")
                                             ISBN: {isbn}    
                                             """)
                 if confirm:
+                    def book_added(result):
+                        messagebox.showinfo("Successful!", "The book has added to the system successfully!")
+                        add_book_window.destroy()
+
                     book = Book(title, author, publisher, published_year, rating, isbn)
-                    self.library.add_book(book)
-                    messagebox.showinfo("Successful!", "The book has added to the system successfully!")
-                    add_book_window.destroy()
+                    self.db.submit(Library.add_book, book, callback=book_added)
             else:
                 messagebox.showerror("Error", "Please fill in all fields.")
 
@@ -635,11 +3832,15 @@ Published year must be between 1850 - Current Year""")
                 confirm = messagebox.askyesno("Confirmation",
                                               "Are you sure you want to remove this book?")
                 if confirm:
-                    if self.library.remove_book(title):
-                        messagebox.showinfo("Successful!", "The book has been removed from the system successfully!")
-                        remove_book_window.destroy()
-                    else:
-                        messagebox.showerror("Error!", "The book cannot be found!")
+                    def book_removed(removed):
+                        if removed:
+                            messagebox.showinfo("Successful!", "The book has been removed from the system successfully!")
+                            remove_book_window.destroy()
+                        else:
+                            messagebox.showerror("Error!", "The book cannot be found!")
+
+                    self.db.submit(Library.remove_book, title, callback=book_removed,
+                                   errback=lambda error: messagebox.showerror("Error!", str(error)))
             else:
                 messagebox.showerror("Error", "Please fill in the field.")
 
@@ -712,10 +3913,12 @@ Published year must be between 1850 - Current Year""")
                                             Member No: {member_no}    
                                             """)
                 if confirm:
+                    def member_registered(result):
+                        messagebox.showinfo("Successful!", "The member has registered to the system successfully!")
+                        add_member_window.destroy()
+
                     member = Member(first_name, last_name, email, gender, state, member_no)
-                    self.library.register_member(member)
-                    messagebox.showinfo("Successful!", "The member has registered to the system successfully!")
-                    add_member_window.destroy()
+                    self.db.submit(Library.register_member, member, callback=member_registered)
             else:
                 messagebox.showerror("Error", "Please fill in all fields.")
 
@@ -753,11 +3956,15 @@ Published year must be between 1850 - Current Year""")
                 confirm = messagebox.askyesno("Confirmation",
                                               "Are you sure you want to remove this member?")
                 if confirm:
-                    if self.library.remove_member(member_no):
-                        messagebox.showinfo("Successful!", "The member has been removed from the system successfully!")
-                        remove_member_window.destroy()
-                    else:
-                        messagebox.showerror("Error!", "The member cannot be found!")
+                    def member_removed(removed):
+                        if removed:
+                            messagebox.showinfo("Successful!", "The member has been removed from the system successfully!")
+                            remove_member_window.destroy()
+                        else:
+                            messagebox.showerror("Error!", "The member cannot be found!")
+
+                    self.db.submit(Library.remove_member, member_no, callback=member_removed,
+                                   errback=lambda error: messagebox.showerror("Error!", str(error)))
             else:
                 messagebox.showerror("Error", "Please fill in the field.")
 
@@ -801,15 +4008,18 @@ Published year must be between 1850 - Current Year""")
                                             Member No: {member_no}
                                             """)
                 if confirm:
-                    if self.library.lend_book(title=book_title, member_no=member_no) and self.library.select_one_book(title=book_title):
-                        messagebox.showinfo("Successful!", "The book has lent to the member successfully!")
-                        lend_book_window.destroy()
-                    elif not self.library.select_one_book(title=book_title):
-                        messagebox.showerror("Error!", "The book cannot be found.")
-                    elif not self.library.select_one_member(member_no):
-                        messagebox.showerror("Error!", "The member cannot be found.")
-                    else:
-                        messagebox.showerror("Error!", "The book is already lent to another member.")
+                    def book_lent(result):
+                        if result:
+                            messagebox.showinfo("Successful!", "The book has lent to the member successfully!")
+                            lend_book_window.destroy()
+                        elif result.status == CirculationResult.UNKNOWN_BOOK:
+                            messagebox.showerror("Error!", "The book cannot be found.")
+                        elif result.status == CirculationResult.UNKNOWN_MEMBER:
+                            messagebox.showerror("Error!", "The member cannot be found.")
+                        else:
+                            messagebox.showerror("Error!", "Every copy of the book is lent out.")
+
+                    self.db.submit(Library.lend_book, book_title, member_no, callback=book_lent)
             else:
                 messagebox.showerror("Error", "Please fill in all fields.")
         member_no_entry.grid(row=2, column=1)
@@ -827,7 +4037,8 @@ Published year must be between 1850 - Current Year""")
         return_book_window.title("Lend Book Information")
         return_book_window.geometry("500x200")
         return_book_window.resizable(False, False)
-        info_label = tk.Label(return_book_window, text="Please enter the 'title' of the book: ")
+        info_label = tk.Label(return_book_window,
+                              text="Please enter the 'title' of the book or the 'barcode' of the copy: ")
 
         info_label.grid(row=0, column=0, columnspan=2, padx=5, pady=5)
         book_title_label = tk.Label(return_book_window, text="Book Title: ")
@@ -835,6 +4046,10 @@ Published year must be between 1850 - Current Year""")
         book_title_label.grid(row=1, column=0)
         book_title_entry = ttk.Entry(return_book_window, width=30)
         book_title_entry.grid(row=1, column=1)
+        barcode_label = tk.Label(return_book_window, text="Barcode: ")
+        barcode_label.grid(row=2, column=0)
+        barcode_entry = ttk.Entry(return_book_window, width=30)
+        barcode_entry.grid(row=2, column=1)
 
         def return_book_to_library():
             """
@@ -842,49 +4057,261 @@ Published year must be between 1850 - Current Year""")
             :return: None
             """
             book_title = book_title_entry.get().strip()
+            barcode = barcode_entry.get().strip()
 
-            if book_title:
+            if book_title or barcode:
+                copy = f"Barcode: {barcode}" if barcode else f"Title: {book_title}"
                 confirm = messagebox.askyesno("Confirmation",
                                               f"""Are you sure you want to return this book to the library?
-                                            Title: {book_title}
+                                            {copy}
                                             """)
                 if confirm:
-                    if self.library.return_book(title=book_title):
-                        messagebox.showinfo("Successful!", "The book has brought back to the library successfully!")
-                        return_book_window.destroy()
-                    elif self.library.select_one_book(title=book_title):
-                        messagebox.showerror("Error!", "The book is already in the library.")
-                    else:
-                        messagebox.showerror("Error!", "The book cannot be found in the library.")
+                    def book_returned(result):
+                        if result:
+                            messagebox.showinfo("Successful!", "The book has brought back to the library successfully!")
+                            return_book_window.destroy()
+                        elif result.status == CirculationResult.NOT_LENT:
+                            messagebox.showerror("Error!", "The book is already in the library.")
+                        else:
+                            messagebox.showerror("Error!", "The book cannot be found in the library.")
+
+                    self.db.submit(Library.return_book, book_title or None, barcode or None,
+                                   callback=book_returned)
             else:
                 messagebox.showerror("Error", "Please fill in all fields.")
 
         add_button = ttk.Button(return_book_window, text="Return Book", command=return_book_to_library)
         add_button.grid(row=7, column=0, columnspan=2, pady=10)
 
+    def run_import(self, fn, filename, title, on_done):
+        """
+        Run a CSV import on the database worker behind a progress window.
+        The window shows percent complete, rows per second and the time left,
+        and its Cancel button stops the import before the next chunk is written.
+        :param fn (callable): The Library import method.
+        :param filename (str): The path to the CSV file.
+        :param title (str): The title of the progress window.
+        :param on_done (callable): Called with the ImportResult when the import ends.
+        :return: None
+        """
+        cancel = threading.Event()
+        latest = [None]
+
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title(title)
+        progress_window.resizable(False, False)
+        progress_window.protocol("WM_DELETE_WINDOW", cancel.set)
+        progress_bar = ttk.Progressbar(progress_window, length=300, mode="determinate", maximum=100)
+        progress_bar.grid(row=0, column=0, padx=10, pady=10)
+        progress_label = tk.Label(progress_window, text="Starting...")
+        progress_label.grid(row=1, column=0, padx=10)
+
+        def cancel_import():
+            cancel.set()
+            progress_label.config(text="Cancelling...")
+
+        cancel_button = ttk.Button(progress_window, text="Cancel", command=cancel_import)
+        cancel_button.grid(row=2, column=0, pady=10)
+
+        def report(progress):
+            # runs on the worker thread; the Tk thread picks the snapshot up in show_progress
+            latest[0] = (progress.percent, progress.rows, progress.rows_per_second, progress.eta)
+
+        def show_progress():
+            if not progress_window.winfo_exists():
+                return
+            if latest[0] and not cancel.is_set():
+                percent, rows, rate, eta = latest[0]
+                progress_bar["value"] = percent
+                progress_label.config(text=f"{percent:.0f}% - {rows} rows - {rate:.0f} rows/s"
+                                           f" - {eta:.0f} s left")
+            progress_window.after(200, show_progress)
+
+        def finished(result):
+            progress_window.destroy()
+            on_done(result)
+
+        def failed(error):
+            progress_window.destroy()
+            self.db.show_error(error)
+
+        self.db.submit(fn, filename, progress=report, cancel=cancel, callback=finished, errback=failed)
+        show_progress()
+
     def add_books_from_csv(self):
         """
         Open a file dialog to add books to the library from a CSV file.
         :return: None
         """
+        from tkinter import filedialog
+
         filename = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv")])
         if filename:
-            self.library.add_books_from_csv(filename)
+            def books_imported(result):
+                messagebox.showinfo("Import Cancelled" if result.cancelled else "Import Finished",
+                                    f"""Added books: {result.inserted}
+Already in the system or repeated: {result.duplicates}
+Invalid rows: {len(result.rejected) - result.duplicates}""")
+
+            self.run_import(Library.add_books_from_csv, filename, "Importing Books", books_imported)
 
     def add_members_from_csv(self):
         """
         Open a file dialog to add members to the library from a CSV file.
         :return: None
         """
+        from tkinter import filedialog
+
+        filename = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv")])
+        if filename:
+            def members_imported(result):
+                messagebox.showinfo("Import Cancelled" if result.cancelled else "Import Finished",
+                                    f"""Registered members: {result.inserted}
+Already in the system or repeated: {result.duplicates}
+Invalid rows: {len(result.rejected) - result.duplicates}""")
+
+            self.run_import(Library.register_members_from_csv, filename, "Importing Members", members_imported)
+
+    def process_scan_file(self):
+        """
+        Open a file dialog to lend and return the copies listed in a CSV scan file.
+        :return: None
+        """
+        from tkinter import filedialog
+
         filename = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv")])
         if filename:
-            self.library.register_members_from_csv(filename)
+            def scan_file_processed(rows):
+                failed = [line_no for line_no, _, result in rows if not result]
+                messagebox.showinfo("Scan File Processed",
+                                    f"""Processed rows: {len(rows) - len(failed)}
+Failed rows: {len(failed)}""")
+
+            self.db.submit(Library.process_scan_file, filename, callback=scan_file_processed)
+
+    def export_data(self, method, title):
+        """
+        Open a save dialog and export a table as CSV or JSON Lines; a name ending in .gz is compressed.
+        :param method (callable): Library.export_books or Library.export_members.
+        :param title (str): The title of the dialog.
+        :return: None
+        """
+        from tkinter import filedialog
+
+        filename = filedialog.asksaveasfilename(title=title, defaultextension=".csv",
+                                                filetypes=[("CSV Files", "*.csv"), ("JSON Lines Files", "*.jsonl"),
+                                                           ("Compressed Files", "*.gz")])
+        if filename:
+            def exported(count):
+                messagebox.showinfo("Export Finished", f"Exported rows: {count}")
+
+            self.db.submit(method, filename, callback=exported)
+
+    def backup_database(self):
+        """
+        Snapshot the database in the background; lending and returning go on meanwhile.
+        :return: None
+        """
+        def backed_up(path):
+            messagebox.showinfo("Backup Finished", f"The database is backed up to:\n{path}")
+
+        self.db.run_in_thread(DatabaseBackup(self.profile).snapshot, callback=backed_up)
+
+    def restore_database(self):
+        """
+        Open a file dialog to replace the database with one of its snapshots.
+        :return: None
+        """
+        from tkinter import filedialog
+
+        backups = DatabaseBackup(self.profile)
+        filename = filedialog.askopenfilename(initialdir=backups.directory, filetypes=[("Database Files", "*.db")])
+        if filename:
+            if messagebox.askyesno("Confirmation", f"""Are you sure you want to restore the database from:
+{filename}
+The current database is backed up first."""):
+                def restored(previous):
+                    messagebox.showinfo("Restore Finished", f"""The database is restored.
+The replaced database was saved to:
+{previous}""")
+
+                self.db.submit(Library.restore, filename, callback=restored)
+
+    def show_statistics(self):
+        """
+        Display the timings of the library operations, SQL statements and commits.
+        :return: None
+        """
+        self.db.submit(lambda library: library.metrics.snapshot(), callback=self._open_statistics_window)
+
+    def _open_statistics_window(self, snapshot):
+        """
+        Build the statistics window from a metrics snapshot.
+        :param snapshot (dict): The result of Metrics.snapshot().
+        :return: None
+        """
+        stats_window = tk.Toplevel(self.root)
+        stats_window.title("Statistics")
+
+        stats_tree = ttk.Treeview(stats_window, columns=("Kind", "Name", "Count", "Mean (ms)", "P95 (ms)",
+                                                         "Max (ms)", "Total (ms)"), show="headings", height=15)
+        for heading in ("Kind", "Name", "Count", "Mean (ms)", "P95 (ms)", "Max (ms)", "Total (ms)"):
+            stats_tree.heading(heading, text=heading)
+            stats_tree.column(heading, width=80, anchor=tk.E)
+        stats_tree.column("Kind", width=60, anchor=tk.W)
+        stats_tree.column("Name", width=400, anchor=tk.W)
+        rows = [(kind, name, summary) for kind, histograms in snapshot["stats"].items()
+                for name, summary in histograms.items()]
+        for kind, name, summary in sorted(rows, key=lambda row: row[2]["total_ms"], reverse=True):
+            stats_tree.insert("", "end", values=(kind, name, summary["count"], f"{summary['mean_ms']:.3f}",
+                                                 f"{summary['p95_ms']:.3f}", f"{summary['max_ms']:.3f}",
+                                                 f"{summary['total_ms']:.1f}"))
+        stats_tree.pack(fill=tk.BOTH, expand=True)
+
+        slow_label = tk.Label(stats_window, text=f"Slow calls (>= {snapshot['slow_ms']} ms):")
+        slow_label.pack(anchor=tk.W)
+        slow_tree = ttk.Treeview(stats_window, columns=("Time", "Kind", "Name", "ms"), show="headings", height=8)
+        for heading in ("Time", "Kind", "Name", "ms"):
+            slow_tree.heading(heading, text=heading)
+        slow_tree.column("Name", width=460)
+        for entry in reversed(snapshot["slow_log"]):
+            slow_tree.insert("", "end", values=(datetime.datetime.fromtimestamp(entry["time"]).strftime("%H:%M:%S"),
+                                                entry["kind"], entry["name"], f"{entry['ms']:.1f}"))
+        slow_tree.pack(fill=tk.BOTH, expand=True)
+
+        def save_metrics():
+            """
+            Write the metrics to a JSON file chosen by the user.
+            :return: None
+            """
+            from tkinter import filedialog
+
+            filename = filedialog.asksaveasfilename(defaultextension=".json",
+                                                    filetypes=[("JSON Files", "*.json")])
+            if filename:
+                self.db.submit(lambda library: library.metrics.dump(filename),
+                               callback=lambda result: messagebox.showinfo("Saved", f"Metrics saved to {filename}"))
+
+        def reset_metrics():
+            """
+            Clear the metrics and close the window.
+            :return: None
+            """
+            self.db.submit(lambda library: library.metrics.reset())
+            stats_window.destroy()
+
+        save_button = ttk.Button(stats_window, text="Save to File", command=save_metrics)
+        save_button.pack(side=tk.LEFT, padx=5, pady=5)
+        reset_button = ttk.Button(stats_window, text="Reset", command=reset_metrics)
+        reset_button.pack(side=tk.LEFT, padx=5, pady=5)
 
     def open_html(self, event):
         """
         Open an HTML file in the default web browser.
         :return: None
         """
+        import webbrowser
+
         script_dir = os.path.dirname(os.path.realpath(__file__))
         html_file_path = os.path.join(script_dir, "index.html")
         webbrowser.open_new(html_file_path)
@@ -901,8 +4328,8 @@ Published year must be between 1850 - Current Year""")
         Close the database connection.
         :return: None
         """
+        self.db.shutdown()
         print("Database connection is closed.")
-        self.library.conn.close()
 
 
 def main():
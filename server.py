@@ -0,0 +1,384 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+import http.client
+from urllib.parse import urlsplit, parse_qs
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+
+from main import ConcurrentLibrary, ConnectionProfile
+
+MAX_BATCH = 500
+
+
+class BadRequest(Exception):
+    """
+    Raised by a route when the request is malformed; answered with 400.
+    """
+
+
+def circulation_json(result):
+    return {"ok": bool(result), "status": result.status, "book_id": result.book_id, "member_id": result.member_id,
+            "copy_id": result.copy_id}
+
+
+def import_json(result):
+    return {"inserted": result.inserted, "duplicates": result.duplicates,
+            "rejected": [{"line": line_no, "reason": reason} for line_no, reason in result.rejected],
+            "cancelled": result.cancelled}
+
+
+class LibraryRequestHandler(BaseHTTPRequestHandler):
+    """
+    Class handling the JSON endpoints of the library service.
+
+    GET  /books?after=&limit=&order_by=&desc=   one keyset page of books
+    GET  /members?after=&limit=&order_by=&desc= one keyset page of members
+    GET  /search?q=&limit=&offset=              full-text book search
+    GET  /lent?after=&limit=&member_no=&title=  one page of the lent books
+    GET  /stats                                 the Library metrics
+    GET  /loans?start=&end=&limit=              loan history in a time range
+    GET  /loans/overdue, /loans/popular?since=, /loans/daily?start=&end=
+    POST /lend    {"title" or "barcode", "member_no"} or {"items": [...]}
+    POST /return  {"title"} or {"barcode"} or {"items": [...]}
+    POST /import/books, /import/members         CSV file as the request body
+    """
+    protocol_version = "HTTP/1.1"
+    # an idle keep-alive connection holds a worker, so it is closed soon
+    timeout = 5
+    # headers and body are written separately; without this each keep-alive
+    # response waits out the peer's delayed ACK
+    disable_nagle_algorithm = True
+    server_version = "DaisyLibrary/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    @property
+    def library(self):
+        return self.server.library
+
+    def send_json(self, status, payload):
+        """
+        Send a JSON response with a Content-Length, so the connection stays open.
+        :param status (int): The HTTP status code.
+        :param payload: The JSON-serializable body.
+        :return: None
+        """
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.busy:
+            # hand the worker to a waiting connection instead of keeping this one
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        """
+        Read and parse the JSON request body.
+        :return: (dict) The parsed body.
+        """
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise BadRequest("The request body is not valid JSON.")
+
+    def dispatch(self, routes):
+        """
+        Run the route matching the request path and answer with its result.
+        :param routes (dict): Paths mapped to handler methods.
+        :return: None
+        """
+        url = urlsplit(self.path)
+        route = routes.get(url.path.rstrip("/") or "/")
+        if route is None:
+            # the body must still be consumed to keep the connection usable
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self.send_json(404, {"error": f"Unknown endpoint {url.path}"})
+            return
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            self.send_json(200, route(self, query))
+        except (BadRequest, ValueError) as e:
+            self.send_json(400, {"error": str(e)})
+        except Exception as e:
+            self.log_error("%s failed: %r", url.path, e)
+            self.send_json(500, {"error": "Internal server error"})
+
+    def do_GET(self):
+        self.dispatch(self.GET_ROUTES)
+
+    def do_POST(self):
+        self.dispatch(self.POST_ROUTES)
+
+    def page(self, method, query):
+        after = json.loads(query["after"]) if "after" in query else None
+        if isinstance(after, list):
+            after = tuple(after)
+        rows, next_key = method(after=after, limit=min(int(query.get("limit", 100)), 1000),
+                                order_by=query.get("order_by", "ID"),
+                                descending=query.get("desc", "0").lower() in ("1", "true"))
+        return {"rows": rows, "next": json.dumps(next_key) if next_key is not None else None}
+
+    def get_books(self, query):
+        return self.page(self.library.select_books_page, query)
+
+    def get_members(self, query):
+        return self.page(self.library.select_members_page, query)
+
+    def get_search(self, query):
+        limit = min(int(query.get("limit", 20)), 1000)
+        return {"rows": self.library.search_books(query.get("q", ""), limit, int(query.get("offset", 0)))}
+
+    def get_lent(self, query):
+        after = json.loads(query["after"]) if "after" in query else None
+        rows, next_key = self.library.lent_books_page(after, min(int(query.get("limit", 100)), 1000),
+                                                      query.get("member_no"), query.get("title"))
+        return {"rows": rows, "next": json.dumps(next_key) if next_key is not None else None}
+
+    def get_stats(self, query):
+        return self.library.metrics.snapshot() if self.library.metrics else {}
+
+    def get_loans(self, query):
+        limit = min(int(query.get("limit", 100)), 1000)
+        return {"rows": self.library.loan_history(query.get("start"), query.get("end"), limit)}
+
+    def get_overdue(self, query):
+        return {"rows": self.library.overdue_loans(min(int(query.get("limit", 100)), 1000))}
+
+    def get_popular(self, query):
+        return {"rows": self.library.most_borrowed(min(int(query.get("limit", 10)), 1000), query.get("since"))}
+
+    def get_daily(self, query):
+        return {"rows": self.library.daily_circulation(query.get("start"), query.get("end"))}
+
+    def batch_items(self):
+        """
+        Read a single item or an {"items": [...]} batch from the body.
+        :return: (tuple) The list of items and whether the request was a batch.
+        """
+        body = self.read_json()
+        if "items" not in body:
+            return [body], False
+        items = body["items"]
+        if not isinstance(items, list) or len(items) > MAX_BATCH:
+            raise BadRequest(f"items must be a list of at most {MAX_BATCH} entries.")
+        return items, True
+
+    def post_lend(self, query):
+        items, batch = self.batch_items()
+        if not all(isinstance(item, dict) and item.get("member_no") and (item.get("title") or item.get("barcode"))
+                   for item in items):
+            raise BadRequest("Every item needs a member_no and a title or a barcode.")
+        loans = [(item.get("title"), item["member_no"], item.get("barcode")) for item in items]
+        results = [circulation_json(result) for result in self.library.lend_many(loans)]
+        return {"results": results} if batch else results[0]
+
+    def post_return(self, query):
+        items, batch = self.batch_items()
+        if not all(isinstance(item, dict) and (item.get("title") or item.get("barcode")) for item in items):
+            raise BadRequest("Every item needs a title or a barcode.")
+        returns = [(item.get("title"), item.get("barcode")) for item in items]
+        results = [circulation_json(result) for result in self.library.return_many(returns)]
+        return {"results": results} if batch else results[0]
+
+    def import_csv(self, method):
+        """
+        Spool the CSV request body to a temporary file and import it.
+        :param method (callable): The Library import method.
+        :return: (dict) The import summary.
+        """
+        length = int(self.headers.get("Content-Length") or 0)
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        try:
+            with os.fdopen(fd, "wb") as spool:
+                remaining = length
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, 1 << 20))
+                    if not chunk:
+                        raise BadRequest("The request body ended early.")
+                    spool.write(chunk)
+                    remaining -= len(chunk)
+            with self.server.import_slots:
+                return import_json(method(path))
+        except KeyError as e:
+            raise BadRequest(f"The CSV file has no {e} column.")
+        finally:
+            os.remove(path)
+
+    def post_import_books(self, query):
+        return self.import_csv(self.library.add_books_from_csv)
+
+    def post_import_members(self, query):
+        return self.import_csv(self.library.register_members_from_csv)
+
+    GET_ROUTES = {
+        "/books": get_books,
+        "/members": get_members,
+        "/search": get_search,
+        "/lent": get_lent,
+        "/stats": get_stats,
+        "/loans": get_loans,
+        "/loans/overdue": get_overdue,
+        "/loans/popular": get_popular,
+        "/loans/daily": get_daily,
+    }
+    POST_ROUTES = {
+        "/lend": post_lend,
+        "/return": post_return,
+        "/import/books": post_import_books,
+        "/import/members": post_import_members,
+    }
+
+
+class LibraryServer(HTTPServer):
+    """
+    Class representing an HTTP server that handles connections on a bounded worker pool.
+    A keep-alive connection holds its worker until it closes or idles for
+    LibraryRequestHandler.timeout seconds, and is closed after its current
+    response while other connections wait for a worker. At most max_queued
+    connections wait; further ones are answered with 503 and closed.
+    """
+    daemon_threads = True
+    OVERLOADED = json.dumps({"error": "The server is busy, please retry."}).encode("utf-8")
+
+    def __init__(self, address, library, workers=16, max_imports=1, verbose=False, max_queued=64):
+        """
+        Initialize the LibraryServer object and bind it.
+        :param address (tuple): The (host, port) to listen on.
+        :param library (ConcurrentLibrary): The thread-safe library to serve.
+        :param workers (int): The number of connections served at once.
+        :param max_imports (int): The number of CSV imports run at once.
+        :param verbose (bool): Log every request.
+        :param max_queued (int): The number of connections that may wait for a worker.
+        """
+        super().__init__(address, LibraryRequestHandler)
+        self.library = library
+        self.verbose = verbose
+        self.workers = workers
+        self.max_queued = max_queued
+        self.connections = 0  # being served or waiting for a worker
+        self.connections_lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+        self.import_slots = threading.BoundedSemaphore(max_imports)
+
+    @property
+    def busy(self):
+        """
+        Whether connections are waiting for a worker.
+        """
+        return self.connections > self.workers
+
+    def process_request(self, request, client_address):
+        with self.connections_lock:
+            full = self.connections >= self.workers + self.max_queued
+            if not full:
+                self.connections += 1
+        if full:
+            self.reject_request(request)
+            return
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def reject_request(self, request):
+        """
+        Answer a connection that cannot be queued with 503 and close it.
+        :param request (socket): The accepted connection.
+        :return: None
+        """
+        try:
+            request.sendall(b"HTTP/1.1 503 Service Unavailable\r\n"
+                            b"Content-Type: application/json\r\n"
+                            b"Content-Length: " + str(len(self.OVERLOADED)).encode() + b"\r\n"
+                            b"Retry-After: 1\r\n"
+                            b"Connection: close\r\n\r\n" + self.OVERLOADED)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self.connections_lock:
+                self.connections -= 1
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def load_test(host, port, clients, requests, path):
+    """
+    Hammer one GET endpoint over keep-alive connections and report the throughput.
+    :param clients (int): The number of concurrent connections.
+    :param requests (int): The number of requests per connection.
+    :param path (str): The endpoint to request.
+    :return: None
+    """
+    errors = []
+
+    def client():
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        for _ in range(requests):
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    total = clients * requests
+    print(f"{total} requests in {seconds:.2f} s: {total / seconds:.0f} req/s, {len(errors)} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the library database as a JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default="library.db", help="path to the database file")
+    parser.add_argument("--workers", type=int, default=16, help="connections served at once")
+    parser.add_argument("--max-queued", type=int, default=64,
+                        help="connections waiting for a worker before new ones get 503")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    parser.add_argument("--load-test", metavar="PATH",
+                        help="instead of serving, load-test a running server's GET endpoint")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.load_test:
+        load_test(args.host, args.port, args.clients, args.requests, args.load_test)
+        return
+
+    library = ConcurrentLibrary(ConnectionProfile(path=args.db))
+    server = LibraryServer((args.host, args.port), library, workers=args.workers, verbose=args.verbose,
+                          max_queued=args.max_queued)
+    print(f"Serving {args.db} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        library.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import pytest
+
+from main import Library, ConnectionProfile
+
+
+@pytest.fixture
+def profile(tmp_path):
+    return ConnectionProfile(path=str(tmp_path / "library.db"))
+
+
+@pytest.fixture
+def library(profile):
+    library = Library(profile)
+    yield library
+    library.conn.close()
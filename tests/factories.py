@@ -0,0 +1,22 @@
+from benchmark import isbn10_check_digit
+from main import Book, Member
+
+
+def make_book(n, **fields):
+    """
+    Build the n-th test book, with a valid ISBN; keyword arguments override its fields.
+    """
+    values = {"title": f"Book {n}", "author": "Author", "publisher": "Publisher", "published_year": 2000,
+              "rating": 4.0, "isbn": f"{n:09d}-{isbn10_check_digit(f'{n:09d}')}"}
+    values.update(fields)
+    return Book(**values)
+
+
+def make_member(n, **fields):
+    """
+    Build the n-th test member; keyword arguments override its fields.
+    """
+    values = {"first_name": "First", "last_name": "Last", "email": f"member{n}@example.com", "gender": "Female",
+              "state": "Ohio", "member_no": f"{n:011d}"}
+    values.update(fields)
+    return Member(**values)
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from main import Library
+from tests.factories import make_book, make_member
+
+
+@pytest.fixture
+def snapshot(library, tmp_path):
+    library.add_book(make_book(1, title="Dune"))
+    library.register_member(make_member(1))
+    return library.snapshot(str(tmp_path / "backups"))
+
+
+def test_restore_brings_the_snapshot_back(library, snapshot, tmp_path):
+    library.add_book(make_book(2, title="Emma"))
+    assert library.lend_book("Dune", make_member(1).member_no)
+
+    previous = library.restore(snapshot, str(tmp_path / "backups"))
+    assert [row[1] for row in library.select_books()] == ["Dune"]
+    assert library.count_lent_books() == 0
+    assert library.search_books("emma") == []
+    assert os.path.exists(previous) and os.path.exists(snapshot)
+
+
+def test_other_connections_drop_their_caches_on_restore(library, profile, snapshot, tmp_path):
+    library.remove_book("Dune")
+    library.add_book(make_book(2, title="Emma"))
+    library.add_book(make_book(3, title="Dune"))
+    other = Library(profile)
+    try:
+        assert other.select_one_book("Dune").id == 3
+        assert other.count_search_results("emma") == 1
+
+        library.restore(snapshot, str(tmp_path / "backups"))
+        assert other.select_one_book("Dune").id == 1
+        assert other.select_one_book("Emma") is None
+        assert other.count_search_results("emma") == 0
+        assert other.lend_book("Dune", make_member(1).member_no).book_id == 1
+    finally:
+        other.conn.close()
+
+
+def test_restore_refuses_a_broken_snapshot(library, tmp_path):
+    broken = tmp_path / "broken.db"
+    broken.write_bytes(b"not a database" * 100)
+    with pytest.raises(ValueError):
+        library.restore(str(broken), str(tmp_path / "backups"))
@@ -0,0 +1,117 @@
+import pytest
+
+from main import Library, CirculationResult, SCHEMA_MIGRATIONS
+from tests.factories import make_book, make_member
+
+
+@pytest.fixture
+def stocked(library):
+    for n in range(3):
+        library.add_book(make_book(n))
+        library.register_member(make_member(n))
+    return library
+
+
+def active_loans(library, title):
+    return library.cursor.execute(
+        "SELECT ACTIVE FROM BOOK_LOAN_STATS JOIN BOOKS ON BOOKS.ID = BOOK_ID WHERE TITLE = ?", (title,)).fetchone()[0]
+
+
+def test_member_with_a_loan_cannot_be_removed(stocked):
+    member_no = make_member(0).member_no
+    assert stocked.lend_book("Book 0", member_no)
+    with pytest.raises(ValueError):
+        stocked.remove_member(member_no)
+    assert stocked.count_lent_books() == 1
+    assert stocked.book_availability("Book 0") == (1, 0)
+
+    assert stocked.return_book("Book 0")
+    assert stocked.remove_member(member_no)
+    assert stocked.book_availability("Book 0") == (1, 1)
+
+
+def test_book_with_a_lent_copy_cannot_be_removed(stocked):
+    assert stocked.lend_book("Book 1", make_member(1).member_no)
+    with pytest.raises(ValueError):
+        stocked.remove_book("Book 1")
+    assert stocked.count_lent_books() == 1
+    assert stocked.return_book("Book 1")
+    assert stocked.remove_book("Book 1")
+
+
+def test_removing_what_is_gone_returns_false(stocked):
+    assert stocked.remove_book("Book 2")
+    assert stocked.remove_book("Book 2") is False
+    assert stocked.remove_book("No such book") is False
+    assert stocked.remove_member(make_member(2).member_no)
+    assert stocked.remove_member(make_member(2).member_no) is False
+
+
+def test_migration_closes_loans_of_deleted_members(stocked, profile):
+    lent = stocked.lend_book("Book 2", make_member(2).member_no)
+    book_id, member_id, copy_id = lent.book_id, lent.member_id, lent.copy_id
+    # what deleting a member with a loan used to leave behind, before migration 10
+    stocked.conn.execute("DELETE FROM MEMBERS WHERE MEMBER_NO = ?", (make_member(2).member_no,))
+    stocked.conn.execute("DELETE FROM CURRENT_LOANS")
+    stocked.conn.execute("ALTER TABLE LEND_BOOKS_ORPHANS DROP COLUMN COPY_ID")
+    stocked.conn.execute(f"PRAGMA user_version = {len(SCHEMA_MIGRATIONS) - 1}")
+    stocked.conn.commit()
+    stocked.conn.close()
+
+    library = Library(profile)
+    try:
+        assert library.book_availability("Book 2") == (1, 1)
+        assert active_loans(library, "Book 2") == 0
+        assert library.overdue_loans() == []
+        assert library.conn.execute("SELECT BOOK_ID, MEMBER_ID, COPY_ID FROM LEND_BOOKS_ORPHANS").fetchall() == [
+            (book_id, member_id, copy_id)]
+        assert library.lend_book("Book 2", make_member(0).member_no)
+    finally:
+        library.conn.close()
+
+
+def test_automatic_barcodes_are_reserved(stocked):
+    with pytest.raises(ValueError):
+        stocked.add_copies("Book 0", barcodes=["C0000503"])
+    assert stocked.add_copies("Book 0", barcodes=["SHELF-7"]) == ["SHELF-7"]
+    added = stocked.add_copies("Book 0", count=2)
+    assert all(Library.AUTO_BARCODE.fullmatch(barcode) for barcode in added)
+    assert stocked.book_availability("Book 0") == (4, 4)
+
+
+def test_return_of_a_copy_that_is_not_lent(stocked):
+    assert stocked.return_book("Book 0").status == CirculationResult.NOT_LENT
+
+
+def test_lend_by_barcode(stocked):
+    second, = stocked.add_copies("Book 0")
+    first = stocked.select_copies("Book 0")[0][0]
+    member_no = make_member(0).member_no
+    lent = stocked.lend_book(None, member_no, barcode=second)
+    assert lent and stocked.select_copies("Book 0") == [(first, "available"), (second, "lent")]
+    assert stocked.lend_book(None, member_no, barcode=second).status == CirculationResult.ALREADY_LENT
+    assert stocked.lend_book(None, member_no, barcode="NOPE").status == CirculationResult.UNKNOWN_BOOK
+    assert stocked.lend_book(None, "nobody", barcode=first).status == CirculationResult.UNKNOWN_MEMBER
+
+
+def test_mixed_batches_resolve_barcodes_first(stocked):
+    second, = stocked.add_copies("Book 0")
+    first = stocked.select_copies("Book 0")[0][0]
+    results = stocked.lend_many([("Book 0", make_member(0).member_no), (None, make_member(1).member_no, first)])
+    assert [result.status for result in results] == [CirculationResult.OK] * 2
+    # the scanned copy goes to the second item, so the title item gets the other one
+    assert results[1].copy_id < results[0].copy_id
+    assert stocked.count_lent_books(member_no=make_member(1).member_no) == 1
+
+    results = stocked.return_many(["Book 0", (None, first)])
+    assert [result.status for result in results] == [CirculationResult.OK] * 2
+    assert stocked.select_copies("Book 0") == [(first, "available"), (second, "available")]
+    assert stocked.count_lent_books() == 0
+
+
+def test_zero_day_loans_are_due_today(stocked):
+    assert stocked.lend_book("Book 0", make_member(0).member_no, loan_days=0)
+    assert stocked.lend_many([("Book 1", make_member(1).member_no)], loan_days=0)[0]
+    assert stocked.lend_book("Book 2", make_member(2).member_no)
+    due = dict(stocked.conn.execute("SELECT BOOK_ID, julianday(DUE_AT) - julianday(LENT_AT) FROM LOANS"))
+    assert sorted(round(days) for days in due.values()) == [0, 0, Library.LOAN_DAYS]
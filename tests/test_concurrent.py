@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+import pytest
+
+from benchmark import BOOK_FIELDS, generate_books, write_csv
+from main import AsyncLibrary, ConcurrentLibrary
+from tests.factories import make_book, make_member
+
+
+@pytest.fixture
+def concurrent(profile):
+    library = ConcurrentLibrary(profile)
+    yield library
+    library.close()
+
+
+def test_lend_gets_in_between_import_chunks(concurrent, tmp_path):
+    # numbered past the generated books, so its ISBN is not among theirs
+    concurrent.add_book(make_book(1000, title="Dune"))
+    concurrent.register_member(make_member(1))
+    path = str(tmp_path / "books.csv")
+    write_csv(path, BOOK_FIELDS, list(generate_books(200)))
+    lent = []
+
+    def progress(tracker):
+        if not lent:
+            lend = threading.Thread(target=lambda: lent.append(concurrent.lend_book("Dune", make_member(1).member_no)))
+            lend.start()
+            lend.join(5)
+            assert not lend.is_alive()
+
+    result = concurrent.add_books_from_csv(path, chunk_bytes=1000, progress=progress, workers=1)
+
+    assert lent and lent[0]
+    assert result.inserted == 200 and not result.cancelled
+    assert concurrent.count_lent_books() == 1
+
+
+def test_reads_finish_while_writes_wait(concurrent):
+    concurrent.add_book(make_book(1, title="Dune"))
+
+    async def scenario():
+        library = AsyncLibrary(concurrent, max_workers=2)
+        # hold the writer, as a long write would, while more writes queue up
+        concurrent.write_lock.acquire()
+        try:
+            writes = [asyncio.ensure_future(library.add_book(make_book(n))) for n in range(2, 6)]
+            await asyncio.sleep(0.1)
+            book = await asyncio.wait_for(library.select_one_book("Dune"), 5)
+            assert book.id == 1 and not any(write.done() for write in writes)
+        finally:
+            concurrent.write_lock.release()
+        await asyncio.gather(*writes)
+        assert await library.count_books() == 5
+        await library.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,101 @@
+import csv
+import threading
+
+import pytest
+
+from benchmark import BOOK_FIELDS, MEMBER_FIELDS, generate_books, generate_members, write_csv
+from main import csv_byte_ranges
+
+
+def books_with_line_breaks(count):
+    books = list(generate_books(count))
+    for book in books[::3]:
+        # most of the row is on the line before the break, where boundaries land
+        book["title"] = f'{book["title"]}, the "{book["id"]}" collected edition with notes\nVolume 1'
+    return books
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_quoted_line_breaks_do_not_split_rows(library, tmp_path, workers):
+    path = str(tmp_path / "books.csv")
+    books = books_with_line_breaks(60)
+    books[40]["rating"] = "not a number"
+    write_csv(path, BOOK_FIELDS, books)
+
+    result = library.add_books_from_csv(path, chunk_bytes=150, workers=workers)
+
+    with open(path, newline="", encoding="utf-8") as csvfile:
+        reader = csv.DictReader(csvfile)
+        bad_line = next(reader.line_num for row in reader if row["rating"] == "not a number")
+    assert result.inserted == 59
+    assert [line_no for line_no, _ in result.rejected] == [bad_line]
+    assert sorted(book[1] for book in library.select_books()) == sorted(
+        book["title"] for i, book in enumerate(books) if i != 40)
+
+
+def test_ranges_end_on_record_boundaries(tmp_path):
+    path = str(tmp_path / "books.csv")
+    write_csv(path, BOOK_FIELDS, books_with_line_breaks(60))
+    header, ranges = csv_byte_ranges(path, 150)
+    with open(path, "rb") as csvfile:
+        data = csvfile.read()
+    assert header == BOOK_FIELDS
+    assert len(ranges) > 1
+    for start, end in ranges:
+        assert data[start:end].count(b'"') % 2 == 0
+
+
+
+@pytest.mark.parametrize("chunk_bytes", [150, 1 << 20])
+def test_duplicates_are_counted_alike(library, tmp_path, chunk_bytes):
+    books, members = list(generate_books(20)), list(generate_members(20))
+    write_csv(str(tmp_path / "books.csv"), BOOK_FIELDS, books[:5])
+    write_csv(str(tmp_path / "members.csv"), MEMBER_FIELDS, members[:5])
+    library.add_books_from_csv(str(tmp_path / "books.csv"))
+    library.register_members_from_csv(str(tmp_path / "members.csv"))
+
+    # rows 0-4 are already stored and rows 10-14 appear twice in the file
+    write_csv(str(tmp_path / "books.csv"), BOOK_FIELDS, books + books[10:15])
+    write_csv(str(tmp_path / "members.csv"), MEMBER_FIELDS, members + members[10:15])
+    results = (library.add_books_from_csv(str(tmp_path / "books.csv"), chunk_bytes=chunk_bytes, workers=1),
+               library.register_members_from_csv(str(tmp_path / "members.csv"), chunk_bytes=chunk_bytes, workers=1))
+    for result, key, stored in zip(results, ("ISBN", "member no"), ("already in the library", "already registered")):
+        assert (result.inserted, result.duplicates) == (15, 10)
+        # line 1 is the header
+        assert [line_no for line_no, _ in result.rejected] == list(range(2, 7)) + list(range(22, 27))
+        assert all(reason.startswith(key) and reason.endswith(stored) for _, reason in result.rejected[:5])
+        assert all(reason.endswith("repeated in file") for _, reason in result.rejected[5:])
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cancel_keeps_only_whole_chunks(library, tmp_path, workers):
+    path = str(tmp_path / "books.csv")
+    books = list(generate_books(200))
+    write_csv(path, BOOK_FIELDS, books)
+    cancel = threading.Event()
+    reported = []
+
+    def progress(tracker):
+        reported.append(tracker.rows)
+        if len(reported) == 2:
+            cancel.set()
+
+    result = library.add_books_from_csv(path, chunk_bytes=1000, progress=progress, cancel=cancel, workers=workers)
+
+    # the chunk after the second one was parsed but never written
+    assert result.cancelled and len(reported) == 2
+    assert 0 < result.inserted == reported[-1] < len(books)
+    assert [row[6] for row in library.select_books()] == [book["ISBN"] for book in books[:result.inserted]]
+    # the search index and the copies of the written chunks are complete too
+    for table in ("BOOKS_FTS", "COPIES"):
+        assert library.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == result.inserted
+
+
+def test_cancel_before_the_first_chunk_writes_nothing(library, tmp_path):
+    path = str(tmp_path / "members.csv")
+    write_csv(path, MEMBER_FIELDS, list(generate_members(50)))
+    cancel = threading.Event()
+    cancel.set()
+    result = library.register_members_from_csv(path, chunk_bytes=500, cancel=cancel, workers=1)
+    assert result.cancelled and result.inserted == 0
+    assert library.count_members() == 0
@@ -0,0 +1,78 @@
+import pytest
+
+from tests.factories import make_book, make_member
+
+
+@pytest.fixture
+def lent(library):
+    # Book 0-5 with two copies of Book 3; member 0 borrows the even books, member 1 the odd ones
+    for n in range(6):
+        library.add_book(make_book(n))
+    for n in range(2):
+        library.register_member(make_member(n, first_name=f"First {n}", last_name=f"Last {n}"))
+    library.add_copies("Book 3")
+    for n in (0, 1, 2, 3, 3, 4, 5):
+        assert library.lend_book(f"Book {n}", make_member(n % 2).member_no)
+    return library
+
+
+def all_pages(library, limit, **filters):
+    rows, after = [], None
+    while True:
+        page, after = library.lent_books_page(after, limit, **filters)
+        rows += page
+        if after is None:
+            return rows
+
+
+def test_book_edits_reach_current_loans(lent):
+    lent.conn.execute("UPDATE BOOKS SET TITLE = 'Annals' WHERE TITLE = 'Book 3'")
+    lent.conn.commit()
+
+    assert lent.count_lent_books(title="Book 3") == 0
+    assert [row[0] for row in lent.select_lent_books_window(0, 10, title="Ann")] == ["Annals", "Annals"]
+    assert [row[0] for row in all_pages(lent, 3)][:2] == ["Annals", "Annals"]
+    assert ("Annals", "First 1", "Last 1") in lent.lent_books()
+
+
+def test_member_edits_reach_current_loans(lent):
+    lent.conn.execute("UPDATE MEMBERS SET MEMBER_NO = '99999999999', FIRST_NAME = 'Ada', LAST_NAME = 'Byron' "
+                      "WHERE MEMBER_NO = ?", (make_member(1).member_no,))
+    lent.conn.commit()
+
+    assert lent.count_lent_books(member_no=make_member(1).member_no) == 0
+    rows = lent.select_lent_books_window(0, 10, member_no="99999999999")
+    assert [row[0] for row in rows] == ["Book 1", "Book 3", "Book 3", "Book 5"]
+    assert {row[2:5] for row in rows} == {("99999999999", "Ada", "Byron")}
+    # the other member's loans are untouched
+    assert {row[2:5] for row in lent.select_lent_books_window(0, 10, member_no=make_member(0).member_no)} == \
+        {(make_member(0).member_no, "First 0", "Last 0")}
+
+
+def test_returns_and_deletes_leave_current_loans(lent):
+    assert lent.return_book("Book 3")
+    assert lent.count_lent_books(title="Book 3") == 1
+    lent.conn.execute("DELETE FROM BOOKS WHERE TITLE = 'Book 4'")
+    lent.conn.execute("DELETE FROM MEMBERS WHERE MEMBER_NO = ?", (make_member(1).member_no,))
+    lent.conn.commit()
+
+    assert [row[0] for row in all_pages(lent, 2)] == ["Book 0", "Book 2"]
+    assert lent.count_lent_books() == 2
+
+
+@pytest.mark.parametrize("filters", [{}, {"title": "Book 3"}, {"member_no": make_member(1).member_no},
+                                     {"title": "Book", "member_no": make_member(0).member_no},
+                                     {"title": "Nothing"}])
+@pytest.mark.parametrize("limit", [1, 2, 3, 10])
+def test_pages_and_windows_agree(lent, filters, limit):
+    expected = lent.select_lent_books_window(0, 100, **filters)
+    assert len(expected) == lent.count_lent_books(**filters)
+    assert [(row[0], row[1]) for row in expected] == sorted((row[0], row[1]) for row in expected)
+    if "member_no" in filters:
+        assert {row[2] for row in expected} == {filters["member_no"]}
+    if "title" in filters:
+        assert all(row[0].startswith(filters["title"]) for row in expected)
+
+    assert all_pages(lent, limit, **filters) == expected
+    windows = [lent.select_lent_books_window(offset, limit, **filters) for offset in range(0, len(expected), limit)]
+    assert [row for window in windows for row in window] == expected
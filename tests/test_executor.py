@@ -0,0 +1,44 @@
+import threading
+
+from main import DatabaseExecutor
+
+
+class FakeRoot:
+    """
+    Stands in for the Tk root: after() only records the scheduled call.
+    """
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, fn):
+        self.scheduled.append(fn)
+
+
+def wait_for(executor, future):
+    done = threading.Event()
+    future.add_done_callback(lambda f: done.set())
+    # submit() queued the result before this callback was added
+    assert done.wait(5)
+
+
+def test_poll_keeps_running_when_a_callback_fails():
+    root = FakeRoot()
+    errors = []
+    executor = DatabaseExecutor(root, lambda: None)
+    executor.show_error = errors.append
+    try:
+        def broken(result):
+            raise RuntimeError("window closed")
+
+        delivered = []
+        wait_for(executor, executor.submit(lambda library: 1, callback=broken))
+        wait_for(executor, executor.submit(lambda library: 2, callback=delivered.append))
+        root.scheduled.clear()
+        executor._poll()
+        assert delivered == [2]
+        assert [str(error) for error in errors] == ["window closed"]
+        assert root.scheduled == [executor._poll]
+        assert executor.pending == 0
+    finally:
+        executor.shutdown()
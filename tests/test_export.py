@@ -0,0 +1,47 @@
+import gzip
+import json
+
+import pytest
+
+from main import Library, ConnectionProfile
+from tests.factories import make_book, make_member
+
+
+@pytest.fixture
+def stocked(library):
+    library.add_book(make_book(0, title='Tales, "Odd" and\nOther', author="Poe, Edgar"))
+    for n in range(1, 30):
+        library.add_book(make_book(n, rating=1 + n % 5, published_year=1900 + n))
+        library.register_member(make_member(n, first_name=f"Ané {n}", last_name="O'Brien, Jr."))
+    return library
+
+
+def test_csv_exports_import_into_a_fresh_database(stocked, tmp_path):
+    assert stocked.export_books(str(tmp_path / "books.csv"), chunk_rows=7) == 30
+    assert stocked.export_members(str(tmp_path / "members.csv"), chunk_rows=7) == 29
+
+    fresh = Library(ConnectionProfile(path=str(tmp_path / "fresh.db")))
+    try:
+        books = fresh.add_books_from_csv(str(tmp_path / "books.csv"), chunk_bytes=300)
+        members = fresh.register_members_from_csv(str(tmp_path / "members.csv"), chunk_bytes=300)
+        assert (books.inserted, books.rejected) == (30, [])
+        assert (members.inserted, members.rejected) == (29, [])
+        assert fresh.select_books() == stocked.select_books()
+        assert fresh.select_members() == stocked.select_members()
+    finally:
+        fresh.conn.close()
+
+
+def test_books_with_a_wrong_check_digit_are_refused(library):
+    with pytest.raises(ValueError):
+        library.add_book(make_book(1, isbn="isbn-1"))
+    assert library.count_books() == 0
+
+
+def test_jsonl_and_gzip_exports(stocked, tmp_path):
+    path = str(tmp_path / "books.jsonl.gz")
+    assert stocked.export_books(path) == 30
+    with gzip.open(path, "rt", encoding="utf-8") as export_file:
+        books = [json.loads(line) for line in export_file]
+    assert [book["title"] for book in books] == [row[1] for row in stocked.select_books()]
+    assert books[0]["author"] == "Poe, Edgar" and books[1]["ISBN"] == make_book(1).isbn
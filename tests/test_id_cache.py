@@ -0,0 +1,58 @@
+import pytest
+
+from main import Library, ConnectionProfile
+from tests.factories import make_book, make_member
+
+
+@pytest.fixture
+def other(profile):
+    other = Library(profile)
+    yield other
+    other.conn.close()
+
+
+def test_book_removed_through_another_connection(library, other):
+    for n in range(1, 5):
+        library.add_book(make_book(n, title=f"T{n}"))
+    assert library.select_one_book("T3").id == 3
+
+    assert other.remove_book("T3")
+    assert library.select_one_book("T3") is None
+    assert library.remove_book("T3") is False
+    assert library.select_one_book("T4").id == 4
+
+
+def test_book_added_again_through_another_connection(library, other):
+    library.add_book(make_book(1, title="Dune"))
+    assert library.select_one_book("Dune").id == 1
+
+    other.remove_book("Dune")
+    other.add_book(make_book(2, title="Dune"))
+    assert library.select_one_book("Dune").id == 2
+    assert library.add_copies("Dune", barcodes=["B1"]) == ["B1"]
+    assert library.cursor.execute("SELECT BOOK_ID FROM COPIES WHERE BARCODE = 'B1'").fetchone() == (2,)
+
+
+def test_member_removed_through_another_connection(library, other):
+    library.register_member(make_member(1))
+    library.register_member(make_member(2))
+    assert library.select_one_member(make_member(1).member_no).id == 1
+
+    assert other.remove_member(make_member(1).member_no)
+    assert library.select_one_member(make_member(1).member_no) is None
+    other.register_member(make_member(1))
+    assert library.select_one_member(make_member(1).member_no).id == 3
+
+
+def test_ids_cached_before_a_restore(library, other, tmp_path):
+    source = Library(ConnectionProfile(path=str(tmp_path / "source.db")))
+    source.add_book(make_book(1, title="Emma"))
+    snapshot = source.snapshot(str(tmp_path / "backups"))
+    source.conn.close()
+    library.add_book(make_book(1, title="Dune"))
+    assert other.select_one_book("Dune").id == 1
+
+    library.restore(snapshot, str(tmp_path / "backups"))
+    assert other.select_one_book("Dune") is None
+    assert other.select_one_book("Emma").id == 1
+    assert other.remove_book("Dune") is False
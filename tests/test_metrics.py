@@ -0,0 +1,78 @@
+import pytest
+
+from main import Histogram, Library, Metrics, TimedCursor
+from tests.factories import make_book
+
+
+def test_histogram_counts_and_percentiles():
+    histogram = Histogram()
+    for ms in (0.01, 0.3, 0.3, 0.3, 2, 7, 7, 40, 40, 3000):
+        histogram.record(ms)
+
+    summary = histogram.summary()
+    assert summary["count"] == 10
+    assert summary["total_ms"] == pytest.approx(3096.91)
+    assert summary["mean_ms"] == pytest.approx(309.691)
+    assert summary["max_ms"] == 3000
+    assert summary["buckets"] == {"0.05": 1, "0.5": 3, "2.5": 1, "10": 2, "50": 2, "inf": 1}
+    assert summary["p50_ms"] == 2.5
+    # the open-ended bucket reports the largest measurement, not infinity
+    assert summary["p95_ms"] == 3000
+    assert Histogram().summary()["mean_ms"] == Histogram().percentile(0.5) == 0.0
+
+
+def test_operations_statements_and_commits_are_counted(profile):
+    library = Library(profile, metrics=Metrics(slow_ms=float("inf")))
+    try:
+        library.metrics.reset()
+        for n in range(3):
+            library.add_book(make_book(n))
+        for _ in range(2):
+            library.select_one_book("Book 1")
+
+        stats = library.metrics.snapshot()["stats"]
+        assert stats["op"]["add_book"]["count"] == 3
+        assert stats["op"]["select_one_book"]["count"] == 2
+        assert stats["commit"]["COMMIT"]["count"] == 3
+        assert stats["sql"]["SELECT ID FROM BOOKS WHERE ISBN = ?"]["count"] == 3
+        # the second lookup is answered from the ID cache and checked by the record query
+        assert stats["sql"]["SELECT ID FROM BOOKS WHERE TITLE = ?"]["count"] == 1
+        assert stats["sql"]["SELECT * FROM BOOKS WHERE ID=? AND TITLE=?"]["count"] == 2
+        for kind in stats.values():
+            for summary in kind.values():
+                assert 0 < summary["total_ms"] and summary["max_ms"] <= summary["total_ms"]
+        # an operation's time includes the statements it ran
+        assert stats["op"]["add_book"]["total_ms"] >= stats["sql"]["SELECT ID FROM BOOKS WHERE ISBN = ?"]["total_ms"]
+        assert library.metrics.snapshot()["slow_log"] == []
+    finally:
+        library.conn.close()
+
+
+def test_slow_log_is_bounded(profile):
+    library = Library(profile, metrics=Metrics(slow_ms=0, slow_log_size=5))
+    try:
+        for n in range(4):
+            library.add_book(make_book(n))
+
+        slow_log = library.metrics.snapshot()["slow_log"]
+        assert len(slow_log) == 5
+        assert slow_log[-1]["kind"] == "op" and slow_log[-1]["name"] == "add_book"
+        assert all(entry["ms"] >= 0 for entry in slow_log)
+    finally:
+        library.conn.close()
+
+
+def test_timing_can_be_turned_off(profile):
+    library = Library(profile, metrics=False)
+    try:
+        library.add_book(make_book(1))
+        assert library.metrics is None
+        assert library.select_one_book("Book 1").id == 1
+    finally:
+        library.conn.close()
+
+
+def test_placeholder_lists_share_a_histogram():
+    assert TimedCursor.normalize("SELECT ID\n  FROM BOOKS WHERE ISBN IN (?, ?,?)") == \
+        TimedCursor.normalize("SELECT ID FROM BOOKS WHERE ISBN IN (?, ?)") == \
+        "SELECT ID FROM BOOKS WHERE ISBN IN (?, ...)"
@@ -0,0 +1,55 @@
+import sqlite3
+
+from main import Library, SCHEMA_MIGRATIONS
+
+
+def test_upgrade_keeps_the_rows_it_drops(profile):
+    conn = sqlite3.connect(profile.path)
+    for statement in SCHEMA_MIGRATIONS[0]:
+        conn.execute(statement)
+    conn.executemany("INSERT INTO BOOKS VALUES (?, ?, ?, ?, ?, ?, ?)", [
+        (1, "Dune", "Herbert", "Chilton", 1965, 4.5, "isbn-1"),
+        (2, "Dune (copy)", "Herbert", "Chilton", 1965, 4.5, "isbn-1"),
+        (3, "Emma", "Austen", "Murray", 1815, 4.0, "isbn-3"),
+    ])
+    conn.executemany("INSERT INTO MEMBERS VALUES (?, ?, ?, ?, ?, ?, ?)", [
+        (1, "Ada", "Lovelace", "ada@example.com", "Female", "London", "00000000001"),
+        (2, "Ada", "Byron", "ada@example.org", "Female", "London", "00000000001"),
+    ])
+    conn.executemany("INSERT INTO LEND_BOOKS VALUES (?, ?)", [(1, 1), (2, 1), (3, 1), (3, 2)])
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    library = Library(profile)
+    try:
+        rows = lambda sql: library.conn.execute(sql).fetchall()
+        assert rows("SELECT ID, TITLE FROM BOOKS ORDER BY ID") == [(1, "Dune"), (3, "Emma")]
+        assert rows("SELECT ID, TITLE FROM BOOKS_DUPLICATES") == [(2, "Dune (copy)")]
+        assert rows("SELECT ID, LAST_NAME FROM MEMBERS_DUPLICATES") == [(2, "Byron")]
+        assert sorted(rows("SELECT BOOK_ID, MEMBER_ID FROM LEND_BOOKS_ORPHANS")) == [(2, 1), (3, 2)]
+        assert rows("SELECT BOOK_ID, MEMBER_ID FROM LEND_BOOKS_DUPLICATES") == []
+        assert library.count_lent_books() == 2
+        assert rows("PRAGMA user_version") == [(len(SCHEMA_MIGRATIONS),)]
+    finally:
+        library.conn.close()
+
+
+def test_upgrade_keeps_books_lent_twice(profile):
+    conn = sqlite3.connect(profile.path)
+    for migration in SCHEMA_MIGRATIONS[:3]:
+        for statement in migration:
+            conn.execute(statement)
+    conn.execute("INSERT INTO BOOKS VALUES (1, 'Dune', 'Herbert', 'Chilton', 1965, 4.5, 'isbn-1')")
+    conn.executemany("INSERT INTO MEMBERS (ID, MEMBER_NO) VALUES (?, ?)", [(1, "00000000001"), (2, "00000000002")])
+    conn.executemany("INSERT INTO LEND_BOOKS VALUES (?, ?)", [(1, 1), (1, 2)])
+    conn.execute("PRAGMA user_version = 3")
+    conn.commit()
+    conn.close()
+
+    library = Library(profile)
+    try:
+        assert library.conn.execute("SELECT BOOK_ID, MEMBER_ID FROM LEND_BOOKS_DUPLICATES").fetchall() == [(1, 2)]
+        assert library.count_lent_books() == 1
+    finally:
+        library.conn.close()
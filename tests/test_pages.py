@@ -0,0 +1,62 @@
+import pytest
+
+from tests.factories import make_member
+
+
+@pytest.fixture
+def catalog(library):
+    # every fourth year and every third rating is NULL, and values repeat so ties are broken by ID
+    library.conn.executemany(
+        "INSERT INTO BOOKS (TITLE, AUTHOR, PUBLISHER, PUBLISHED_YEAR, RATING, ISBN) VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"Book {n}", "Author", "Publisher", None if n % 4 == 0 else 1990 + n % 5,
+          None if n % 3 == 0 else n % 5 + 1, f"isbn-{n}") for n in range(53)])
+    library.conn.commit()
+    return library
+
+
+def expected_ids(library, order_by, descending):
+    direction = "DESC" if descending else "ASC"
+    return [row[0] for row in library.conn.execute(
+        f"SELECT ID FROM BOOKS ORDER BY {order_by} {direction}, ID {direction}")]
+
+
+@pytest.mark.parametrize("order_by", ["ID", "PUBLISHED_YEAR", "RATING", "TITLE"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_cover_the_table_once_in_order(catalog, order_by, descending):
+    ids, after, pages = [], None, 0
+    while True:
+        rows, after = catalog.select_books_page(after, 5, order_by, descending)
+        ids += [row[0] for row in rows]
+        pages += 1
+        if after is None:
+            break
+    assert ids == expected_ids(catalog, order_by, descending)
+    assert pages == len(ids) // 5 + 1
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_keys_resume_on_both_sides_of_the_nulls(catalog, descending):
+    ordered = expected_ids(catalog, "PUBLISHED_YEAR", descending)
+    # 14 NULL years sort first ascending and last descending; the first page ends
+    # before, on and after the last NULL row or the first non-NULL one
+    for size in (1, 13, 14, 15, 38, 39, 40):
+        rows, after = catalog.select_books_page(None, size, "published_year", descending)
+        rest, _ = catalog.select_books_page(after, 1000, "published_year", descending)
+        assert [row[0] for row in rows + rest] == ordered
+    assert [row[0] for row in catalog.iter_books(4, "published_year", descending)] == ordered
+
+
+def test_unknown_sort_column_is_refused(catalog):
+    with pytest.raises(ValueError):
+        catalog.select_books_page(order_by="ID; DROP TABLE BOOKS")
+    assert catalog.count_books() == 53
+
+
+def test_member_pages(library):
+    for n in range(12):
+        library.register_member(make_member(n, state=None if n % 2 else "Ohio"))
+    rows, after = library.select_members_page(None, 8, "state", True)
+    more, last = library.select_members_page(after, 8, "state", True)
+    assert last is None
+    assert [row[5] for row in rows + more] == ["Ohio"] * 6 + [None] * 6
+    assert [row[0] for row in rows + more] == [11, 9, 7, 5, 3, 1, 12, 10, 8, 6, 4, 2]
@@ -0,0 +1,29 @@
+from tests.factories import make_book
+
+
+def test_best_match_is_found_among_many(library):
+    for n in range(1500):
+        library.add_book(make_book(n, title=f"Green Tea Leaves {n}", author=f"Writer {n}"))
+    library.add_book(make_book(1500, title="Green", author="Green", publisher="Green"))
+
+    assert library.search_books("green", limit=1)[0].isbn == make_book(1500).isbn
+    assert library.count_search_results("green") == 1501
+
+
+def test_pages_follow_one_ranking(library):
+    for n in range(300):
+        library.add_book(make_book(n, title=f"Green {'Tea ' * (n % 7)}{n}"))
+
+    ranking = [book.id for book in library.search_books("green", limit=300)]
+    pages = [book.id for offset in range(0, 300, 40) for book in library.search_books("green", 40, offset)]
+    assert pages == ranking
+    assert len(set(ranking)) == library.count_search_results("green") == 300
+
+
+def test_ranking_follows_changes(library):
+    library.add_book(make_book(1, title="Green Tea"))
+    assert library.count_search_results("green") == 1
+    library.add_book(make_book(2, title="Green Dress"))
+    assert library.count_search_results("green") == 2
+    library.remove_book("Green Tea")
+    assert [book.title for book in library.search_books("green")] == ["Green Dress"]
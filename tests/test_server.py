@@ -0,0 +1,66 @@
+import json
+import time
+import threading
+import http.client
+
+import pytest
+
+from main import ConcurrentLibrary
+from server import LibraryServer
+
+
+@pytest.fixture
+def serve(profile):
+    servers = []
+
+    def serve(**options):
+        library = ConcurrentLibrary(profile)
+        server = LibraryServer(("127.0.0.1", 0), library, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, library))
+        return server
+
+    yield serve
+    for server, library in servers:
+        server.shutdown()
+        server.server_close()
+        library.close()
+
+
+def connect(server):
+    return http.client.HTTPConnection(*server.server_address, timeout=5)
+
+
+def get(conn, path="/stats"):
+    conn.request("GET", path)
+    response = conn.getresponse()
+    return response, json.loads(response.read())
+
+
+def test_connections_beyond_the_queue_get_503(serve):
+    server = serve(workers=1, max_queued=0)
+    first = connect(server)
+    assert get(first)[0].status == 200
+
+    second = connect(server)
+    response, body = get(second)
+    assert response.status == 503 and "busy" in body["error"]
+    assert response.getheader("Retry-After") == "1"
+    second.close()
+    first.close()
+
+
+def test_keep_alive_gives_way_to_waiting_connections(serve):
+    server = serve(workers=1, max_queued=1)
+    first = connect(server)
+    assert get(first)[0].getheader("Connection") is None
+
+    second = connect(server)
+    second.connect()
+    deadline = time.monotonic() + 5
+    while not server.busy and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert get(first)[0].getheader("Connection") == "close"
+    assert get(second)[0].status == 200
+    first.close()
+    second.close()
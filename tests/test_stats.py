@@ -0,0 +1,67 @@
+import pytest
+
+from tests.factories import make_book, make_member
+
+
+@pytest.fixture
+def stocked(library):
+    for n in range(2):
+        library.add_book(make_book(n))
+        library.register_member(make_member(n))
+    library.add_copies("Book 0")
+    return library
+
+
+def circulate(library, batch):
+    # Book 0 goes to both members and Book 1 to the first; one Book 0 comes back
+    loans = [("Book 0", make_member(0).member_no), ("Book 0", make_member(1).member_no),
+             ("Book 1", make_member(0).member_no)]
+    if batch:
+        assert all(library.lend_many(loans))
+        assert all(library.return_many(["Book 0"]))
+    else:
+        for title, member_no in loans:
+            assert library.lend_book(title, member_no)
+        assert library.return_book("Book 0")
+
+
+def table(library, sql):
+    return library.cursor.execute(sql).fetchall()
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_stats_follow_lends_and_returns(stocked, batch):
+    circulate(stocked, batch)
+    today = stocked.cursor.execute("SELECT date('now')").fetchone()[0]
+
+    assert table(stocked, "SELECT BOOK_ID, LOANS, ACTIVE FROM BOOK_LOAN_STATS ORDER BY BOOK_ID") == \
+        [(1, 2, 1), (2, 1, 1)]
+    assert table(stocked, "SELECT MEMBER_ID, LOANS, ACTIVE FROM MEMBER_LOAN_STATS ORDER BY MEMBER_ID") == \
+        [(1, 2, 1), (2, 1, 1)]
+    assert stocked.daily_circulation() == [(today, 3, 1)]
+    assert stocked.most_borrowed() == [("Book 0", 2), ("Book 1", 1)]
+    assert [row[3:] for row in stocked.top_borrowers()] == [(2, 1), (1, 1)]
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_stats_match_the_loan_history(stocked, batch):
+    circulate(stocked, batch)
+    assert stocked.return_book("Book 0") and stocked.return_book("Book 1")
+
+    for stats, key in (("BOOK_LOAN_STATS", "BOOK_ID"), ("MEMBER_LOAN_STATS", "MEMBER_ID")):
+        assert table(stocked, f"SELECT {key}, LOANS, ACTIVE, LAST_LENT_AT FROM {stats} ORDER BY {key}") == \
+            table(stocked, f"SELECT {key}, COUNT(*), COUNT(*) - COUNT(RETURNED_AT), max(LENT_AT) "
+                           f"FROM LOANS GROUP BY {key} ORDER BY {key}")
+    assert table(stocked, "SELECT sum(LENT), sum(RETURNED) FROM DAILY_LOAN_STATS") == [(3, 3)]
+    assert table(stocked, "SELECT sum(ACTIVE) FROM BOOK_LOAN_STATS") == [(0,)]
+
+
+def test_refused_lends_and_returns_change_no_stats(stocked):
+    assert stocked.lend_book("Book 1", make_member(0).member_no)
+    assert not stocked.lend_book("Book 1", make_member(1).member_no)
+    assert stocked.return_book("Book 1")
+    assert not stocked.return_book("Book 1")
+
+    assert table(stocked, "SELECT BOOK_ID, LOANS, ACTIVE FROM BOOK_LOAN_STATS") == [(2, 1, 0)]
+    assert table(stocked, "SELECT MEMBER_ID, LOANS, ACTIVE FROM MEMBER_LOAN_STATS") == [(1, 1, 0)]
+    assert table(stocked, "SELECT LENT, RETURNED FROM DAILY_LOAN_STATS") == [(1, 1)]
@@ -0,0 +1,26 @@
+import random
+
+from tests.factories import make_book
+
+
+def test_windows_match_offset_scans(library):
+    for n in range(500):
+        library.add_book(make_book(n))
+    library.cursor.execute("DELETE FROM BOOKS WHERE ID % 7 = 0")
+    library.conn.commit()
+    every = [row[0] for row in library.conn.execute("SELECT ID FROM BOOKS ORDER BY ID")]
+
+    rng = random.Random(7)
+    offsets = list(range(0, 450, 40)) + list(range(440, -1, -40)) + [rng.randrange(450) for _ in range(50)]
+    for offset in offsets:
+        limit = rng.choice((1, 13, 40))
+        assert [row[0] for row in library.select_books_window(offset, limit)] == every[offset:offset + limit]
+
+
+def test_windows_follow_changes(library):
+    for n in range(100):
+        library.add_book(make_book(n))
+    assert library.select_books_window(50, 1)[0][1] == "Book 50"
+    library.remove_book("Book 10")
+    assert library.select_books_window(50, 1)[0][1] == "Book 51"
+    assert library.select_books_window(60, 1)[0][1] == "Book 61"